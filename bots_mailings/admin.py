@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from bots_mailings.models import Post, SentMessage
+from bots_mailings.models import MailingMedia, Post, SentMessage
 
 
 @admin.register(Post)
@@ -11,3 +11,8 @@ class Post(admin.ModelAdmin):
 @admin.register(SentMessage)
 class Post(admin.ModelAdmin):
     pass
+
+
+@admin.register(MailingMedia)
+class MailingMediaAdmin(admin.ModelAdmin):
+    list_display = ("media_type", "content_hash", "created_at")
@@ -5,6 +5,7 @@ from django.utils import timezone
 from bots_mailings.models import Post
 from bots_management.services import get_bot_by_slug
 from subscribers.models import Subscriber
+from subscribers.services import get_bot_segments
 
 
 class MailingForm(forms.ModelForm):
@@ -36,6 +37,18 @@ class MailingForm(forms.ModelForm):
         )
     )
 
+    segment = forms.ModelChoiceField(
+        queryset=None,
+        label="Сегмент подписчиков",
+        help_text="Рассылка будет отправлена подписчикам сегмента",
+        required=False,
+        widget=forms.Select(
+            attrs={
+                'class': "form-control"
+            }
+        )
+    )
+
     #TODO:add fields
 
     send_time = forms.DateTimeField(
@@ -56,13 +69,17 @@ class MailingForm(forms.ModelForm):
         user = kwargs.pop('user')
         channel_slug = kwargs.pop('channel_slug')
         super().__init__(*args, **kwargs)
+        bot = get_bot_by_slug(channel_slug)
         self.fields['author'].initial = user
-        self.fields['bot'].initial = get_bot_by_slug(channel_slug)
-        self.fields['actions'].queryset = None,
+        self.fields['bot'].initial = bot
         self.fields['send_to'].queryset = Subscriber.objects.filter(
-                    bot=get_bot_by_slug(channel_slug),
+                    bot=bot,
                     is_active=True
                 )
+        self.fields['segment'].queryset = get_bot_segments(bot)
+        self.fields['segment'].label_from_instance = (
+            lambda segment: f"{segment.name} ({segment.size})"
+        )
 
     def clean_send_time(self):
         """
@@ -74,12 +91,21 @@ class MailingForm(forms.ModelForm):
             raise ValidationError("Невозможно отправить сообщение в прошлом!")
         return send_time
 
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('segment') and cleaned_data.get('send_to'):
+            raise ValidationError(
+                "Выберите сегмент или подписчиков, но не оба"
+            )
+        return cleaned_data
+
     class Meta:
         fields = (
             'bot',
             'author',
             'send_time',
             'send_to',
+            'segment',
         )
         model = Post
 
@@ -92,7 +118,8 @@ class MailingUpdateForm(MailingForm):
         model = Post
         fields = (
             'send_time',
-            'send_to'
+            'send_to',
+            'segment',
         )
 
     def clean_send_time(self):
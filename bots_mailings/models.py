@@ -36,6 +36,23 @@ class Post(models.Model):
         blank=True, null=True
     )
     url = models.URLField("Ссылка", blank=True, null=True, max_length=700)
+    send_to = models.ManyToManyField(
+        to="subscribers.Subscriber",
+        verbose_name="Получатели",
+        related_name="posts",
+        blank=True
+    )
+    # subscribers of the segment are used instead of send_to,
+    # the segment can't be deleted, or the post would go to everybody,
+    # unless both are deleted with their bot
+    segment = models.ForeignKey(
+        to="subscribers.Segment",
+        verbose_name="Сегмент получателей",
+        related_name="posts",
+        on_delete=models.RESTRICT,
+        null=True,
+        blank=True
+    )
 
     created_at = models.DateTimeField(
         verbose_name="Время создания",
@@ -53,10 +70,31 @@ class Post(models.Model):
         default=False,
     )
 
+    # progress of the mailing, it's updated from the live counters
+    # of bots_mailings.progress after every chunk
+    total_count = models.PositiveIntegerField("Получателей", default=0)
+    sent_count = models.PositiveIntegerField("Доставлено", default=0)
+    failed_count = models.PositiveIntegerField("Ошибок", default=0)
+    blocked_count = models.PositiveIntegerField(
+        "Заблокировали бота", default=0
+    )
+    started_at = models.DateTimeField(
+        "Начало отправки", null=True, blank=True
+    )
+    finished_at = models.DateTimeField(
+        "Конец отправки", null=True, blank=True
+    )
+
     class Meta:
         verbose_name = "Публикация"
         verbose_name_plural = "Публикации"
         db_table = "Posts"
+        indexes = [
+            # scheduled and unfinished mailings
+            models.Index(fields=["send_time"],
+                         condition=models.Q(is_done=False),
+                         name="post_pending_send_time_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"Post {self.id}"
@@ -79,26 +117,98 @@ class Post(models.Model):
             kwargs={"slug": self.bot.slug,
                     "pk": self.pk})
 
+    def get_progress_url(self):
+        return reverse(
+            "bots-management:mailings:mailing-progress",
+            kwargs={"slug": self.bot.slug,
+                    "pk": self.pk})
+
 
 class SentMessage(models.Model):
     """
     Model for saving chat and message info of sent Post.
     Only for Telegram messages.
+    Works as delivery ledger of the post: a row per receiver is created
+    before sending, so an interrupted mailing can be resumed.
     TODO:change and maybe rename model in future
     """
+    QUEUED = 'queued'
+    # claimed by a chunk right before sending, the post may be delivered
+    # already, so such rows are sent again only when they are stale
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    # the bot was blocked or the chat was deleted, it's not retried
+    BLOCKED = 'blocked'
+
+    STATUSES = [
+        (QUEUED, 'В очереди'),
+        (SENDING, 'Отправляется'),
+        (SENT, 'Отправлено'),
+        (FAILED, 'Ошибка'),
+        (BLOCKED, 'Бот заблокирован'),
+    ]
+
     chat_id = models.CharField("ID чата", max_length=255)
-    message_id = models.IntegerField("ID сообщения")
+    message_id = models.IntegerField("ID сообщения", null=True, blank=True)
     post = models.ForeignKey(
         to=Post,
         on_delete=models.CASCADE,
         related_name="sent_messages",
-        verbose_name="Пост, который относится к уникальному идентификатору на телеграмм сервере"
+        verbose_name="Пост, который относится к уникальному идентификатору на телеграмм сервере",
+        # covered by sentmessage_post_status_idx
+        db_index=False,
+    )
+    status = models.CharField(
+        "Статус доставки", max_length=16, choices=STATUSES, default=QUEUED
+    )
+    attempts = models.PositiveSmallIntegerField(
+        "Количество попыток", default=0
     )
+    updated_at = models.DateTimeField("Обновлено", auto_now=True)
 
     class Meta:
         verbose_name = "Уникальный идентификатор отправленного сообщения на сервере телеграмма."
         verbose_name_plural = "Уникальные идентификаторы отправленных сообщений на сервере телеграмма."
         db_table = "SentMessages"
+        unique_together = [["post", "chat_id"]]
+        indexes = [
+            # pending and sent receivers of the post in ledger order
+            models.Index(fields=["post", "status", "id"],
+                         name="sentmessage_post_status_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"Sent message {self.message_id} to {self.chat_id}"
+
+
+class MailingMedia(models.Model):
+    """
+    Telegram file_id of the uploaded mailing attachment.
+    Files are identified by content hash, file_id is valid only
+    for the bot, that uploaded the file.
+    """
+    PHOTO = 'photo'
+    DOCUMENT = 'document'
+
+    MEDIA_TYPES = [
+        (PHOTO, 'Картинка'),
+        (DOCUMENT, 'Файл'),
+    ]
+
+    content_hash = models.CharField("SHA-256 содержимого", max_length=64)
+    token = models.CharField("Токен", max_length=150)
+    media_type = models.CharField(
+        "Тип файла", max_length=16, choices=MEDIA_TYPES
+    )
+    file_id = models.CharField("Telegram file_id", max_length=255)
+    created_at = models.DateTimeField("Время загрузки", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Загруженный файл рассылки"
+        verbose_name_plural = "Загруженные файлы рассылок"
+        db_table = "MailingMedia"
+        unique_together = [["content_hash", "token"]]
+
+    def __str__(self) -> str:
+        return f"{self.media_type} {self.content_hash[:8]}"
@@ -0,0 +1,165 @@
+import threading
+from collections import Counter
+from time import time
+from typing import Iterable, Union
+
+from django.conf import settings
+
+from telegram_api.engine import DeliveryResult
+from telegram_api.retry import is_chat_unreachable
+
+
+# counters of the mailing, queued = total - sent - failed - blocked
+COUNTERS = ('total', 'sent', 'failed', 'blocked')
+
+
+class MemoryProgressStorage:
+    """
+    Mailing counters of this process.
+    Good enough for a single worker, the progress endpoint falls back
+    to the values saved in Post when it does not see them.
+    Chunks may run in other processes, so the saved values are counted
+    from the delivery ledger.
+    """
+    shared = False
+
+    def __init__(self):
+        self._progress = {}
+        self._lock = threading.Lock()
+
+    def start(self, post_id: int, counters: dict) -> None:
+        with self._lock:
+            self._progress[post_id] = dict(counters, started_at=time())
+
+    def incr(self, post_id: int, counters: dict) -> None:
+        with self._lock:
+            progress = self._progress.setdefault(post_id, {})
+            for name, amount in counters.items():
+                progress[name] = progress.get(name, 0) + amount
+
+    def get(self, post_id: int) -> dict:
+        with self._lock:
+            return dict(self._progress.get(post_id, {}))
+
+    def delete(self, post_id: int) -> None:
+        with self._lock:
+            self._progress.pop(post_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._progress.clear()
+
+
+class RedisProgressStorage:
+    """
+    Mailing counters in Redis hashes shared by all workers.
+    Counters are updated with HINCRBY, so chunks never lock each other.
+    """
+    shared = True
+
+    def __init__(self, connection, prefix: str = "tg-mailing",
+                 timeout: int = 24 * 60 * 60):
+        self.connection = connection
+        self.prefix = prefix
+        self.timeout = timeout
+
+    def _key(self, post_id: int) -> str:
+        return f"{self.prefix}:{post_id}"
+
+    def start(self, post_id: int, counters: dict) -> None:
+        key = self._key(post_id)
+        pipe = self.connection.pipeline()
+        pipe.delete(key)
+        pipe.hset(key, mapping=dict(counters, started_at=time()))
+        pipe.expire(key, self.timeout)
+        pipe.execute()
+
+    def incr(self, post_id: int, counters: dict) -> None:
+        key = self._key(post_id)
+        pipe = self.connection.pipeline()
+        for name, amount in counters.items():
+            pipe.hincrby(key, name, amount)
+        pipe.expire(key, self.timeout)
+        pipe.execute()
+
+    def get(self, post_id: int) -> dict:
+        return {
+            key.decode(): float(value) for key, value in
+            self.connection.hgetall(self._key(post_id)).items()
+        }
+
+    def delete(self, post_id: int) -> None:
+        self.connection.delete(self._key(post_id))
+
+    def clear(self) -> None:
+        for key in self.connection.scan_iter(f"{self.prefix}:*"):
+            self.connection.delete(key)
+
+
+_storage = None
+_lock = threading.Lock()
+
+
+def get_progress_storage():
+    """
+    Return counters storage, it uses the rate limit backend
+    """
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                if settings.TELEGRAM_RATE_LIMIT_BACKEND == "redis":
+                    from bots_settings.redis_connection import (
+                        get_redis_connection
+                    )
+                    _storage = RedisProgressStorage(get_redis_connection())
+                else:
+                    _storage = MemoryProgressStorage()
+    return _storage
+
+
+def get_result_status(result: DeliveryResult) -> str:
+    """
+    Return progress counter of the delivery result,
+    it's the SentMessage status of the receiver as well
+    """
+    if result.ok:
+        return 'sent'
+    if is_chat_unreachable(result.error):
+        # the bot was blocked by the user or the user is deactivated
+        return 'blocked'
+    return 'failed'
+
+
+def count_results(results: Iterable[DeliveryResult],
+                  previous: Iterable[Union[str, None]] = ()) -> dict:
+    """
+    Return changes of the counters after the results were saved.
+    `previous` are counters of the same receivers before
+    (None for queued ones), they are decremented.
+    """
+    counters = Counter(get_result_status(result) for result in results)
+    counters.subtract(name for name in previous if name)
+    return {name: amount for name, amount in counters.items() if amount}
+
+
+def calculate_progress(counters: dict, started_at: float = None,
+                       now: float = None) -> dict:
+    """
+    Add queued, rate (messages per second) and eta (seconds)
+    to the mailing counters
+    """
+    progress = {name: int(counters.get(name, 0)) for name in COUNTERS}
+    processed = progress['sent'] + progress['failed'] + progress['blocked']
+    progress['queued'] = max(0, progress['total'] - processed)
+    progress['rate'] = progress['eta'] = None
+
+    if started_at:
+        # receivers processed before a resumed mailing was started
+        # would make the rate too high
+        processed -= int(counters.get('processed_at_start', 0))
+        elapsed = (now or time()) - started_at
+        if elapsed > 0 and processed > 0:
+            progress['rate'] = round(processed / elapsed, 2)
+            progress['eta'] = round(progress['queued'] / progress['rate'])
+    return progress
@@ -1,17 +1,335 @@
-from typing import Union
+import hashlib
+from datetime import timedelta
+from typing import Iterable, List, Tuple, Union
 
-from bots_mailings.models import Post, SentMessage
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q, QuerySet
+from django.db.models.fields.files import FieldFile
+from django.utils import timezone
+
+from bots_mailings.models import MailingMedia, Post, SentMessage
+from bots_mailings.progress import (
+    calculate_progress,
+    count_results,
+    get_progress_storage,
+    get_result_status
+)
+from subscribers.services import (
+    deactivate_subscribers,
+    get_all_active_subs,
+    get_segment_subscribers
+)
+from telegram_api.engine import DeliveryResult, iter_chunks
 
 
-# TODO: fix
 def create_sent_message_object(
         chat_id: Union[int, str], message_id: str, post: Post) -> None:
     """
-    Create an object of SentMessage model
+    Create an object of SentMessage model.
+    Use SentMessageWriter to save many of them.
+    """
+    with SentMessageWriter(post) as writer:
+        writer.add(DeliveryResult(chat_id=chat_id, message_id=message_id))
+
+
+def create_delivery_ledger(post: Post) -> None:
+    """
+    Create queued SentMessage for every receiver of the post.
+    Receivers, that already have a row, are skipped, so it's safe
+    to call it again for the same post.
+    """
+    chat_ids = get_post_receivers(post).values_list(
+        'chat_id', flat=True
+    ).order_by('id').iterator()
+    for chunk in iter_chunks(chat_ids, settings.MAILING_CHUNK_SIZE):
+        SentMessage.objects.bulk_create(
+            [SentMessage(post=post, chat_id=chat_id) for chat_id in chunk],
+            ignore_conflicts=True
+        )
+
+
+def get_pending_deliveries(post: Post) -> QuerySet:
+    """
+    Return SentMessages of the post, that still have to be sent
+    """
+    return post.sent_messages.filter(
+        status__in=[SentMessage.QUEUED, SentMessage.FAILED],
+        attempts__lt=settings.MAILING_MAX_ATTEMPTS,
+    )
+
+
+def claim_deliveries(post: Post, chat_ids: Iterable) -> List[str]:
+    """
+    Mark pending SentMessages of the chats as sending and return
+    chat ids, that were claimed by this call.
+    Chats claimed by another task are skipped, so a chunk, that was
+    redelivered or dispatched twice, never sends the post again.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        statuses = dict(
+            get_pending_deliveries(post).filter(chat_id__in=chat_ids)
+            .select_for_update(skip_locked=True)
+            .values_list('id', 'status')
+        )
+        get_pending_deliveries(post).filter(id__in=statuses).update(
+            status=SentMessage.SENDING, updated_at=now
+        )
+    # without row locks (sqlite) another task may have read the same
+    # rows, the time of the update tells, whose claim has won
+    claimed = dict(SentMessage.objects.filter(
+        id__in=statuses, status=SentMessage.SENDING, updated_at=now
+    ).values_list('id', 'chat_id'))
+    # failed ones are counted again, when their new result is saved
+    failed = sum(
+        statuses[pk] == SentMessage.FAILED for pk in claimed
+    )
+    if failed:
+        get_progress_storage().incr(post.id, {'failed': -failed})
+    return list(claimed.values())
+
+
+def release_stale_deliveries(post: Post) -> int:
+    """
+    Mark SentMessages of the post, that were claimed, but got no result
+    for MAILING_STALE_TIMEOUT (the worker died while sending them), failed,
+    so they are sent again. Some of them may get the post twice.
+    Returns number of released rows.
     """
-    sent_post = SentMessage(
-        chat_id=chat_id,
-        message_id=message_id,
-        post=post,
+    now = timezone.now()
+    return post.sent_messages.filter(
+        status=SentMessage.SENDING,
+        updated_at__lt=now - timedelta(seconds=settings.MAILING_STALE_TIMEOUT)
+    ).update(
+        status=SentMessage.FAILED, attempts=F('attempts') + 1, updated_at=now
+    )
+
+
+def has_claimed_deliveries(post_id: int) -> bool:
+    """
+    Check whether the post has SentMessages, that are being sent
+    """
+    return SentMessage.objects.filter(
+        post_id=post_id, status=SentMessage.SENDING
+    ).exists()
+
+
+class SentMessageWriter:
+    """
+    Buffer for delivery results of the post.
+    Results are saved with bulk queries every `batch_size` items
+    and when the writer is closed:
+
+        with SentMessageWriter(post) as writer:
+            for result in results:
+                writer.add(result)
+    """
+
+    def __init__(self, post: Post, batch_size: int = None):
+        self.post = post
+        self.batch_size = batch_size or settings.MAILING_WRITE_BATCH_SIZE
+        self._results = []
+
+    def __enter__(self) -> 'SentMessageWriter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
+
+    def add(self, result: DeliveryResult) -> None:
+        self._results.append(result)
+        if len(self._results) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Update ledger rows of buffered results,
+        rows that do not exist yet are created
+        """
+        results, self._results = self._results, []
+        if not results:
+            return
+
+        existing = {
+            chat_id: (pk, attempts, status)
+            for chat_id, pk, attempts, status in
+            self.post.sent_messages.filter(
+                chat_id__in=[result.chat_id for result in results]
+            ).values_list('chat_id', 'id', 'attempts', 'status')
+        }
+        now = timezone.now()
+        to_update, to_create, previous, blocked = [], [], [], []
+        for result in results:
+            chat_id = str(result.chat_id)
+            pk, attempts, status = existing.get(chat_id, (None, 0, None))
+            if status not in (SentMessage.QUEUED, SentMessage.SENDING):
+                previous.append(status)
+            new_status = get_result_status(result)
+            if new_status == SentMessage.BLOCKED:
+                blocked.append(chat_id)
+            message = SentMessage(
+                pk=pk,
+                post=self.post,
+                chat_id=chat_id,
+                message_id=result.message_id,
+                status=new_status,
+                attempts=attempts + 1,
+                updated_at=now,
+            )
+            (to_update if pk else to_create).append(message)
+
+        if to_update:
+            SentMessage.objects.bulk_update(
+                to_update, ['message_id', 'status', 'attempts', 'updated_at']
+            )
+        if to_create:
+            SentMessage.objects.bulk_create(to_create, ignore_conflicts=True)
+        get_progress_storage().incr(
+            self.post.id, count_results(results, previous)
+        )
+        if blocked:
+            # next mailings skip them
+            deactivate_subscribers(self.post.bot_id, blocked)
+
+
+def count_deliveries(post_id: int) -> dict:
+    """
+    Return mailing counters of the post counted from its delivery ledger
+    """
+    return SentMessage.objects.filter(post_id=post_id).aggregate(
+        total=Count('id'),
+        sent=Count('id', filter=Q(status=SentMessage.SENT)),
+        failed=Count('id', filter=Q(status=SentMessage.FAILED)),
+        blocked=Count('id', filter=Q(status=SentMessage.BLOCKED)),
+    )
+
+
+def start_mailing_progress(post: Post) -> None:
+    """
+    Reset live counters of the post from its delivery ledger.
+    Called by the mailing coordinator, so a resumed mailing
+    continues from the saved state.
+    """
+    counters = count_deliveries(post.id)
+    counters['processed_at_start'] = (
+        counters['sent'] + counters['failed'] + counters['blocked']
+    )
+    get_progress_storage().start(post.id, counters)
+
+    post.started_at = post.started_at or timezone.now()
+    post.total_count = counters['total']
+    post.sent_count = counters['sent']
+    post.failed_count = counters['failed']
+    post.blocked_count = counters['blocked']
+    post.save(update_fields=[
+        'started_at', 'total_count', 'sent_count',
+        'failed_count', 'blocked_count'
+    ])
+
+
+def save_mailing_progress(post_id: int, finished: bool = False) -> None:
+    """
+    Save live counters of the post to the db.
+    Counters of this process are not the whole mailing, if the storage
+    is not shared, so they are counted from the ledger then.
+    """
+    storage = get_progress_storage()
+    if storage.shared:
+        counters = storage.get(post_id)
+    else:
+        counters = count_deliveries(post_id)
+    fields = {}
+    if counters:
+        progress = calculate_progress(counters)
+        fields = {
+            f'{name}_count': progress[name]
+            for name in ('total', 'sent', 'failed', 'blocked')
+        }
+    if finished:
+        fields['finished_at'] = timezone.now()
+        storage.delete(post_id)
+    if fields:
+        Post.objects.filter(id=post_id).update(**fields)
+
+
+def get_mailing_progress(post: Post) -> dict:
+    """
+    Return counters, rate and eta of the mailing.
+    Live counters are used while the mailing is sent,
+    the ones saved in the post otherwise.
+    """
+    counters = get_progress_storage().get(post.id)
+    if counters and not post.is_done:
+        progress = calculate_progress(counters, counters.get('started_at'))
+    else:
+        progress = calculate_progress({
+            'total': post.total_count,
+            'sent': post.sent_count,
+            'failed': post.failed_count,
+            'blocked': post.blocked_count,
+        })
+        if post.started_at and post.finished_at:
+            elapsed = (post.finished_at - post.started_at).total_seconds()
+            if elapsed > 0:
+                progress['rate'] = round(
+                    (progress['total'] - progress['queued']) / elapsed, 2
+                )
+    progress['is_done'] = post.is_done
+    return progress
+
+
+def get_post_receivers(post: Post) -> QuerySet:
+    """
+    Return subscribers of the segment of the post, subscribers
+    chosen for the post or all active subscribers of the bot
+    """
+    if post.segment_id is not None:
+        return get_segment_subscribers(post.segment)
+    receivers = post.send_to.all()
+    if not receivers.exists():
+        receivers = get_all_active_subs(bot=post.bot)
+    return receivers
+
+
+def get_post_media(post: Post) -> Union[Tuple[str, FieldFile], None]:
+    """
+    Return type and file of the post attachment
+    """
+    if post.image:
+        return MailingMedia.PHOTO, post.image
+    if post.file:
+        return MailingMedia.DOCUMENT, post.file
+    return None
+
+
+def get_content_hash(field: FieldFile) -> str:
+    """
+    Return SHA-256 of the file, it's read by chunks
+    """
+    content_hash = hashlib.sha256()
+    with field.storage.open(field.name, 'rb') as file:
+        for chunk in iter(lambda: file.read(64 * 1024), b''):
+            content_hash.update(chunk)
+    return content_hash.hexdigest()
+
+
+def get_media_file_id(content_hash: str, token: str) -> Union[str, None]:
+    """
+    Return file_id of the file already uploaded by the bot
+    """
+    return MailingMedia.objects.filter(
+        content_hash=content_hash, token=token
+    ).values_list('file_id', flat=True).first()
+
+
+def save_media_file_id(content_hash: str, token: str,
+                       media_type: str, file_id: str) -> None:
+    MailingMedia.objects.update_or_create(
+        content_hash=content_hash,
+        token=token,
+        defaults={
+            'media_type': media_type,
+            'file_id': file_id,
+        }
     )
-    sent_post.save()
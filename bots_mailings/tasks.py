@@ -1,64 +1,158 @@
 import logging
+from datetime import timedelta
+from typing import List
 
-from celery import shared_task
-from django.db.models import QuerySet
+from celery import shared_task, chord
+from django.conf import settings
+from django.db.models import Max
+from django.utils import timezone
 
 from bots_mailings.models import Post
+from bots_mailings.services import (
+    claim_deliveries,
+    create_delivery_ledger,
+    get_pending_deliveries,
+    has_claimed_deliveries,
+    release_stale_deliveries,
+    save_mailing_progress,
+    start_mailing_progress,
+    SentMessageWriter
+)
 from bots_mailings.utils import (
-    send_action_to_telegram_users,
+    send_post_to_telegram_users,
+    upload_post_media,
     delete_telegram_messages
 )
-from subscribers.services import (
-    get_all_active_subs
-)
+from telegram_api.engine import iter_chunks
+
 logger = logging.getLogger(__name__)
 
 
 @shared_task
 def send_mailing(post_id: int) -> None:
     """
-    Celery task for sending a mailing to a user/group of users
+    Celery task for sending a mailing to a user/group of users.
+    Creates delivery ledger of the post and splits receivers, that
+    still wait for the post, into chunks. Every chunk is sent by
+    a separate task, post is marked as done when all of them are finished.
+    Calling it again for an interrupted mailing resumes it.
+    """
+    try:
+        # Moderator can delete post model before this function starts
+        post: Post = Post.objects.select_related('bot').get(id=post_id)
+    except Post.DoesNotExist as e:
+        logger.info(e)
+        return
+    if post.is_done:
+        return
+
+    create_delivery_ledger(post)
+    release_stale_deliveries(post)
+    start_mailing_progress(post)
+    # attachment is uploaded here once, chunks send it by file_id
+    file_id = upload_post_media(post)
+    chunks = iter_chunks(
+        get_pending_deliveries(post).values_list('chat_id', flat=True)
+        .order_by('id').iterator(),
+        settings.MAILING_CHUNK_SIZE
+    )
+    header = [
+        send_mailing_chunk.s(post_id, chunk, file_id) for chunk in chunks
+    ]
+    if not header:
+        finish_mailing([], post_id)
+        return
+    chord(header)(finish_mailing.s(post_id))
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def send_mailing_chunk(post_id: int, chat_ids: List[str],
+                       file_id: str = None) -> int:
+    """
+    Celery task for sending a mailing to one chunk of receivers.
+    Receivers are claimed by batches right before sending and results
+    are saved as they come, so a redelivered or repeated chunk skips
+    receivers, that got the post or may have got it, when the worker died.
+    Returns number of delivered messages.
     """
+    try:
+        post: Post = Post.objects.select_related('bot').get(id=post_id)
+    except Post.DoesNotExist as e:
+        logger.info(e)
+        return 0
 
-    # try:
-    #     # Moderator can delete post model before this function starts
-    #     post: Post = Post.objects.get(id=post_id)
-    # except Post.DoesNotExist as e:
-    #     logger.info(e)
-    #     return
-    #
-    # receivers: QuerySet = post.send_to.all()
-    # if not receivers:
-    #     receivers: QuerySet = get_all_active_subs(bot=post.bot)
-    #
-    # telegram_users: list = []
-    # viber_users: list = []
-    # [telegram_users.append(receiver) if is_telegram_subscriber(receiver)
-    #  else viber_users.append(receiver) for receiver in receivers]
-    #
-    # for action in post.actions.all():
-    #     send_action_to_telegram_users(
-    #         subscriber_list=telegram_users,
-    #         action=action,
-    #         post=post
-    #     )
-    #
-    # post.is_done = True
-    # post.save()
-    pass
+    delivered = 0
+    with SentMessageWriter(post) as writer:
+        for batch in iter_chunks(chat_ids, settings.MAILING_WRITE_BATCH_SIZE):
+            for result in send_post_to_telegram_users(
+                    chat_ids=claim_deliveries(post, batch),
+                    post=post, file_id=file_id
+            ):
+                writer.add(result)
+                delivered += result.ok
+    save_mailing_progress(post_id)
+    return delivered
 
 
 @shared_task
-def delete_mailing(post_id: int) -> None:
+def finish_mailing(chunk_results: List[int], post_id: int) -> None:
     """
-        Celery task for deleting a mailing to a user/group of users
+    Chord callback, marks the post as done.
+    Receivers, that are still claimed by a dead chunk, are sent
+    by resume_mailings, the post stays not done till then.
     """
-    # try:
-    #     print(post_id)
-    #     post: Post = Post.objects.get(id=post_id)
-    # except Post.DoesNotExist as e:
-    #     logger.info(e)
-    #     return
-    #
-    # delete_telegram_messages(post.sent_messages.all())
-    pass
\ No newline at end of file
+    if has_claimed_deliveries(post_id):
+        save_mailing_progress(post_id)
+        logger.warning(
+            f"Post {post_id} has unfinished deliveries, it will be resumed"
+        )
+        return
+    updated = Post.objects.filter(id=post_id).update(is_done=True)
+    save_mailing_progress(post_id, finished=True)
+    if updated:
+        logger.info(
+            f"Post {post_id} is sent, delivered: {sum(chunk_results)}"
+        )
+
+
+@shared_task
+def resume_mailings() -> None:
+    """
+    Celery task for resuming mailings, that were started, but have no
+    progress for MAILING_STALE_TIMEOUT, e.g. after all workers were restarted.
+    Chunks of the previous run, that are still in the broker, may run
+    next to the new ones, receivers are claimed, so nobody gets it twice.
+    Receivers claimed by dead chunks are sent again, they may get it twice.
+    """
+    stale_since = timezone.now() - timedelta(
+        seconds=settings.MAILING_STALE_TIMEOUT
+    )
+    posts = Post.objects.filter(is_done=False).annotate(
+        last_update=Max('sent_messages__updated_at')
+    ).filter(last_update__lt=stale_since).values_list('id', flat=True)
+    for post_id in posts:
+        send_mailing.delay(post_id)
+
+
+@shared_task(bind=True)
+def delete_mailing(self, post_id: int) -> None:
+    """
+    Celery task for deleting a mailing to a user/group of users.
+    Deletes sent messages in Telegram and then the post itself,
+    progress is reported as PROGRESS state of the task.
+    """
+    try:
+        post: Post = Post.objects.select_related('bot').get(id=post_id)
+    except Post.DoesNotExist as e:
+        logger.info(e)
+        return
+
+    def report_progress(done: int, total: int) -> None:
+        # a direct call has no task id to report the progress to
+        if self.request.id:
+            self.update_state(
+                state='PROGRESS', meta={'done': done, 'total': total}
+            )
+
+    delete_telegram_messages(post, on_progress=report_progress)
+    post.delete()
@@ -0,0 +1,35 @@
+from bots_mailings.forms import MailingForm
+from bots_management.tests.utils import BotTestCase
+from subscribers.models import Segment, Subscriber
+
+
+class MailingFormTestCase(BotTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.subscriber = Subscriber.objects.create(chat_id="1", bot=cls.bot)
+        cls.segment = Segment.objects.create(
+            bot=cls.bot, name="buyers", min_orders=1, size=12
+        )
+
+    def get_form(self, data):
+        return MailingForm(data, user=self.owner, channel_slug="bot")
+
+    def test_segments_of_the_bot_are_offered(self):
+        form = self.get_form({})
+        self.assertEqual(
+            list(form.fields["segment"].choices)[1][1], "buyers (12)"
+        )
+
+    def test_segment_is_saved(self):
+        form = self.get_form({"segment": self.segment.pk})
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data["segment"], self.segment)
+
+    def test_segment_and_subscribers_are_not_allowed_together(self):
+        form = self.get_form({
+            "segment": self.segment.pk,
+            "send_to": [self.subscriber.pk],
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn("__all__", form.errors)
@@ -0,0 +1,143 @@
+from unittest import mock
+
+from django.http import Http404
+from django.test import RequestFactory, SimpleTestCase, TestCase
+
+from bots_mailings.models import Post, SentMessage
+from bots_mailings.progress import (
+    COUNTERS,
+    MemoryProgressStorage,
+    RedisProgressStorage,
+    calculate_progress,
+    count_results,
+    get_progress_storage
+)
+from bots_mailings.services import (
+    get_mailing_progress,
+    save_mailing_progress,
+    start_mailing_progress
+)
+from bots_mailings.views import MailingProgressView
+from bots_management.tests.utils import BotTestCase, create_bot
+from telegram_api.engine import DeliveryResult
+from telegram_api.tests.test_retry import api_error
+from telegram_api.tests.utils import use_memory_backend
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+class ProgressTestCase(TestCase):
+    def test_count_results(self):
+        results = [
+            DeliveryResult(chat_id=1, message_id=1),
+            DeliveryResult(chat_id=2, error=api_error(403)),
+            DeliveryResult(chat_id=3, error=api_error(400)),
+            DeliveryResult(chat_id=4, message_id=2),
+        ]
+        self.assertEqual(
+            count_results(results, previous=["failed", "failed"]),
+            {"sent": 2, "blocked": 1, "failed": -1}
+        )
+
+    def test_calculate_progress(self):
+        counters = {"total": 100, "sent": 30, "failed": 5, "blocked": 5,
+                    "processed_at_start": 20}
+        progress = calculate_progress(counters, started_at=10, now=20)
+        self.assertEqual(progress["queued"], 60)
+        self.assertEqual(progress["rate"], 2)
+        self.assertEqual(progress["eta"], 30)
+
+    def test_calculate_progress_without_sent_messages(self):
+        progress = calculate_progress({"total": 10}, started_at=10, now=20)
+        self.assertEqual(progress["queued"], 10)
+        self.assertIsNone(progress["rate"])
+        self.assertIsNone(progress["eta"])
+
+
+class MailingProgressTestCase(BotTestCase):
+    def setUp(self):
+        use_memory_backend(self, "bots_mailings.progress._storage")
+        self.addCleanup(get_progress_storage().clear)
+
+    def test_live_progress(self):
+        post = Post.objects.create(bot=self.bot, url="https://example.com")
+        post.sent_messages.create(chat_id="1")
+        post.sent_messages.create(chat_id="2")
+        start_mailing_progress(post)
+        get_progress_storage().incr(post.id, {"sent": 1})
+
+        data = get_mailing_progress(post)
+        self.assertEqual(
+            (data["total"], data["sent"], data["queued"], data["is_done"]),
+            (2, 1, 1, False)
+        )
+
+    def test_progress_saved_by_another_process(self):
+        post = Post.objects.create(bot=self.bot, url="https://example.com")
+        post.sent_messages.create(chat_id="1", status=SentMessage.SENT)
+        post.sent_messages.create(chat_id="2", status=SentMessage.SENT)
+        post.sent_messages.create(chat_id="3", status=SentMessage.FAILED)
+        post.sent_messages.create(chat_id="4")
+        # the chunk process knows only its own increments
+        storage = MemoryProgressStorage()
+        storage.incr(post.id, {"sent": 1})
+        with mock.patch("bots_mailings.services.get_progress_storage",
+                        return_value=storage):
+            save_mailing_progress(post.id)
+
+        post.refresh_from_db()
+        self.assertEqual(
+            (post.total_count, post.sent_count,
+             post.failed_count, post.blocked_count),
+            (4, 2, 1, 0)
+        )
+
+    def test_saved_progress(self):
+        post = Post.objects.create(
+            bot=self.bot, url="https://example.com", is_done=True,
+            total_count=3, sent_count=2, blocked_count=1
+        )
+
+        data = get_mailing_progress(post)
+        self.assertEqual(
+            (data["sent"], data["blocked"], data["queued"], data["is_done"]),
+            (2, 1, 0, True)
+        )
+
+    def test_progress_of_other_bot_is_not_shown(self):
+        own_post = Post.objects.create(bot=self.bot)
+        other_post = Post.objects.create(
+            bot=create_bot(self.owner, slug="other", token="2:token")
+        )
+
+        def get_post(post):
+            view = MailingProgressView()
+            view.setup(RequestFactory().get("/"), slug="bot", pk=post.pk)
+            return view.get_object()
+        self.assertEqual(get_post(own_post), own_post)
+        with self.assertRaises(Http404):
+            get_post(other_post)
+
+
+class RedisProgressStorageTestCase(SimpleTestCase):
+    def setUp(self):
+        if fakeredis is None:
+            self.skipTest("fakeredis is not installed")
+        self.storage = RedisProgressStorage(fakeredis.FakeStrictRedis())
+
+    def test_counters(self):
+        self.storage.start(1, {"total": 10, "sent": 2})
+        self.storage.incr(1, {"sent": 3, "failed": 1})
+        self.storage.incr(1, {"failed": -1, "blocked": 1})
+        progress = self.storage.get(1)
+        self.assertEqual(
+            {name: progress[name] for name in COUNTERS},
+            {"total": 10, "sent": 5, "failed": 0, "blocked": 1}
+        )
+        self.assertIn("started_at", progress)
+
+        self.storage.delete(1)
+        self.assertEqual(self.storage.get(1), {})
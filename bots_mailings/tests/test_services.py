@@ -0,0 +1,104 @@
+from django.db.models import RestrictedError
+
+from bots_mailings.models import Post, SentMessage
+from bots_mailings.services import (
+    SentMessageWriter, claim_deliveries, create_delivery_ledger,
+    get_pending_deliveries
+)
+from bots_management.models import Bot
+from bots_management.tests.utils import BotTestCase
+from subscribers.models import Segment, Subscriber
+from telegram_api.engine import DeliveryResult
+from telegram_api.tests.utils import use_memory_backend
+
+
+class DeliveryLedgerTestCase(BotTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for chat_id in range(10):
+            Subscriber.objects.create(chat_id=str(chat_id), bot=cls.bot)
+
+    def setUp(self):
+        use_memory_backend(self, "bots_mailings.progress._storage")
+        self.post = Post.objects.create(bot=self.bot)
+
+    def test_ledger_is_created_once(self):
+        create_delivery_ledger(self.post)
+        create_delivery_ledger(self.post)
+        self.assertEqual(self.post.sent_messages.count(), 10)
+        self.assertEqual(get_pending_deliveries(self.post).count(), 10)
+
+    def test_ledger_of_segment(self):
+        Subscriber.objects.filter(chat_id__in=["1", "2"]).update(
+            is_admin=True
+        )
+        self.post.segment = Segment.objects.create(
+            bot=self.bot, name="admins", is_admin=True
+        )
+        self.post.save()
+        create_delivery_ledger(self.post)
+        self.assertEqual(
+            set(self.post.sent_messages.values_list("chat_id", flat=True)),
+            {"1", "2"}
+        )
+
+    def test_segment_of_post_is_not_deleted(self):
+        segment = Segment.objects.create(bot=self.bot, name="admins")
+        self.post.segment = segment
+        self.post.save()
+        with self.assertRaises(RestrictedError):
+            segment.delete()
+
+    def test_bot_with_segmented_post_is_deleted(self):
+        self.post.segment = Segment.objects.create(bot=self.bot, name="admins")
+        self.post.save()
+        # a copy, the bot of the class is used by other tests
+        Bot.objects.get(id=self.bot.id).delete()
+        self.assertFalse(Post.objects.filter(id=self.post.id).exists())
+        self.assertFalse(Segment.objects.exists())
+
+    def test_deliveries_are_claimed_once(self):
+        create_delivery_ledger(self.post)
+        self.assertEqual(
+            sorted(claim_deliveries(self.post, ["1", "2"])), ["1", "2"]
+        )
+        self.assertEqual(claim_deliveries(self.post, ["1", "2", "3"]), ["3"])
+        self.assertEqual(get_pending_deliveries(self.post).count(), 7)
+
+        # a sending row gets its result as usual
+        with SentMessageWriter(self.post) as writer:
+            writer.add(DeliveryResult(chat_id=1, message_id=10))
+        self.assertEqual(
+            self.post.sent_messages.get(chat_id="1").status,
+            SentMessage.SENT
+        )
+
+    def test_writer_saves_in_batches(self):
+        create_delivery_ledger(self.post)
+        writer = SentMessageWriter(self.post, batch_size=4)
+        # 1 select and 1 update for the full batch
+        with self.assertNumQueries(2):
+            for chat_id in range(4):
+                writer.add(DeliveryResult(chat_id=chat_id, message_id=chat_id))
+        with self.assertNumQueries(0):
+            writer.add(DeliveryResult(chat_id=4, error=ValueError()))
+        writer.flush()
+
+        self.assertEqual(
+            self.post.sent_messages.filter(status=SentMessage.SENT).count(), 4
+        )
+        self.assertEqual(
+            self.post.sent_messages.get(chat_id="4").status,
+            SentMessage.FAILED
+        )
+        self.assertEqual(get_pending_deliveries(self.post).count(), 6)
+
+    def test_writer_creates_missing_rows_on_exit(self):
+        with SentMessageWriter(self.post) as writer:
+            writer.add(DeliveryResult(chat_id=1, message_id=10))
+        message = self.post.sent_messages.get()
+        self.assertEqual(
+            (message.chat_id, message.message_id, message.attempts),
+            ("1", 10, 1)
+        )
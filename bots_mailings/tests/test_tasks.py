@@ -0,0 +1,323 @@
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from django.utils import timezone
+from telebot.apihelper import ApiException
+
+from bots_settings.celery import app
+from bots_mailings.models import MailingMedia, Post, SentMessage
+from bots_mailings.progress import get_progress_storage
+from bots_mailings.services import create_delivery_ledger
+from bots_mailings.tasks import (
+    delete_mailing, resume_mailings, send_mailing, send_mailing_chunk
+)
+from bots_management.tests.utils import BotTestCase
+from subscribers.models import Subscriber
+from telegram_api.engine import DeliveryResult
+from telegram_api.tests.utils import use_memory_backend
+
+
+class SendMailingTestCase(BotTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for chat_id in range(5):
+            Subscriber.objects.create(chat_id=str(chat_id), bot=cls.bot)
+        Subscriber.objects.create(chat_id="100", bot=cls.bot, is_active=False)
+
+    def setUp(self):
+        use_memory_backend(self, "bots_mailings.progress._storage")
+        self.client_mock = mock.Mock()
+        self.client_mock.send_message.side_effect = (
+            lambda chat_id, text: mock.Mock(message_id=int(chat_id) + 1)
+        )
+        patcher = mock.patch("bots_mailings.utils.get_client",
+                             return_value=self.client_mock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, "task_always_eager", False)
+        self.addCleanup(get_progress_storage().clear)
+
+    def test_send_to_all_active_subscribers(self):
+        post = Post.objects.create(bot=self.bot, url="https://example.com")
+        send_mailing(post.id)
+
+        post.refresh_from_db()
+        self.assertTrue(post.is_done)
+        self.assertEqual(
+            sorted(SentMessage.objects.filter(post=post)
+                   .values_list("chat_id", "message_id", "status")),
+            [(str(chat_id), chat_id + 1, SentMessage.SENT)
+             for chat_id in range(5)]
+        )
+
+    @override_settings(MAILING_CHUNK_SIZE=2)
+    def test_receivers_are_split_into_chunks(self):
+        post = Post.objects.create(bot=self.bot, url="https://example.com")
+        with mock.patch(
+                "bots_mailings.tasks.send_post_to_telegram_users",
+                side_effect=lambda chat_ids, post, file_id: [
+                    DeliveryResult(chat_id=chat_id, message_id=1)
+                    for chat_id in chat_ids
+                ]) as send:
+            send_mailing(post.id)
+
+        self.assertEqual(
+            [kwargs["chat_ids"] for _, kwargs in send.call_args_list],
+            [["0", "1"], ["2", "3"], ["4"]]
+        )
+        post.refresh_from_db()
+        self.assertTrue(post.is_done)
+
+    def test_post_without_receivers_is_done(self):
+        Subscriber.objects.update(is_active=False)
+        post = Post.objects.create(bot=self.bot, url="https://example.com")
+        send_mailing(post.id)
+
+        post.refresh_from_db()
+        self.assertTrue(post.is_done)
+
+    def test_send_to_chosen_subscribers(self):
+        post = Post.objects.create(bot=self.bot, url="https://example.com")
+        post.send_to.add(*Subscriber.objects.filter(chat_id__in=["1", "2"]))
+        send_mailing(post.id)
+
+        self.assertEqual(
+            sorted(SentMessage.objects.values_list("chat_id", flat=True)),
+            ["1", "2"]
+        )
+
+    def test_failed_receivers_are_recorded(self):
+        self.client_mock.send_message.side_effect = ValueError
+        post = Post.objects.create(bot=self.bot, url="https://example.com")
+        send_mailing(post.id)
+
+        self.assertEqual(
+            set(SentMessage.objects.values_list("status", "attempts")),
+            {(SentMessage.FAILED, 1)}
+        )
+
+    def test_interrupted_mailing_is_resumed(self):
+        post = Post.objects.create(bot=self.bot, url="https://example.com")
+        SentMessage.objects.create(
+            post=post, chat_id="0", message_id=1, status=SentMessage.SENT
+        )
+        SentMessage.objects.create(post=post, chat_id="1")
+        send_mailing(post.id)
+
+        sent_to = [kwargs["chat_id"] for _, kwargs
+                   in self.client_mock.send_message.call_args_list]
+        self.assertEqual(sorted(sent_to), ["1", "2", "3", "4"])
+        self.assertEqual(
+            SentMessage.objects.filter(status=SentMessage.SENT).count(), 5
+        )
+
+    def send_and_die(self, sent: int):
+        """Replacement of the sender, that dies after `sent` deliveries"""
+        calls = []
+
+        def send(chat_ids, post, file_id):
+            for chat_id in chat_ids:
+                if len(calls) >= sent:
+                    raise SystemExit("worker lost")
+                calls.append(chat_id)
+                yield DeliveryResult(chat_id=chat_id, message_id=1)
+        return mock.patch("bots_mailings.tasks.send_post_to_telegram_users",
+                          side_effect=send)
+
+    @override_settings(MAILING_WRITE_BATCH_SIZE=2)
+    def test_interrupted_chunk_is_not_sent_again(self):
+        post = Post.objects.create(bot=self.bot, url="https://example.com")
+        create_delivery_ledger(post)
+        chat_ids = [str(chat_id) for chat_id in range(5)]
+        with self.send_and_die(sent=1), self.assertRaises(SystemExit):
+            send_mailing_chunk(post.id, chat_ids)
+        # only the batch in flight is claimed
+        self.assertEqual(
+            sorted(post.sent_messages.values_list("chat_id", "status")),
+            [("0", SentMessage.SENT), ("1", SentMessage.SENDING),
+             ("2", SentMessage.QUEUED), ("3", SentMessage.QUEUED),
+             ("4", SentMessage.QUEUED)]
+        )
+
+        # the redelivered chunk
+        self.assertEqual(send_mailing_chunk(post.id, chat_ids), 3)
+        sent_to = [kwargs["chat_id"] for _, kwargs
+                   in self.client_mock.send_message.call_args_list]
+        self.assertEqual(sorted(sent_to), ["2", "3", "4"])
+
+    @override_settings(MAILING_WRITE_BATCH_SIZE=2)
+    def test_crashed_mailing_is_resumed(self):
+        post = Post.objects.create(bot=self.bot, url="https://example.com")
+        with self.send_and_die(sent=1), self.assertRaises(SystemExit):
+            send_mailing(post.id)
+
+        # the claimed receiver may have got the post, it waits
+        send_mailing(post.id)
+        post.refresh_from_db()
+        self.assertFalse(post.is_done)
+        self.assertEqual(
+            post.sent_messages.get(status=SentMessage.SENDING).chat_id, "1"
+        )
+
+        # the dead chunk has no progress for MAILING_STALE_TIMEOUT
+        post.sent_messages.update(
+            updated_at=timezone.now() - timedelta(hours=1)
+        )
+        resume_mailings()
+        post.refresh_from_db()
+        self.assertTrue(post.is_done)
+        self.assertEqual(
+            sorted(post.sent_messages.values_list("chat_id", "status")),
+            [(str(chat_id), SentMessage.SENT) for chat_id in range(5)]
+        )
+        self.assertEqual((post.sent_count, post.failed_count), (5, 0))
+
+    def test_progress_is_saved(self):
+        self.client_mock.send_message.side_effect = (
+            lambda chat_id, text: mock.Mock(message_id=1) if chat_id != "4"
+            else self.raise_error(ValueError)
+        )
+        post = Post.objects.create(bot=self.bot, url="https://example.com")
+        SentMessage.objects.create(
+            post=post, chat_id="0", status=SentMessage.FAILED, attempts=1
+        )
+        send_mailing(post.id)
+
+        post.refresh_from_db()
+        self.assertEqual(
+            (post.total_count, post.sent_count,
+             post.failed_count, post.blocked_count),
+            (5, 4, 1, 0)
+        )
+        self.assertIsNotNone(post.started_at)
+        self.assertIsNotNone(post.finished_at)
+        self.assertEqual(get_progress_storage().get(post.id), {})
+
+    def test_blocked_receivers_are_deactivated(self):
+        blocked = mock.Mock(status_code=403)
+        blocked.json.return_value = {
+            "ok": False, "error_code": 403,
+            "description": "Forbidden: bot was blocked by the user",
+        }
+        self.client_mock.send_message.side_effect = (
+            lambda chat_id, text: mock.Mock(message_id=1) if chat_id != "4"
+            else self.raise_error(
+                ApiException("blocked", "sendMessage", blocked)
+            )
+        )
+        post = Post.objects.create(bot=self.bot, url="https://example.com")
+        send_mailing(post.id)
+
+        post.refresh_from_db()
+        self.assertEqual(post.blocked_count, 1)
+        self.assertEqual(
+            SentMessage.objects.get(post=post, chat_id="4").status,
+            SentMessage.BLOCKED
+        )
+        self.assertFalse(
+            Subscriber.objects.get(bot=self.bot, chat_id="4").is_active
+        )
+        self.assertEqual(
+            Subscriber.objects.filter(bot=self.bot, is_active=True).count(), 4
+        )
+
+    @staticmethod
+    def raise_error(error):
+        raise error
+
+    def test_done_post_is_not_sent_again(self):
+        post = Post.objects.create(
+            bot=self.bot, url="https://example.com", is_done=True
+        )
+        send_mailing(post.id)
+        self.client_mock.send_message.assert_not_called()
+
+    def test_deleted_post(self):
+        send_mailing(100500)
+        self.client_mock.send_message.assert_not_called()
+
+    def test_delete_mailing(self):
+        post = Post.objects.create(
+            bot=self.bot, url="https://example.com", is_done=True
+        )
+        for chat_id in range(3):
+            SentMessage.objects.create(
+                post=post, chat_id=str(chat_id), message_id=chat_id + 1,
+                status=SentMessage.SENT
+            )
+        SentMessage.objects.create(
+            post=post, chat_id="3", status=SentMessage.FAILED
+        )
+        delete_mailing(post.id)
+
+        deleted = [(kwargs["chat_id"], kwargs["message_id"]) for _, kwargs
+                   in self.client_mock.delete_message.call_args_list]
+        self.assertEqual(sorted(deleted), [("0", 1), ("1", 2), ("2", 3)])
+        self.assertFalse(Post.objects.filter(id=post.id).exists())
+        self.assertFalse(SentMessage.objects.exists())
+
+
+class SendMailingMediaTestCase(BotTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for chat_id in range(5):
+            Subscriber.objects.create(chat_id=str(chat_id), bot=cls.bot)
+
+    def setUp(self):
+        use_memory_backend(self, "bots_mailings.progress._storage")
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_patcher = override_settings(MEDIA_ROOT=media_root)
+        settings_patcher.enable()
+        self.addCleanup(settings_patcher.disable)
+
+        self.client_mock = mock.Mock()
+        self.client_mock.send_document.side_effect = (
+            lambda chat_id, data, caption: mock.Mock(
+                message_id=1, document=mock.Mock(file_id="file-id")
+            )
+        )
+        patcher = mock.patch("bots_mailings.utils.get_client",
+                             return_value=self.client_mock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, "task_always_eager", False)
+
+    def create_post(self) -> Post:
+        post = Post.objects.create(bot=self.bot)
+        post.file.save("report.pdf", ContentFile(b"content"))
+        return post
+
+    def test_file_is_uploaded_once(self):
+        send_mailing(self.create_post().id)
+
+        sent_data = [kwargs["data"] for _, kwargs
+                     in self.client_mock.send_document.call_args_list]
+        self.assertEqual(len(sent_data), 5)
+        self.assertNotIsInstance(sent_data[0], str)
+        self.assertEqual(sent_data[1:], ["file-id"] * 4)
+        self.assertEqual(
+            MailingMedia.objects.get().file_id, "file-id"
+        )
+        self.assertEqual(
+            SentMessage.objects.filter(status=SentMessage.SENT).count(), 5
+        )
+
+    def test_same_file_is_not_uploaded_again(self):
+        send_mailing(self.create_post().id)
+        self.client_mock.send_document.reset_mock()
+        send_mailing(self.create_post().id)
+
+        sent_data = [kwargs["data"] for _, kwargs
+                     in self.client_mock.send_document.call_args_list]
+        self.assertEqual(sent_data, ["file-id"] * 5)
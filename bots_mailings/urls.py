@@ -6,6 +6,7 @@ from bots_mailings.views import (
     MailingDetailedView,
     MailingUpdateView,
     MailingDeleteView,
+    MailingProgressView,
 )
 
 app_name = "mailings"
@@ -36,4 +37,9 @@ urlpatterns = [
         MailingDeleteView.as_view(),
         name="mailing-delete"
     ),
+    path(
+        "mailing/<int:pk>/progress",
+        MailingProgressView.as_view(),
+        name="mailing-progress"
+    ),
 ]
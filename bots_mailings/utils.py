@@ -1,61 +1,164 @@
 import logging
+from functools import partial
+from operator import itemgetter
+from typing import Callable, Iterable, Iterator, Union
 
-from time import sleep
+from django.conf import settings
 
 from telebot.types import Message
 
-from telegram_api.api import (
-    send_photo as tg_send_photo,
-    send_message as tg_send_message,
-    send_video as tg_send_video,
-    send_document as tg_send_document,
-    send_location as tg_send_location,
-    send_sticker as tg_send_sticker,
-    delete_message as tg_delete_message
+from telegram_api.api import upload_file
+from telegram_api.client import get_client
+from telegram_api.engine import DeliveryResult, SendingEngine, iter_chunks
+from telegram_api.retry import call_with_retry
+from bots_mailings.models import MailingMedia, Post, SentMessage
+from bots_mailings.services import (
+    SentMessageWriter,
+    claim_deliveries,
+    get_content_hash,
+    get_media_file_id,
+    get_pending_deliveries,
+    get_post_media,
+    save_media_file_id
 )
-from bots_mailings.models import Post, SentMessage
-from bots_mailings.services import create_sent_message_object
 
 
 logger = logging.getLogger(__name__)
 
+# how many receivers may fail before we give up uploading post media
+UPLOAD_ATTEMPTS = 5
 
-def send_action_to_telegram_user(
-        chat_id: int, ac, post: Post) -> None:
+
+def send_post_to_telegram_user(
+        chat_id: Union[int, str], post: Post, token: str,
+        file_id: str = None) -> Message:
     """
-    Parse action due to it`s type
-    and send message with provided content to chat_id
+    Send content of the post to chat_id.
+    Attachment is sent by file_id if it's provided, otherwise
+    it's uploaded.
+    Errors are raised, so the sending engine can retry or record them.
     """
-    pass
+    client = get_client(token)
+    media = get_post_media(post)
+    if not media:
+        return client.send_message(chat_id=chat_id, text=post.url)
+
+    media_type, field = media
+    if media_type == MailingMedia.PHOTO:
+        send, file_arg = client.send_photo, 'photo'
+    else:
+        send, file_arg = client.send_document, 'data'
+    if file_id:
+        return send(chat_id=chat_id, caption=post.url, **{file_arg: file_id})
+    return upload_file(
+        send, field.path, file_arg=file_arg,
+        chat_id=chat_id, caption=post.url
+    )
+
+
+def get_message_file_id(message: Message, media_type: str) -> str:
+    if media_type == MailingMedia.PHOTO:
+        # the last one is the original size
+        return message.photo[-1].file_id
+    return message.document.file_id
 
-def send_action_to_telegram_users(
-        subscriber_list: list, post: Post) -> None:
+
+def upload_post_media(post: Post) -> Union[str, None]:
     """
-    Send action to all telegram subscribers in subscriber_list
+    Upload attachment of the post once per bot and return its file_id.
+    The file is sent to the first pending receiver, all others get it
+    by file_id. Returns None if the post has no attachment or it
+    could not be uploaded.
     """
-    for subscriber in subscriber_list:
-        send_action_to_telegram_user(
-            chat_id=subscriber.user_id,
-            post=post
-        )
+    media = get_post_media(post)
+    if not media:
+        return None
+
+    media_type, field = media
+    token = post.bot.token
+    content_hash = get_content_hash(field)
+    file_id = get_media_file_id(content_hash, token)
+    if file_id:
+        return file_id
 
-        # Telegram API will not allow send more than 30 messages per second
-        # to bypass blocking sleep thread for 0.5 secs
-        # TODO: try to find more efficient way to bypass blocking
-        sleep(0.1)
+    chat_ids = get_pending_deliveries(post).values_list(
+        'chat_id', flat=True
+    ).order_by('id')[:UPLOAD_ATTEMPTS]
+    with SentMessageWriter(post) as writer:
+        for chat_id in chat_ids:
+            if not claim_deliveries(post, [chat_id]):
+                # it's sent by another task
+                continue
+            try:
+                message = call_with_retry(partial(
+                    send_post_to_telegram_user, chat_id, post, token
+                ), token, chat_id)
+            except Exception as e:
+                logger.warning(
+                    f"""Upload of post {post.id} media to {chat_id} failed.
+                    Error: {e}"""
+                )
+                writer.add(DeliveryResult(chat_id=chat_id, error=e))
+                continue
 
+            writer.add(DeliveryResult(
+                chat_id=chat_id, message_id=message.message_id
+            ))
+            file_id = get_message_file_id(message, media_type)
+            save_media_file_id(content_hash, token, media_type, file_id)
+            return file_id
+    return None
 
-def delete_telegram_messages(messages: SentMessage):
+
+def send_post_to_telegram_users(
+        chat_ids: Iterable, post: Post,
+        file_id: str = None) -> Iterator[DeliveryResult]:
+    """
+    Send post to all chats in chat_ids concurrently and yield results
+    as messages are sent.
+    Throttling is done by the rate limiter of telegram_api.
+    """
+    token = post.bot.token
+    return SendingEngine(token).iter_send(
+        chat_ids,
+        partial(send_post_to_telegram_user,
+                post=post, token=token, file_id=file_id)
+    )
+
+
+def delete_telegram_messages(post: Post,
+                             on_progress: Callable = None) -> int:
     """
-    Delete all messages of the post in Telegram
+    Delete all messages of the post in Telegram.
+    Messages are deleted concurrently within the bot rate limits,
+    their SentMessage rows are deleted by batches as they go.
+    on_progress(done, total) is called after every batch.
+    Returns number of messages deleted in Telegram.
     """
-    for message in messages:
-        tg_delete_message(
-            chat_id=message.chat_id,
-            message_id=message.message_id,
-            token=message.post.channel.telegram_token
+    token = post.bot.token
+    client = get_client(token)
+    messages = post.sent_messages.filter(status=SentMessage.SENT)
+    total = messages.count()
+    engine = SendingEngine(token)
+    done = deleted = 0
+
+    rows = messages.values_list('id', 'chat_id', 'message_id').iterator()
+    for batch in iter_chunks(rows, settings.MAILING_CHUNK_SIZE):
+        results = engine.send(
+            batch,
+            lambda row: client.delete_message(
+                chat_id=row[1], message_id=row[2]
+            ),
+            get_chat_id=itemgetter(1)
         )
-        # Telegram API will not allow send more than 30 messages per second
-        # to bypass blocking sleep thread for 0.5 secs
-        # TODO: try to find more efficient way to bypass blocking
-        sleep(0.1)
+        # messages, that could not be deleted (e.g. older than 48 hours),
+        # will not be deleted on the next try too
+        SentMessage.objects.filter(
+            id__in=[row_id for row_id, _, _ in batch]
+        ).delete()
+        done += len(batch)
+        deleted += sum(result.ok for result in results)
+        logger.info(f"Post {post.id}: deleted {done} of {total} messages")
+        if on_progress:
+            on_progress(done, total)
+    return deleted
@@ -1,6 +1,6 @@
 import logging
 
-from django.http import Http404
+from django.http import Http404, HttpResponseRedirect, JsonResponse
 from django.urls import reverse_lazy
 from django.views.generic import (
     CreateView,
@@ -18,6 +18,7 @@ from bots_mailings.forms import (
     MailingUpdateForm,
 )
 from bots_mailings.models import Post
+from bots_mailings.services import get_mailing_progress
 
 logger = logging.getLogger(__name__)
 
@@ -77,7 +78,7 @@ class MailingUpdateView(ModeratorRequiredMixin, UpdateView):
     def get_form_kwargs(self):
         kwargs = super().get_form_kwargs()
         kwargs['user'] = self.request.user
-        kwargs['chan    nel_slug'] = self.kwargs.get('slug')
+        kwargs['channel_slug'] = self.kwargs.get('slug')
         return kwargs
 
     def get_object(self, queryset=None):
@@ -102,15 +103,32 @@ class MailingDetailedView(ModeratorRequiredMixin, DetailView):
     model = Post
 
 
+class MailingProgressView(ModeratorRequiredMixin, DetailView):
+    """
+    Progress of the mailing as JSON, it's polled by the detailed page
+    """
+    model = Post
+
+    def get_queryset(self):
+        # the mixin checks access to the bot of the url, not of the post
+        return Post.objects.filter(bot__slug=self.kwargs["slug"])
+
+    def render_to_response(self, context, **response_kwargs):
+        return JsonResponse(get_mailing_progress(self.object))
+
+
 class MailingDeleteView(ModeratorRequiredMixin, DeleteView):
     template_name = "bots_mailings/mailing_delete.html"
     context_object_name = "mailing"
     model = Post
 
     def delete(self, request, *args, **kwargs):
-        # Delete messages in telegram only if mailing is done
-        if self.get_object().is_done:
-            delete_mailing.delay(post_id=self.get_object().id)
+        # Delete messages in telegram only if mailing is done,
+        # the task deletes the post after its messages
+        self.object = self.get_object()
+        if self.object.is_done:
+            delete_mailing.delay(post_id=self.object.id)
+            return HttpResponseRedirect(self.get_success_url())
         return super().delete(request, *args, **kwargs)
 
     def get_success_url(self):
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BotsManagementConfig(AppConfig):
     name = 'bots_management'
     verbose_name = "Керування ботами та каналами"
+
+    def ready(self):
+        from . import signals  # noqa: F401
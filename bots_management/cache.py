@@ -0,0 +1,74 @@
+import copy
+import threading
+from time import monotonic
+from typing import Union
+
+from django.conf import settings
+
+from .models import Bot
+
+
+class BotCache:
+    """
+    Process cache of bots by slug.
+    Entries live `timeout` seconds and are dropped by signals when
+    the bot is saved or deleted in this process, other processes
+    see the change after the timeout.
+    Missing slugs are cached too, so unknown webhooks don't hit the db.
+    """
+
+    def __init__(self, timeout: float, max_size: int):
+        self.timeout = timeout
+        self.max_size = max_size
+        self._bots = {}
+        self._lock = threading.Lock()
+
+    def get(self, slug: str) -> Union[Bot, None]:
+        now = monotonic()
+        with self._lock:
+            bot, expires_at = self._bots.get(slug, (None, 0))
+        if expires_at <= now:
+            bot = Bot.objects.filter(slug=slug).first()
+            with self._lock:
+                if len(self._bots) >= self.max_size:
+                    self._evict(now)
+                self._bots[slug] = (bot, now + self.timeout)
+        # a copy, so callers can't change the cached bot
+        return copy.copy(bot)
+
+    def invalidate(self, bot: Bot) -> None:
+        """
+        Drop cached entries of the bot, including its old slug
+        """
+        with self._lock:
+            for slug, (cached, _) in list(self._bots.items()):
+                if slug == bot.slug or (cached and cached.pk == bot.pk):
+                    del self._bots[slug]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._bots.clear()
+
+    def _evict(self, now: float) -> None:
+        self._bots = {
+            slug: entry for slug, entry in self._bots.items()
+            if entry[1] > now
+        }
+        if len(self._bots) >= self.max_size:
+            self._bots.clear()
+
+
+_cache = None
+_lock = threading.Lock()
+
+
+def get_bot_cache() -> BotCache:
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = BotCache(
+                    timeout=settings.BOT_CACHE_TIMEOUT,
+                    max_size=settings.BOT_CACHE_SIZE,
+                )
+    return _cache
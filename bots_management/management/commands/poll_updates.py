@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from bots_management.polling import UpdatePoller
+
+
+class Command(BaseCommand):
+    help = (
+        "Take updates of all bots with getUpdates long-polling "
+        "instead of webhooks (set TELEGRAM_UPDATES_MODE=polling)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--timeout", type=int, default=None,
+            help="Long-polling timeout in seconds"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=100,
+            help="How many bots are polled at the same time"
+        )
+        parser.add_argument(
+            "--db-concurrency", type=int, default=10,
+            help="How many threads save the received updates"
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write("Polling updates, press Ctrl+C to stop")
+        try:
+            UpdatePoller(
+                timeout=options["timeout"],
+                concurrency=options["concurrency"],
+                db_concurrency=options["db_concurrency"],
+            ).run()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopped")
@@ -58,6 +58,10 @@ class Bot(models.Model):
         null=True, default=None
     )
     terms_of_agreement = models.BooleanField("Пользовательское соглашение", default=False)
+    # next update_id to ask with getUpdates in the long-polling mode
+    updates_offset = models.BigIntegerField(
+        "Смещение getUpdates", default=0, editable=False
+    )
 
     class Meta:
         verbose_name = "Бот"
@@ -69,6 +73,9 @@ class Bot(models.Model):
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
+        # with long-polling updates are taken by the poll_updates command
+        if settings.TELEGRAM_UPDATES_MODE == "polling":
+            return
         if not self.is_webhook_set:
             response: dict = set_telegram_webhook(token=self.token, host=settings.SITE_URL, slug=self.slug)
             if response.get("ok"):
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Dict, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from telebot.apihelper import ApiException
+
+from telegram_api.api import get_updates, unset_webhook_ajax
+from telegram_api.retry import (
+    get_error_code,
+    get_retry_policy,
+    parse_retry_after
+)
+
+from .models import Bot
+from .updates import accept_update
+
+
+logger = logging.getLogger(__name__)
+
+
+class UpdatePoller:
+    """
+    Long-polls getUpdates of all bots from one asyncio loop.
+    Every bot has its own coroutine, long-polling requests run in a
+    thread pool of `concurrency` threads, webhook requests and db
+    queries in a separate pool of `db_concurrency` threads, so hanging
+    getUpdates calls never hold back saving of the received updates.
+    Updates go to the same queue as the webhook ones, the offset
+    is saved in Bot after every batch, so a restarted poller
+    continues where it stopped.
+    """
+
+    def __init__(self, timeout: int = None, concurrency: int = 100,
+                 refresh_interval: float = None, db_concurrency: int = 10):
+        self.timeout = timeout or settings.TELEGRAM_POLLING_TIMEOUT
+        self.concurrency = concurrency
+        self.db_concurrency = db_concurrency
+        self.refresh_interval = (
+            refresh_interval or settings.TELEGRAM_POLLING_REFRESH_INTERVAL
+        )
+        # long-polling keeps a connection per bot busy, so pollers
+        # don't take them from the shared pool of senders
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(
+            pool_maxsize=concurrency, pool_block=True
+        ))
+        self.poll_executor = ThreadPoolExecutor(max_workers=concurrency)
+        self.executor = ThreadPoolExecutor(max_workers=db_concurrency)
+        # (bot id, slug, token) -> polling task
+        self._pollers: Dict[Tuple[int, str, str], asyncio.Task] = {}
+
+    def run(self) -> None:
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.run_async())
+        finally:
+            self.poll_executor.shutdown(wait=False)
+            self.executor.shutdown(wait=False)
+            loop.close()
+
+    async def run_async(self) -> None:
+        while True:
+            await self.refresh_bots()
+            await asyncio.sleep(self.refresh_interval)
+
+    async def _run_sync(self, function, *args, executor=None):
+        return await asyncio.get_event_loop().run_in_executor(
+            executor or self.executor, partial(function, *args)
+        )
+
+    async def refresh_bots(self) -> None:
+        """
+        Start polling new bots and stop polling deleted ones.
+        Bots with a changed slug or token are started again.
+        """
+        bots = await self._run_sync(self.get_bots)
+        for key in set(self._pollers) - set(bots):
+            self._pollers.pop(key).cancel()
+        for key, offset in bots.items():
+            poller = self._pollers.get(key)
+            if poller is None or poller.done():
+                self._pollers[key] = asyncio.ensure_future(
+                    self.poll_bot(*key, offset)
+                )
+
+    @staticmethod
+    def get_bots() -> dict:
+        close_old_connections()
+        return {
+            (bot_id, slug, token): offset
+            for bot_id, slug, token, offset in Bot.objects.values_list(
+                'id', 'slug', 'token', 'updates_offset'
+            )
+        }
+
+    async def poll_bot(self, bot_id: int, slug: str,
+                       token: str, offset: int) -> None:
+        # getUpdates doesn't work while the webhook is set
+        unset_webhook = True
+        attempt = 0
+        while True:
+            try:
+                if unset_webhook:
+                    await self._run_sync(unset_webhook_ajax, token)
+                    unset_webhook = False
+                updates = await self._run_sync(
+                    get_updates, token, offset or None,
+                    self.timeout, self.session,
+                    executor=self.poll_executor
+                )
+                if updates:
+                    next_offset = updates[-1]["update_id"] + 1
+                    await self._run_sync(
+                        self.accept_updates, bot_id, slug,
+                        updates, next_offset
+                    )
+                    offset = next_offset
+            except (ApiException, requests.RequestException) as e:
+                attempt += 1
+                logger.warning(
+                    f"""Polling of {slug} failed, attempt {attempt}.
+                    Error: {e}"""
+                )
+                # 409: the webhook was set again
+                unset_webhook = unset_webhook or get_error_code(e) == 409
+                delay = parse_retry_after(e)
+                if delay is None:
+                    delay = get_retry_policy().backoff(attempt)
+                await asyncio.sleep(delay)
+                continue
+            except Exception as e:
+                logger.critical(
+                    f"""Polling of {slug} stopped.
+                    Error: {e}"""
+                )
+                # it's started again by the next refresh_bots
+                return
+            attempt = 0
+
+    @staticmethod
+    def accept_updates(bot_id: int, slug: str,
+                       updates: List[dict], offset: int) -> None:
+        """
+        Queue updates and save the offset of the next ones.
+        Updates, that were queued before the poller was restarted,
+        are dropped by the deduplication of accept_update.
+        """
+        close_old_connections()
+        for update in updates:
+            accept_update(slug, update)
+        Bot.objects.filter(id=bot_id).update(updates_offset=offset)
@@ -6,14 +6,16 @@ from django.db.models import QuerySet, Q
 from django.forms import model_to_dict
 from django.contrib.auth.models import User
 
+from .cache import get_bot_cache
 from .models import Bot
 
 
 def get_bot_by_slug(slug: str) -> Union[Bot, None]:
     """
-    Find and return bot using slug
+    Find and return bot using slug.
+    Bots are cached for BOT_CACHE_TIMEOUT seconds.
     """
-    return Bot.objects.filter(slug=slug).first()
+    return get_bot_cache().get(slug)
 
 
 def get_all_available_bots_to_moderator(user: User) -> QuerySet:
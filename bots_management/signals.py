@@ -0,0 +1,39 @@
+from django.apps import apps
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from telegram_api.markup import invalidate_reply_markup
+from telegram_api.routing import invalidate_routing_tables
+
+from .cache import get_bot_cache
+from .models import Bot
+
+
+@receiver(post_save, sender=Bot)
+@receiver(post_delete, sender=Bot)
+def invalidate_bot_cache(sender, instance: Bot, **kwargs) -> None:
+    get_bot_cache().invalidate(instance)
+
+
+def connect_keyboards_signals() -> None:
+    """
+    Drop routing tables and reply markups on changes of keyboards
+    models, if the keyboards app is installed
+    """
+    try:
+        keyboards = apps.get_app_config("keyboards")
+    except LookupError:
+        return
+    receivers = {
+        "Keyboard": [invalidate_routing_tables, invalidate_reply_markup],
+        "Action": [invalidate_routing_tables],
+        "Button": [invalidate_routing_tables, invalidate_reply_markup],
+    }
+    for model_name, model_receivers in receivers.items():
+        model = keyboards.get_model(model_name)
+        for signal in (post_save, post_delete):
+            for function in model_receivers:
+                signal.connect(function, sender=model)
+
+
+connect_keyboards_signals()
@@ -0,0 +1,12 @@
+from celery import shared_task
+
+from .updates import handle_update
+
+
+@shared_task(ignore_result=True)
+def process_update(slug: str, update: dict) -> None:
+    """
+    Celery task for handling an incoming Telegram update.
+    It's not retried, handlers could reply to the user twice.
+    """
+    handle_update(slug, update)
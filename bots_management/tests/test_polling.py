@@ -0,0 +1,80 @@
+import asyncio
+import threading
+from unittest import mock
+
+from django.test import override_settings
+
+from bots_management.models import Bot
+from bots_management.polling import UpdatePoller
+from bots_management.tests.utils import BotTestCase
+from telegram_api.tests.test_retry import api_error
+
+
+class UpdatePollerTestCase(BotTestCase):
+    def setUp(self):
+        patcher = mock.patch("bots_management.polling.unset_webhook_ajax")
+        self.unset_webhook = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def poll(self, responses, offset=0):
+        poller = UpdatePoller(timeout=1, concurrency=2)
+        with mock.patch("bots_management.polling.get_updates",
+                        side_effect=responses) as get_updates, \
+                mock.patch.object(poller, "accept_updates") as accept:
+            # the last response is an unexpected error, it stops polling
+            loop = asyncio.new_event_loop()
+            self.addCleanup(loop.close)
+            loop.run_until_complete(
+                poller.poll_bot(self.bot.id, "bot", "1:token", offset)
+            )
+        return get_updates, accept
+
+    def test_updates_are_accepted(self):
+        updates = [{"update_id": 10}, {"update_id": 11}]
+        get_updates, accept = self.poll([updates, [], ValueError], offset=5)
+
+        accept.assert_called_once_with(self.bot.id, "bot", updates, 12)
+        self.assertEqual(
+            [args[1] for args, _ in get_updates.call_args_list], [5, 12, 12]
+        )
+        self.unset_webhook.assert_called_once_with("1:token")
+
+    def test_webhook_is_unset_on_conflict(self):
+        with mock.patch("bots_management.polling.asyncio.sleep",
+                        return_value=asyncio.sleep(0)):
+            self.poll([api_error(409), ValueError])
+        self.assertEqual(self.unset_webhook.call_count, 2)
+
+    def test_long_polls_do_not_block_saving(self):
+        poller = UpdatePoller(timeout=1, concurrency=1, db_concurrency=1)
+        self.addCleanup(poller.executor.shutdown)
+        self.addCleanup(poller.poll_executor.shutdown)
+        released = threading.Event()
+        self.addCleanup(released.set)
+        # the only polling thread hangs in getUpdates
+        poller.poll_executor.submit(released.wait)
+
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        result = loop.run_until_complete(asyncio.wait_for(
+            poller._run_sync(lambda: "saved"), timeout=5
+        ))
+        self.assertEqual(result, "saved")
+
+    def test_offset_is_saved(self):
+        with mock.patch("bots_management.polling.accept_update") as accept:
+            UpdatePoller.accept_updates(
+                self.bot.id, "bot", [{"update_id": 10}], 11
+            )
+        accept.assert_called_once_with("bot", {"update_id": 10})
+        self.bot.refresh_from_db()
+        self.assertEqual(self.bot.updates_offset, 11)
+
+    @override_settings(TELEGRAM_UPDATES_MODE="polling")
+    def test_webhook_is_not_set_in_polling_mode(self):
+        with mock.patch("bots_management.models.set_telegram_webhook") as s:
+            Bot.objects.create(
+                name="other", slug="other", token="2:token",
+                owner=self.bot.owner
+            )
+        s.assert_not_called()
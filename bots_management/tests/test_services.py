@@ -0,0 +1,57 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from bots_management.cache import get_bot_cache
+from bots_management.models import Bot
+from bots_management.services import get_bot_by_slug
+from bots_management.tests.utils import create_bot
+
+
+class BotCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = get_user_model().objects.create_superuser(
+            username="super", password="1234"
+        )
+
+    def setUp(self):
+        self.addCleanup(get_bot_cache().clear)
+
+    def create_bot(self) -> Bot:
+        return create_bot(self.owner)
+
+    def test_bot_is_cached(self):
+        self.create_bot()
+        get_bot_by_slug("bot")
+        with self.assertNumQueries(0):
+            self.assertEqual(get_bot_by_slug("bot").name, "bot")
+            self.assertEqual(get_bot_by_slug("bot").token, "1:token")
+
+    def test_missing_bot_is_cached(self):
+        self.assertIsNone(get_bot_by_slug("bot"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_bot_by_slug("bot"))
+
+        self.create_bot()
+        self.assertIsNotNone(get_bot_by_slug("bot"))
+
+    def test_cache_is_invalidated_on_save(self):
+        bot = self.create_bot()
+        get_bot_by_slug("bot")
+        bot.slug = "new-bot"
+        bot.token = "2:token"
+        bot.save()
+
+        self.assertIsNone(get_bot_by_slug("bot"))
+        self.assertEqual(get_bot_by_slug("new-bot").token, "2:token")
+
+    def test_cache_is_invalidated_on_delete(self):
+        bot = self.create_bot()
+        get_bot_by_slug("bot")
+        bot.delete()
+        self.assertIsNone(get_bot_by_slug("bot"))
+
+    def test_cached_bot_is_not_changed_by_callers(self):
+        self.create_bot()
+        get_bot_by_slug("bot").name = "changed"
+        self.assertEqual(get_bot_by_slug("bot").name, "bot")
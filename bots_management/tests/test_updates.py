@@ -0,0 +1,163 @@
+import json
+import threading
+import time
+from unittest import mock
+
+from django.test import TestCase
+
+from bots_management.cache import get_bot_cache
+from bots_management.tests.utils import BotTestCase
+from bots_management.updates import (
+    CeleryUpdateQueue,
+    MemoryUpdateQueue,
+    RecentUpdates,
+    get_update_chat_id,
+    handle_update
+)
+
+
+class WebhookTestCase(BotTestCase):
+    def setUp(self):
+        self.addCleanup(get_bot_cache().clear)
+        self.handled = []
+        self.queue = MemoryUpdateQueue(
+            handler=lambda slug, update: self.handled.append((slug, update))
+        )
+        patcher = mock.patch("bots_management.updates.get_update_queue",
+                             return_value=self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch("bots_management.updates.get_recent_updates",
+                             return_value=RecentUpdates(max_size=100))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, data):
+        return self.client.post(
+            "/telegram_prod/bot/", data=data, content_type="application/json"
+        )
+
+    def test_update_is_queued(self):
+        update = {"update_id": 1, "message": {"text": "/start"}}
+        response = self.post(json.dumps(update))
+        self.assertEqual(response.status_code, 200)
+
+        self.queue.join()
+        self.assertEqual(self.handled, [("bot", update)])
+
+    def test_webhook_does_not_wait_for_handlers(self):
+        release = threading.Event()
+        self.queue.handler = lambda slug, update: release.wait()
+        response = self.post(json.dumps({"update_id": 1}))
+        self.assertEqual(response.status_code, 200)
+
+        release.set()
+        self.queue.join()
+
+    def test_repeated_update_is_dropped(self):
+        for update_id in (1, 2, 1):
+            response = self.post(json.dumps({"update_id": update_id}))
+            self.assertEqual(response.status_code, 200)
+
+        self.queue.join()
+        self.assertEqual(
+            [update["update_id"] for _, update in self.handled], [1, 2]
+        )
+
+    def test_update_is_accepted_again_if_not_queued(self):
+        with mock.patch.object(self.queue, "put", side_effect=OSError):
+            with self.assertRaises(OSError):
+                self.post(json.dumps({"update_id": 1}))
+        self.post(json.dumps({"update_id": 1}))
+
+        self.queue.join()
+        self.assertEqual(len(self.handled), 1)
+
+    def test_invalid_update(self):
+        for data in ("not json", "[1, 2]", json.dumps({"message": {}})):
+            self.assertEqual(self.post(data).status_code, 400)
+        self.assertEqual(self.handled, [])
+
+    def test_unknown_bot(self):
+        response = self.client.post(
+            "/telegram_prod/unknown/", data=json.dumps({"update_id": 1}),
+            content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_get(self):
+        response = self.client.get("/telegram_prod/bot/")
+        self.assertEqual(response.status_code, 404)
+
+
+class RecentUpdatesTestCase(TestCase):
+    def test_window_is_bounded(self):
+        recent_updates = RecentUpdates(max_size=2)
+        self.assertTrue(recent_updates.add("bot", 1))
+        self.assertTrue(recent_updates.add("other-bot", 1))
+        self.assertFalse(recent_updates.add("bot", 1))
+        self.assertTrue(recent_updates.add("bot", 2))
+        # "other-bot" was used the least recently
+        self.assertTrue(recent_updates.add("other-bot", 1))
+
+    def test_repeats_from_other_nodes(self):
+        connection = mock.Mock()
+        connection.set.return_value = None
+        recent_updates = RecentUpdates(max_size=2, connection=connection)
+        self.assertFalse(recent_updates.add("bot", 1))
+        connection.set.assert_called_once_with(
+            "tg-update:bot:1", 1, nx=True, ex=24 * 60 * 60
+        )
+
+
+class HandleUpdateTestCase(TestCase):
+    def test_handler_errors_are_logged(self):
+        with mock.patch("bots_management.updates.event_handler_tg",
+                        side_effect=ValueError), \
+                self.assertLogs("bots_management.updates", "ERROR"):
+            handle_update("bot", {"update_id": 1})
+
+
+class ShardingTestCase(TestCase):
+    def test_get_update_chat_id(self):
+        updates = [
+            ({"update_id": 1, "message": {"chat": {"id": 10}}}, 10),
+            ({"update_id": 2, "callback_query": {
+                "from": {"id": 11}, "message": {"chat": {"id": -12}}
+            }}, -12),
+            ({"update_id": 3, "inline_query": {"from": {"id": 13}}}, 13),
+            ({"update_id": 4, "poll": {"id": "1"}}, None),
+        ]
+        for update, chat_id in updates:
+            self.assertEqual(get_update_chat_id(update), chat_id)
+
+    def test_updates_of_chat_are_handled_in_order(self):
+        handled = []
+
+        def handler(slug, update):
+            # the first updates are the slowest ones
+            time.sleep(0.01 * (10 - update["update_id"] // 2))
+            handled.append(update)
+
+        queue = MemoryUpdateQueue(shards=4, handler=handler)
+        for update_id in range(10):
+            queue.put("bot", {
+                "update_id": update_id,
+                "message": {"chat": {"id": update_id % 2}}
+            })
+        queue.join()
+
+        for chat_id in range(2):
+            self.assertEqual(
+                [update["update_id"] for update in handled
+                 if update["message"]["chat"]["id"] == chat_id],
+                list(range(chat_id, 10, 2))
+            )
+
+    def test_celery_queue_of_chat(self):
+        with mock.patch("bots_management.tasks.process_update") as task:
+            CeleryUpdateQueue(shards=4).put("bot", {
+                "update_id": 1, "message": {"chat": {"id": 6}}
+            })
+        _, kwargs = task.apply_async.call_args
+        self.assertEqual(kwargs["queue"], "telegram-updates-2")
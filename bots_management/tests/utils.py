@@ -0,0 +1,26 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from bots_management.models import Bot
+
+
+def create_bot(owner, slug: str = "bot", token: str = "1:token") -> Bot:
+    """Create the bot without setting its webhook in Telegram"""
+    with mock.patch("bots_management.models.set_telegram_webhook",
+                    return_value={"ok": True}):
+        return Bot.objects.create(
+            name=slug, slug=slug, token=token, owner=owner
+        )
+
+
+class BotTestCase(TestCase):
+    """TestCase with the superuser `owner` and his `bot`"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = get_user_model().objects.create_superuser(
+            username="super", password="1234"
+        )
+        cls.bot = create_bot(cls.owner)
@@ -0,0 +1,245 @@
+import logging
+import queue
+import threading
+from collections import OrderedDict
+from typing import Union
+
+from django.conf import settings
+
+from telegram_api.handlers import event_handler_tg
+
+
+logger = logging.getLogger(__name__)
+
+
+def handle_update(slug: str, update: dict) -> None:
+    """
+    Run handlers of the incoming update.
+    Errors are logged, so one broken update doesn't stop the worker.
+    """
+    try:
+        event_handler_tg(incoming_data=update, channel_slug=slug)
+    except Exception as e:
+        logger.exception(
+            f"""Update {update.get('update_id')} of {slug} failed.
+            Error: {e}"""
+        )
+
+
+# update fields, that carry a message with the chat
+MESSAGE_FIELDS = (
+    "message", "edited_message", "channel_post", "edited_channel_post"
+)
+# update fields, that have only the user
+USER_FIELDS = (
+    "inline_query", "chosen_inline_result", "shipping_query",
+    "pre_checkout_query", "poll_answer"
+)
+
+
+def get_update_chat_id(update: dict) -> Union[int, None]:
+    """
+    Return id of the chat (or the user) the update belongs to
+    """
+    try:
+        for field in MESSAGE_FIELDS:
+            if field in update:
+                return update[field]["chat"]["id"]
+        callback_query = update.get("callback_query")
+        if callback_query:
+            if "message" in callback_query:
+                return callback_query["message"]["chat"]["id"]
+            return callback_query["from"]["id"]
+        for field in USER_FIELDS:
+            if field in update:
+                user = update[field].get("from") or update[field]["user"]
+                return user["id"]
+    except (KeyError, TypeError, AttributeError):
+        # malformed update, it's up to handlers to deal with it
+        pass
+    return None
+
+
+def get_update_shard(update: dict, shards: int) -> int:
+    """
+    Return number of the shard, that handles the update.
+    All updates of a chat go to the same shard, so they are handled
+    in order, updates without a chat go to any of them.
+    """
+    chat_id = get_update_chat_id(update)
+    if chat_id is None:
+        return update["update_id"] % shards
+    return int(chat_id) % shards
+
+
+class CeleryUpdateQueue:
+    """
+    Sends updates to Celery queues TELEGRAM_UPDATE_QUEUE_NAME-<shard>.
+    Every queue has to be consumed by one worker process with
+    concurrency 1 to keep updates of the chat in order:
+
+        celery -A bots_settings worker -Q telegram-updates-0 -c 1
+    """
+
+    def __init__(self, shards: int = 1):
+        self.shards = shards
+
+    def put(self, slug: str, update: dict) -> None:
+        from .tasks import process_update
+        shard = get_update_shard(update, self.shards)
+        process_update.apply_async(
+            (slug, update),
+            queue=f"{settings.TELEGRAM_UPDATE_QUEUE_NAME}-{shard}"
+        )
+
+
+class MemoryUpdateQueue:
+    """
+    In-process stand-in of the Celery queues for tests and development,
+    every shard is handled by a background thread of this process.
+    """
+
+    def __init__(self, shards: int = 1, handler=handle_update):
+        self.handler = handler
+        self._queues = [queue.Queue() for _ in range(shards)]
+        for shard_queue in self._queues:
+            threading.Thread(
+                target=self._work, args=(shard_queue,), daemon=True
+            ).start()
+
+    def put(self, slug: str, update: dict) -> None:
+        shard = get_update_shard(update, len(self._queues))
+        self._queues[shard].put((slug, update))
+
+    def join(self) -> None:
+        """
+        Block until all queued updates are handled
+        """
+        for shard_queue in self._queues:
+            shard_queue.join()
+
+    def _work(self, shard_queue: queue.Queue) -> None:
+        while True:
+            slug, update = shard_queue.get()
+            try:
+                self.handler(slug, update)
+            finally:
+                shard_queue.task_done()
+
+
+class RecentUpdates:
+    """
+    Bounded window of the last seen updates of all bots.
+    Telegram delivers the update again, if the webhook was slow or failed,
+    such repeats are dropped before any work is done.
+    Ids are kept in a process LRU of `max_size` items and, if `connection`
+    is given, in Redis for `timeout` seconds, so repeats that come to
+    another node are dropped too.
+    """
+
+    def __init__(self, max_size: int, connection=None,
+                 timeout: int = 24 * 60 * 60, prefix: str = "tg-update"):
+        self.max_size = max_size
+        self.connection = connection
+        self.timeout = timeout
+        self.prefix = prefix
+        self._seen = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, slug: str, update_id: int) -> str:
+        return f"{self.prefix}:{slug}:{update_id}"
+
+    def add(self, slug: str, update_id: int) -> bool:
+        """
+        Remember the update.
+        Returns False if it was already seen.
+        """
+        with self._lock:
+            if (slug, update_id) in self._seen:
+                self._seen.move_to_end((slug, update_id))
+                return False
+            self._seen[(slug, update_id)] = None
+            if len(self._seen) > self.max_size:
+                self._seen.popitem(last=False)
+        if self.connection is not None:
+            return bool(self.connection.set(
+                self._key(slug, update_id), 1, nx=True, ex=self.timeout
+            ))
+        return True
+
+    def discard(self, slug: str, update_id: int) -> None:
+        """
+        Forget the update, e.g. it could not be queued and
+        Telegram has to deliver it again
+        """
+        with self._lock:
+            self._seen.pop((slug, update_id), None)
+        if self.connection is not None:
+            self.connection.delete(self._key(slug, update_id))
+
+
+_queue = None
+_recent_updates = None
+_lock = threading.Lock()
+
+
+def get_update_queue():
+    """
+    Return queue of incoming updates configured by TELEGRAM_UPDATE_QUEUE
+    """
+    global _queue
+    if _queue is None:
+        with _lock:
+            if _queue is None:
+                shards = settings.TELEGRAM_UPDATE_SHARDS
+                if settings.TELEGRAM_UPDATE_QUEUE == "celery":
+                    _queue = CeleryUpdateQueue(shards=shards)
+                elif settings.TELEGRAM_UPDATE_QUEUE == "memory":
+                    _queue = MemoryUpdateQueue(shards=shards)
+                else:
+                    raise ValueError(
+                        "Unknown update queue: "
+                        f"{settings.TELEGRAM_UPDATE_QUEUE}"
+                    )
+    return _queue
+
+
+def get_recent_updates() -> RecentUpdates:
+    """
+    Return seen updates window, it uses Redis with the "redis"
+    rate limit backend
+    """
+    global _recent_updates
+    if _recent_updates is None:
+        with _lock:
+            if _recent_updates is None:
+                connection = None
+                if settings.TELEGRAM_RATE_LIMIT_BACKEND == "redis":
+                    from bots_settings.redis_connection import (
+                        get_redis_connection
+                    )
+                    connection = get_redis_connection()
+                _recent_updates = RecentUpdates(
+                    max_size=settings.TELEGRAM_UPDATE_DEDUP_SIZE,
+                    connection=connection,
+                    timeout=settings.TELEGRAM_UPDATE_DEDUP_TIMEOUT,
+                )
+    return _recent_updates
+
+
+def accept_update(slug: str, update: dict) -> bool:
+    """
+    Queue the incoming update of the bot, it's used by the webhook
+    and the long-polling.
+    Returns False if the update was already accepted before.
+    """
+    update_id = update["update_id"]
+    recent_updates = get_recent_updates()
+    if not recent_updates.add(slug, update_id):
+        return False
+    try:
+        get_update_queue().put(slug, update)
+    except Exception:
+        recent_updates.discard(slug, update_id)
+        raise
+    return True
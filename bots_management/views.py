@@ -18,15 +18,13 @@ from telegram_api.api import (
     unset_webhook_ajax as tg_remove_webhook_ajax
 
 )
-from telegram_api.handlers import (
-    event_handler_tg
-)
 
 from .forms import (
      BotForm
 )
 from .mixins import ModeratorRequiredMixin, OwnerRequiredMixin
 from .models import Bot
+from .updates import accept_update
 from .services import (
     get_bot_by_slug,
     get_all_available_bots_to_moderator,
@@ -149,13 +147,27 @@ class BotDeleteView(DeleteView):
 
 @csrf_exempt
 def telegram_index(request, slug):
+    """
+    Webhook of the bot.
+    The update is only validated and queued, handlers run in a separate
+    worker pool, so Telegram gets its 200 right away.
+    """
     if request.method == "POST":
-        incoming_data: dict = json.loads(request.body.decode("utf-8"))
+        try:
+            incoming_data: dict = json.loads(request.body.decode("utf-8"))
+        except (UnicodeDecodeError, ValueError):
+            return HttpResponse(status=400)
+        if (not isinstance(incoming_data, dict)
+                or not isinstance(incoming_data.get("update_id"), int)):
+            return HttpResponse(status=400)
+        if get_bot_by_slug(slug) is None:
+            return HttpResponse(status=404)
         if settings.DEBUG:
             logger.warning(
                 f"""\n {incoming_data} \n"""
             )
-        event_handler_tg(incoming_data=incoming_data, channel_slug=slug)
+        # repeated deliveries of the update are just confirmed
+        accept_update(slug, incoming_data)
         return HttpResponse(status=200)
 
     return HttpResponse(status=404)
@@ -0,0 +1,22 @@
+import threading
+
+import redis
+
+from django.conf import settings
+
+
+_connection = None
+_lock = threading.Lock()
+
+
+def get_redis_connection() -> redis.Redis:
+    """
+    Return shared Redis client for the project services
+    (rate limits, counters, caches). Uses settings.REDIS_URL.
+    """
+    global _connection
+    if _connection is None:
+        with _lock:
+            if _connection is None:
+                _connection = redis.Redis.from_url(settings.REDIS_URL)
+    return _connection
@@ -23,10 +23,82 @@ DEBUG = bool(int(env.get('DEBUG')))
 
 TELEGRAM_BASE_URL = "https://api.telegram.org/bot%s/%s"
 
+# Shared keep-alive connection pool for the Telegram API
+TELEGRAM_POOL_CONNECTIONS = 10
+TELEGRAM_POOL_MAXSIZE = 50
+TELEGRAM_READ_TIMEOUT = 30
+# How many per-token clients to keep and for how long (in seconds)
+TELEGRAM_CLIENT_CACHE_SIZE = 200
+TELEGRAM_CLIENT_IDLE_TIMEOUT = 600
+
+# Telegram rate limits. Backend is "memory" (per process) or "redis"
+# (shared by all workers)
+TELEGRAM_RATE_LIMIT_BACKEND = env.get('TELEGRAM_RATE_LIMIT_BACKEND', 'memory')
+# messages per second for one bot
+TELEGRAM_RATE_LIMIT_PER_BOT = 30
+# messages per second to one private chat
+TELEGRAM_RATE_LIMIT_PER_CHAT = 1
+# messages per minute to one group
+TELEGRAM_RATE_LIMIT_PER_GROUP = 20
+# Retries of 429, 5xx and network errors
+TELEGRAM_RETRY_MAX_ATTEMPTS = 5
+TELEGRAM_RETRY_BACKOFF_BASE = 0.5
+TELEGRAM_RETRY_BACKOFF_MAX = 30
+# Requests kept in flight by one mailing
+TELEGRAM_MAILING_CONCURRENCY = 20
+# subscribers, that blocked the bot, are deactivated by batches of this
+# size or at least every TELEGRAM_UNREACHABLE_INTERVAL seconds
+TELEGRAM_UNREACHABLE_BATCH_SIZE = 100
+TELEGRAM_UNREACHABLE_INTERVAL = 60
+# How updates come to the bots: "webhook" (needs public HTTPS SITE_URL)
+# or "polling" (run `python manage.py poll_updates`)
+TELEGRAM_UPDATES_MODE = env.get('TELEGRAM_UPDATES_MODE', 'webhook')
+# getUpdates long-polling timeout (in seconds)
+TELEGRAM_POLLING_TIMEOUT = 25
+# how often (in seconds) the poller looks for new and deleted bots
+TELEGRAM_POLLING_REFRESH_INTERVAL = 60
+# Incoming updates are handled out of the webhook request.
+# Queue is "celery" or "memory" (threads of the web process, for tests
+# and development). "celery" needs a worker with concurrency 1 for every
+# shard queue, see README
+TELEGRAM_UPDATE_QUEUE = env.get('TELEGRAM_UPDATE_QUEUE', 'celery')
+TELEGRAM_UPDATE_QUEUE_NAME = 'telegram-updates'
+# updates are split by chat between shards (queues telegram-updates-0,
+# telegram-updates-1, ...), every shard handles its updates in order
+TELEGRAM_UPDATE_SHARDS = 4
+# how many last update ids are kept to drop repeated deliveries, and for
+# how long (in seconds) they are kept in redis
+TELEGRAM_UPDATE_DEDUP_SIZE = 10000
+TELEGRAM_UPDATE_DEDUP_TIMEOUT = 24 * 60 * 60
+
+# bots are cached by slug in every process for this time (in seconds)
+BOT_CACHE_TIMEOUT = 60
+BOT_CACHE_SIZE = 1000
+# known subscribers are cached by chat in every process for this time
+# (in seconds), their rows are written only when the profile is changed
+SUBSCRIBER_CACHE_TIMEOUT = 5 * 60
+SUBSCRIBER_CACHE_SIZE = 100000
+# routing tables of bots (button text -> action) are kept in every
+# process for this time (in seconds)
+ROUTING_TABLE_TIMEOUT = 5 * 60
+# prebuilt reply markups of keyboards are kept in every process for this
+# time (in seconds), and in redis until the keyboard is changed
+REPLY_MARKUP_TIMEOUT = 5 * 60
+# media of incoming messages is downloaded by celery tasks of this queue,
+# at most TELEGRAM_MEDIA_CONCURRENCY downloads run in one process
+TELEGRAM_MEDIA_QUEUE_NAME = 'telegram-media'
+TELEGRAM_MEDIA_CONCURRENCY = 4
+# larger files are not downloaded (getFile refuses files over 20 MB)
+TELEGRAM_MEDIA_MAX_SIZE = 20 * 1024 * 1024
+
 ROOT_URLCONF = "bots_settings.urls"
 
 APPEND_SLASH = True
 SAVE_MESSAGE = True
+# incoming text messages are saved in batches of this size or every
+# MESSAGE_SINK_INTERVAL seconds
+MESSAGE_SINK_BATCH_SIZE = 100
+MESSAGE_SINK_INTERVAL = 0.2
 ALLOWED_HOSTS = [env.get('ALLOWED_HOSTS')]
 
 INSTALLED_APPS = [
@@ -212,3 +284,33 @@ DATE_FORMAT = "%d.%m.%Y"
 
 # celery settings looks like redis://localhost:6379
 CELERY_BROKER_URL = env.get('CELERY_BROKER_URL')
+# mailings are finished by chord callbacks, they need a result backend
+CELERY_RESULT_BACKEND = env.get('CELERY_RESULT_BACKEND', CELERY_BROKER_URL)
+
+# how many receivers are sent by one celery task
+MAILING_CHUNK_SIZE = 500
+# how many times a receiver is tried before the mailing gives up on it
+MAILING_MAX_ATTEMPTS = 3
+# delivery results are saved to the db in batches of this size
+MAILING_WRITE_BATCH_SIZE = 100
+# started mailing without progress for this time (in seconds) is resumed
+# by bots_mailings.tasks.resume_mailings
+MAILING_STALE_TIMEOUT = 15 * 60
+
+CELERY_BEAT_SCHEDULE = {
+    'resume-mailings': {
+        'task': 'bots_mailings.tasks.resume_mailings',
+        'schedule': MAILING_STALE_TIMEOUT,
+    },
+    'reconcile-subscriber-counters': {
+        'task': 'subscribers.tasks.reconcile_subscriber_counters',
+        'schedule': 60 * 60,
+    },
+    'refresh-segment-sizes': {
+        'task': 'subscribers.tasks.refresh_segment_sizes',
+        'schedule': 60 * 60,
+    },
+}
+
+# redis for shared counters, rate limits and caches
+REDIS_URL = env.get('REDIS_URL', CELERY_BROKER_URL)
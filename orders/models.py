@@ -34,6 +34,15 @@ class Basket(models.Model):
     )
     archived = models.DateTimeField("Дата архивации", null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # the active basket of the subscriber, archived ones
+            # are not indexed
+            models.Index(fields=["subscriber"],
+                         condition=models.Q(is_active=True),
+                         name="basket_active_idx"),
+        ]
+
     def save(self, *args, **kwargs):
         if self.is_active:
             qs = type(self).objects.filter(subscriber=self.subscriber, is_active=True)
@@ -97,8 +106,9 @@ class Order(models.Model):
         on_delete=models.SET_NULL,
         null=True
     )
-    status = models.BooleanField(
+    status = models.CharField(
         'Статус заказа',
+        max_length=16,
         choices=STATUSES,
         default=WAITING,
     )
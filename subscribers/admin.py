@@ -1,6 +1,9 @@
 from django.contrib import admin
 
-from subscribers.models import Subscriber, Message, Reply
+from subscribers.models import (
+    Subscriber, SubscriberCounter, Segment, Message, Reply
+)
+from subscribers.services import refresh_segment_size
 
 
 @admin.register(Subscriber)
@@ -10,6 +13,22 @@ class SubscriberAdmin(admin.ModelAdmin):
     search_fields = ("name", "info")
 
 
+@admin.register(SubscriberCounter)
+class SubscriberCounterAdmin(admin.ModelAdmin):
+    list_display = ("bot", "active", "inactive", "new_today", "day")
+
+
+@admin.register(Segment)
+class SegmentAdmin(admin.ModelAdmin):
+    list_display = ("name", "bot", "size", "size_updated_at")
+    list_filter = ("bot",)
+    readonly_fields = ("size", "size_updated_at")
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        refresh_segment_size(obj)
+
+
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     list_display = ("id", "sender", "created")
@@ -0,0 +1,88 @@
+import copy
+import threading
+from collections import OrderedDict
+from time import monotonic
+from typing import Union
+
+from django.conf import settings
+
+from .models import Subscriber
+
+
+def get_profile_fingerprint(profile: dict) -> int:
+    """
+    Return fingerprint of the profile fields saved in Subscriber
+    """
+    return hash(tuple(sorted(profile.items())))
+
+
+class SubscriberCache:
+    """
+    Process LRU of active subscribers by (bot id, chat id).
+    Every entry keeps the fingerprint of the saved profile, a message
+    of a known user with the same profile needs no queries at all.
+    Entries are dropped by signals when the subscriber is saved or
+    deleted in this process and live `timeout` seconds, so other
+    processes see the change (e.g. the subscriber was banned) too.
+    """
+
+    def __init__(self, timeout: float, max_size: int):
+        self.timeout = timeout
+        self.max_size = max_size
+        self._subscribers = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, bot_id: int, chat_id: str,
+            fingerprint: int) -> Union[Subscriber, None]:
+        """
+        Return the subscriber, if it's cached with the same fingerprint
+        """
+        key = (bot_id, chat_id)
+        with self._lock:
+            entry = self._subscribers.get(key)
+            if entry is None:
+                return None
+            subscriber, cached_fingerprint, expires_at = entry
+            if expires_at <= monotonic():
+                del self._subscribers[key]
+                return None
+            self._subscribers.move_to_end(key)
+        if cached_fingerprint != fingerprint:
+            return None
+        # a copy, so callers can't change the cached subscriber
+        return copy.copy(subscriber)
+
+    def set(self, subscriber: Subscriber, fingerprint: int) -> None:
+        key = (subscriber.bot_id, subscriber.chat_id)
+        with self._lock:
+            self._subscribers.pop(key, None)
+            self._subscribers[key] = (
+                copy.copy(subscriber), fingerprint,
+                monotonic() + self.timeout
+            )
+            while len(self._subscribers) > self.max_size:
+                self._subscribers.popitem(last=False)
+
+    def invalidate(self, bot_id: int, chat_id: str) -> None:
+        with self._lock:
+            self._subscribers.pop((bot_id, chat_id), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._subscribers.clear()
+
+
+_cache = None
+_lock = threading.Lock()
+
+
+def get_subscriber_cache() -> SubscriberCache:
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = SubscriberCache(
+                    timeout=settings.SUBSCRIBER_CACHE_TIMEOUT,
+                    max_size=settings.SUBSCRIBER_CACHE_SIZE,
+                )
+    return _cache
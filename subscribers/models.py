@@ -1,5 +1,5 @@
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, transaction
 from django.urls import reverse
 
 from bots_management.models import Bot
@@ -31,6 +31,8 @@ class Subscriber(models.Model):
     bot = models.ForeignKey(
         to=Bot, verbose_name="Каким ботом пользуется",
         related_name="subscribers", on_delete=models.CASCADE,
+        # covered by subscriber_bot_active_id_idx
+        db_index=False,
     )
 
     class Meta:
@@ -38,14 +40,26 @@ class Subscriber(models.Model):
         verbose_name_plural = "Подписчики"
         db_table = "Subscribers"
         unique_together = [["chat_id", "bot"]]
+        indexes = [
+            # keyset pages of the subscribers list, counts
+            models.Index(fields=["bot", "is_active", "id"],
+                         name="subscriber_bot_active_id_idx"),
+            # receivers of mailings, only active subscribers are indexed
+            models.Index(fields=["bot", "id"],
+                         condition=models.Q(is_active=True),
+                         name="subscriber_active_idx"),
+        ]
 
     def ban_user(self):
         """
         Ban current user.
         """
+        from .services import update_subscriber_counter
         if self.is_active is True:
-            self.is_active = False
-            self.save()
+            with transaction.atomic():
+                self.is_active = False
+                self.save()
+                update_subscriber_counter(self.bot_id, active=-1, inactive=1)
 
     def __str__(self) -> str:
         return f"{self.name} - <{self.bot}>"
@@ -55,14 +69,113 @@ class Subscriber(models.Model):
                        kwargs={"slug": self.chat_id})
 
 
+class SubscriberCounter(models.Model):
+    """
+    Model for keeping numbers of subscribers of the bot.
+    Counters are changed with the subscribers in the same transaction
+    and are recounted by subscribers.tasks.reconcile_subscriber_counters.
+    """
+    bot = models.OneToOneField(
+        to=Bot, verbose_name="Бот", related_name="subscriber_counter",
+        on_delete=models.CASCADE,
+    )
+    active = models.IntegerField("Активные подписчики", default=0)
+    inactive = models.IntegerField("Неактивные подписчики", default=0)
+    new_today = models.IntegerField("Новые за день", default=0)
+    # day of new_today
+    day = models.DateField("День")
+
+    class Meta:
+        verbose_name = "Счетчик подписчиков"
+        verbose_name_plural = "Счетчики подписчиков"
+        db_table = "SubscriberCounters"
+
+    def __str__(self) -> str:
+        return f"{self.bot}: {self.active}/{self.total}"
+
+    @property
+    def total(self) -> int:
+        return self.active + self.inactive
+
+
+class Segment(models.Model):
+    """
+    Saved group of active subscribers of the bot for mailings.
+    Rules are combined with AND, empty rules are not applied.
+    Members are selected by one query of
+    subscribers.services.get_segment_subscribers, their number
+    is cached in `size` by subscribers.tasks.refresh_segment_sizes.
+    """
+    bot = models.ForeignKey(
+        to=Bot, verbose_name="Бот", related_name="segments",
+        on_delete=models.CASCADE,
+    )
+    name = models.CharField("Название", max_length=255)
+
+    is_admin = models.BooleanField("Модератор", null=True, blank=True)
+    joined_within_days = models.PositiveIntegerField(
+        "Подписался за последние N дней", null=True, blank=True
+    )
+    active_within_days = models.PositiveIntegerField(
+        "Писал боту за последние N дней", null=True, blank=True
+    )
+    inactive_for_days = models.PositiveIntegerField(
+        "Не писал боту последние N дней", null=True, blank=True
+    )
+    min_orders = models.PositiveIntegerField(
+        "Заказов не меньше", null=True, blank=True
+    )
+    max_orders = models.PositiveIntegerField(
+        "Заказов не больше", null=True, blank=True
+    )
+    ordered_within_days = models.PositiveIntegerField(
+        "Заказывал за последние N дней", null=True, blank=True
+    )
+    has_active_basket = models.BooleanField(
+        "Есть товары в корзине", null=True, blank=True
+    )
+
+    size = models.PositiveIntegerField("Подписчиков", default=0)
+    size_updated_at = models.DateTimeField(
+        "Подписчики посчитаны", null=True, blank=True
+    )
+    created = models.DateTimeField("Создан", auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Сегмент подписчиков"
+        verbose_name_plural = "Сегменты подписчиков"
+        db_table = "Segments"
+        unique_together = [["bot", "name"]]
+
+    def __str__(self) -> str:
+        return f"{self.name} - <{self.bot}>"
+
+
 # TODO: remove
 class Message(models.Model):
     """
     Model representing message.
+    Media is downloaded by subscribers.tasks.download_message_media
+    after the message is saved.
     """
+    MEDIA_NONE = 'none'
+    MEDIA_PENDING = 'pending'
+    MEDIA_SAVED = 'saved'
+    MEDIA_TOO_LARGE = 'too_large'
+    MEDIA_FAILED = 'failed'
+
+    MEDIA_STATUSES = [
+        (MEDIA_NONE, 'Без файла'),
+        (MEDIA_PENDING, 'Загружается'),
+        (MEDIA_SAVED, 'Загружен'),
+        (MEDIA_TOO_LARGE, 'Слишком большой'),
+        (MEDIA_FAILED, 'Ошибка загрузки'),
+    ]
+
     message_token = models.CharField("ID сообщения", max_length=50)
+    # covered by message_sender_id_idx
     sender = models.ForeignKey(Subscriber, on_delete=models.CASCADE,
-                               related_name="messages")
+                               related_name="messages", db_index=False)
     text = models.TextField("Содержание сообщения", default=None,
                             null=True, blank=True)
     created = models.DateTimeField("Отправлено в ", auto_now_add=True)
@@ -77,11 +190,30 @@ class Message(models.Model):
         blank=True, null=True
     )
     url = models.URLField("Ссылка", blank=True, null=True, max_length=700)
+    media_status = models.CharField(
+        "Статус файла", max_length=16, choices=MEDIA_STATUSES,
+        default=MEDIA_NONE
+    )
+    media_type = models.CharField(
+        "Тип файла", max_length=16, blank=True, null=True
+    )
+    # file_id on the Telegram server, the file is downloaded with it
+    media_file_id = models.CharField(
+        "ID файла в Telegram", max_length=255, blank=True, null=True
+    )
 
     class Meta:
         verbose_name = "Сообщения пользователей"
         verbose_name_plural = "Сообщение"
         db_table = "Messages"
+        indexes = [
+            # keyset pages of messages of the subscriber
+            models.Index(fields=["sender", "id"],
+                         name="message_sender_id_idx"),
+            # messages of the subscriber by date
+            models.Index(fields=["sender", "created"],
+                         name="message_sender_created_idx"),
+        ]
 
     def __str__(self) -> str:
         return f"{self.text}"
@@ -140,6 +272,13 @@ class Reply(models.Model):
     class Meta:
         verbose_name = "Ответ модератора"
         verbose_name_plural = "Ответы модераторов"
+        indexes = [
+            # new and started help requests, closed ones are the most
+            # and are not indexed
+            models.Index(fields=["is_started", "message"],
+                         condition=models.Q(is_closed=False),
+                         name="reply_open_idx"),
+        ]
 
     def __str__(self) -> str:
         if self.is_closed:
@@ -0,0 +1,110 @@
+from typing import List, Union
+
+from django.db.models import QuerySet
+from django.http import Http404
+
+
+class KeysetPage:
+    """
+    Page of objects ordered by descending id.
+    next_cursor and previous_cursor are ids for the `after`
+    and `before` arguments of KeysetPaginator.get_page.
+    """
+
+    def __init__(self, object_list: List, has_next: bool,
+                 has_previous: bool):
+        self.object_list = object_list
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def has_next(self) -> bool:
+        return self._has_next
+
+    def has_previous(self) -> bool:
+        return self._has_previous
+
+    def has_other_pages(self) -> bool:
+        return self._has_next or self._has_previous
+
+    @property
+    def next_cursor(self) -> Union[int, None]:
+        if not self._has_next or not self.object_list:
+            return None
+        return self.object_list[-1].pk
+
+    @property
+    def previous_cursor(self) -> Union[int, None]:
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.object_list[0].pk
+
+
+class KeysetPaginator:
+    """
+    Paginates the queryset by id instead of OFFSET.
+    A page is taken with `id < after` (or `id > before`) and LIMIT,
+    so with an index ending with id any page is as fast as the first one.
+    """
+
+    def __init__(self, queryset: QuerySet, per_page: int):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def get_page(self, after: int = None, before: int = None) -> KeysetPage:
+        if before is not None:
+            objects = list(self.queryset.filter(
+                pk__gt=before
+            ).order_by('pk')[:self.per_page + 1])
+            has_previous = len(objects) > self.per_page
+            objects = objects[:self.per_page][::-1]
+            # an empty page has no cursors, e.g. `before` is newer
+            # than all objects
+            return KeysetPage(objects, has_next=bool(objects),
+                              has_previous=has_previous)
+
+        queryset = self.queryset.order_by('-pk')
+        if after is not None:
+            queryset = queryset.filter(pk__lt=after)
+        objects = list(queryset[:self.per_page + 1])
+        return KeysetPage(objects[:self.per_page],
+                          has_next=len(objects) > self.per_page,
+                          has_previous=after is not None and bool(objects))
+
+
+def parse_cursor(value: Union[str, None]) -> Union[int, None]:
+    if value is None or value == '':
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise Http404("Invalid cursor")
+
+
+class KeysetPaginationMixin:
+    """
+    ListView mixin, that paginates by ?after=<id> and ?before=<id>
+    cursors instead of page numbers
+    """
+    paginate_by = 100
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        # filters of the page are kept in links to other pages
+        query = self.request.GET.copy()
+        query.pop('after', None)
+        query.pop('before', None)
+        context['page_query'] = query.urlencode()
+        return context
+
+    def paginate_queryset(self, queryset, page_size):
+        page = KeysetPaginator(queryset, page_size).get_page(
+            after=parse_cursor(self.request.GET.get('after')),
+            before=parse_cursor(self.request.GET.get('before')),
+        )
+        return None, page, page.object_list, page.has_other_pages()
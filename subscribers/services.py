@@ -1,33 +1,283 @@
-from typing import Union
+from collections import Counter
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
 
-from django.db import ProgrammingError
-from django.db.models import Q, QuerySet, Count
+from django.apps import apps
+from django.db import IntegrityError, ProgrammingError, transaction
+from django.db.models import (
+    Case, Count, Exists, F, OuterRef, Q, QuerySet, Subquery, Value, When
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 from bots_management.models import Bot
-from .models import Subscriber, Message, Reply
+from telegram_api.engine import iter_chunks
+from .cache import get_profile_fingerprint, get_subscriber_cache
+from .models import Subscriber, SubscriberCounter, Segment, Message, Reply
+
+
+# how many subscribers are deactivated by one UPDATE
+DEACTIVATE_BATCH_SIZE = 500
 
 
 def get_subscriber(uid: str, bot: Bot) -> Union[Subscriber, None]:
     return Subscriber.objects.filter(
-        Q(user_id=uid) & Q(bot=bot)
+        Q(chat_id=uid) & Q(bot=bot)
     ).first()
 
 
+def get_telegram_name(user: dict) -> Union[str, None]:
+    return user.get('username') or user.get('first_name')
+
+
+def get_subscriber_profile(user: dict) -> dict:
+    """
+    Return fields of Subscriber taken from the Telegram user
+    """
+    return {'name': get_telegram_name(user)}
+
+
 def get_subscriber_telegram(user: dict,
-                            bot: Bot) -> Union[Subscriber, None]:
-    username = user.get('username')
-    if not username:
-        username = user.get('first_name')
-    return Subscriber.objects.update_or_create(
-        user_id=user.get('id'),
-        bot=bot,
-        defaults={
-            'user_id': user.get('id'),
-            'name': username,
-            'is_active': True,
-            'bot': bot,
-        }
+                            bot: Bot) -> Tuple[Subscriber, bool]:
+    """
+    Return (subscriber, created) of the Telegram user.
+    The row is written only if the subscriber is new, inactive or
+    its profile was changed, known subscribers come from the cache.
+    """
+    chat_id = str(user.get('id'))
+    profile = get_subscriber_profile(user)
+    fingerprint = get_profile_fingerprint(profile)
+    cache = get_subscriber_cache()
+    subscriber = cache.get(bot.id, chat_id, fingerprint)
+    if subscriber is not None:
+        return subscriber, False
+
+    subscriber = Subscriber.objects.filter(chat_id=chat_id, bot=bot).first()
+    created = subscriber is None
+    if created:
+        try:
+            with transaction.atomic():
+                subscriber = Subscriber.objects.create(
+                    chat_id=chat_id, bot=bot, **profile
+                )
+                update_subscriber_counter(bot.id, active=1, new=1)
+        except IntegrityError:
+            # the user was saved by another process meanwhile
+            subscriber = Subscriber.objects.get(chat_id=chat_id, bot=bot)
+            created = False
+
+    changed = [
+        field for field, value in profile.items()
+        if getattr(subscriber, field) != value
+    ]
+    if not subscriber.is_active or changed:
+        with transaction.atomic():
+            if not subscriber.is_active:
+                update_subscriber_counter(bot.id, active=1, inactive=-1)
+            for field in changed:
+                setattr(subscriber, field, profile[field])
+            subscriber.is_active = True
+            subscriber.save(update_fields=[*changed, 'is_active', 'updated'])
+    cache.set(subscriber, fingerprint)
+    return subscriber, created
+
+
+class IncomingMessage(NamedTuple):
+    """
+    Text message of the Telegram user, that waits to be saved
+    """
+    bot_id: int
+    user: dict
+    message_token: str
+    text: Union[str, None]
+
+
+def get_subscribers_by_chat(
+        keys: Iterable[Tuple[int, str]]) -> Dict[Tuple[int, str], Subscriber]:
+    """
+    Return subscribers by (bot id, chat id) with one query
+    """
+    chats = {}
+    for bot_id, chat_id in keys:
+        chats.setdefault(bot_id, []).append(chat_id)
+    if not chats:
+        return {}
+    subscribers = Subscriber.objects.filter(reduce(or_, (
+        Q(bot_id=bot_id, chat_id__in=chat_ids)
+        for bot_id, chat_ids in chats.items()
+    ))).only('id', 'bot_id', 'chat_id', 'name', 'is_active', 'created')
+    return {
+        (subscriber.bot_id, subscriber.chat_id): subscriber
+        for subscriber in subscribers
+    }
+
+
+def bulk_save_messages(messages: List[IncomingMessage]) -> None:
+    """
+    Save messages of many users with a few queries:
+    new subscribers are created, changed or inactive ones are updated
+    and all messages are inserted in bulk
+    """
+    users = {}
+    for message in messages:
+        users[(message.bot_id, str(message.user['id']))] = message.user
+    subscribers = get_subscribers_by_chat(users)
+
+    now = timezone.now()
+    to_create, to_update = [], []
+    # bot id -> number of reactivated subscribers
+    reactivated = Counter()
+    for (bot_id, chat_id), user in users.items():
+        profile = get_subscriber_profile(user)
+        subscriber = subscribers.get((bot_id, chat_id))
+        if subscriber is None:
+            to_create.append(
+                Subscriber(bot_id=bot_id, chat_id=chat_id, **profile)
+            )
+        elif subscriber.name != profile['name'] or not subscriber.is_active:
+            if not subscriber.is_active:
+                reactivated[bot_id] += 1
+            subscriber.name = profile['name']
+            subscriber.is_active = True
+            # bulk_update doesn't touch auto_now fields
+            subscriber.updated = now
+            to_update.append(subscriber)
+
+    with transaction.atomic():
+        if to_update:
+            Subscriber.objects.bulk_update(
+                to_update, ['name', 'is_active', 'updated']
+            )
+        if to_create:
+            # the user could be saved by another process meanwhile,
+            # its row is skipped and keeps the other creation time
+            Subscriber.objects.bulk_create(to_create, ignore_conflicts=True)
+            subscribers.update(get_subscribers_by_chat(
+                (subscriber.bot_id, subscriber.chat_id)
+                for subscriber in to_create
+            ))
+            to_create = [
+                subscriber for subscriber in to_create
+                if subscribers[(subscriber.bot_id, subscriber.chat_id)]
+                .created == subscriber.created
+            ]
+        created = Counter(subscriber.bot_id for subscriber in to_create)
+        for bot_id in created.keys() | reactivated.keys():
+            update_subscriber_counter(
+                bot_id,
+                active=created[bot_id] + reactivated[bot_id],
+                inactive=-reactivated[bot_id],
+                new=created[bot_id],
+            )
+        Message.objects.bulk_create([
+            Message(
+                sender_id=subscribers[
+                    (message.bot_id, str(message.user['id']))
+                ].id,
+                message_token=message.message_token,
+                text=message.text,
+            ) for message in messages
+        ])
+
+
+def deactivate_subscribers(bot_id: int, chat_ids: Iterable) -> int:
+    """
+    Mark subscribers of the bot, that can't get messages any more,
+    inactive with an UPDATE per DEACTIVATE_BATCH_SIZE chats.
+    Returns number of deactivated subscribers.
+    """
+    chat_ids = [str(chat_id) for chat_id in chat_ids]
+    deactivated = 0
+    for chunk in iter_chunks(chat_ids, DEACTIVATE_BATCH_SIZE):
+        with transaction.atomic():
+            updated = Subscriber.objects.filter(
+                bot_id=bot_id, chat_id__in=chunk, is_active=True
+            ).update(is_active=False, updated=timezone.now())
+            if updated:
+                update_subscriber_counter(
+                    bot_id, active=-updated, inactive=updated
+                )
+        deactivated += updated
+    # update() doesn't send signals
+    cache = get_subscriber_cache()
+    for chat_id in chat_ids:
+        cache.invalidate(bot_id, chat_id)
+    return deactivated
+
+
+def deactivate_unreachable_chats(chats: Dict[str, Iterable[str]]) -> None:
+    """
+    Deactivate subscribers of chats by tokens of their bots
+    """
+    bots = dict(
+        Bot.objects.filter(token__in=chats).values_list('token', 'id')
     )
+    for token, chat_ids in chats.items():
+        if token in bots:
+            deactivate_subscribers(bots[token], chat_ids)
+
+
+def reconcile_subscriber_counter(bot_id: int) -> SubscriberCounter:
+    """
+    Count subscribers of the bot and save numbers to its counter.
+    The counter is locked before counting, so subscribers changed
+    meanwhile are counted once.
+    """
+    today = timezone.localdate()
+    with transaction.atomic():
+        counter, _ = SubscriberCounter.objects.select_for_update(
+        ).get_or_create(bot_id=bot_id, defaults={'day': today})
+        counts = Subscriber.objects.filter(bot_id=bot_id).aggregate(
+            active=Count('id', filter=Q(is_active=True)),
+            inactive=Count('id', filter=Q(is_active=False)),
+            new_today=Count('id', filter=Q(created__date=today)),
+        )
+        for name, value in counts.items():
+            setattr(counter, name, value)
+        counter.day = today
+        counter.save()
+    return counter
+
+
+def update_subscriber_counter(bot_id: int, active: int = 0,
+                              inactive: int = 0, new: int = 0) -> None:
+    """
+    Add changes to the counter of the bot with one UPDATE.
+    Call it in the transaction, that changes subscribers.
+    """
+    today = timezone.localdate()
+    updated = SubscriberCounter.objects.filter(bot_id=bot_id).update(
+        active=F('active') + active,
+        inactive=F('inactive') + inactive,
+        new_today=Case(
+            When(day=today, then=F('new_today') + new),
+            default=Value(new),
+        ),
+        day=today,
+    )
+    if not updated:
+        # subscribers are already changed, so they are counted
+        reconcile_subscriber_counter(bot_id)
+
+
+def get_subscriber_counters(bot: Bot) -> dict:
+    """
+    Return numbers of active, inactive, all and today's new
+    subscribers of the bot without counting them
+    """
+    counter = SubscriberCounter.objects.filter(bot=bot).first()
+    if counter is None:
+        counter = reconcile_subscriber_counter(bot.id)
+    return {
+        'active': counter.active,
+        'inactive': counter.inactive,
+        'total': counter.total,
+        'new_today': (
+            counter.new_today if counter.day == timezone.localdate() else 0
+        ),
+    }
 
 
 def get_all_active_subs(bot: Bot) -> QuerySet:
@@ -36,8 +286,88 @@ def get_all_active_subs(bot: Bot) -> QuerySet:
     )
 
 
+def get_segment_subscribers(segment: Segment) -> QuerySet:
+    """
+    Return active subscribers of the segment.
+    Rules are compiled to subqueries, so members are selected
+    by one query and can be streamed with .iterator().
+    """
+    # orders app depends on subscribers
+    Basket = apps.get_model('orders', 'Basket')
+    Order = apps.get_model('orders', 'Order')
+
+    now = timezone.now()
+    subscribers = Subscriber.objects.filter(
+        is_active=True, bot_id=segment.bot_id
+    )
+    if segment.is_admin is not None:
+        subscribers = subscribers.filter(is_admin=segment.is_admin)
+    if segment.joined_within_days is not None:
+        subscribers = subscribers.filter(
+            created__gte=now - timedelta(days=segment.joined_within_days)
+        )
+
+    messages = Message.objects.filter(sender=OuterRef('pk'))
+    if segment.active_within_days is not None:
+        subscribers = subscribers.filter(Exists(messages.filter(
+            created__gte=now - timedelta(days=segment.active_within_days)
+        )))
+    if segment.inactive_for_days is not None:
+        subscribers = subscribers.filter(~Exists(messages.filter(
+            created__gte=now - timedelta(days=segment.inactive_for_days)
+        )))
+
+    orders = Order.objects.filter(basket__subscriber=OuterRef('pk'))
+    if segment.ordered_within_days is not None:
+        subscribers = subscribers.filter(Exists(orders.filter(
+            created_stamp__gte=now - timedelta(
+                days=segment.ordered_within_days
+            )
+        )))
+    if segment.min_orders is not None or segment.max_orders is not None:
+        subscribers = subscribers.annotate(num_orders=Coalesce(
+            Subquery(
+                orders.order_by().values('basket__subscriber').annotate(
+                    count=Count('id')
+                ).values('count')
+            ),
+            0
+        ))
+        if segment.min_orders is not None:
+            subscribers = subscribers.filter(
+                num_orders__gte=segment.min_orders
+            )
+        if segment.max_orders is not None:
+            subscribers = subscribers.filter(
+                num_orders__lte=segment.max_orders
+            )
+    if segment.has_active_basket is not None:
+        active_basket = Exists(Basket.objects.filter(
+            subscriber=OuterRef('pk'), is_active=True,
+            products__isnull=False
+        ))
+        subscribers = subscribers.filter(
+            active_basket if segment.has_active_basket else ~active_basket
+        )
+    return subscribers
+
+
+def refresh_segment_size(segment: Segment) -> int:
+    """
+    Count subscribers of the segment and save the number
+    """
+    segment.size = get_segment_subscribers(segment).count()
+    segment.size_updated_at = timezone.now()
+    segment.save(update_fields=['size', 'size_updated_at'])
+    return segment.size
+
+
+def get_bot_segments(bot: Bot) -> QuerySet:
+    return Segment.objects.filter(bot=bot).order_by('name')
+
+
 def get_subscribers_of_bot(slug: str) -> QuerySet:
-    return Subscriber.objects.filter(messengers_bot__channel__slug=slug)
+    return Subscriber.objects.filter(bot__slug=slug)
 
 
 def get_status_subscribers_of_bot(
@@ -48,16 +378,13 @@ def get_status_subscribers_of_bot(
         if status == 'active':
             subscribers = subscribers.filter(is_active=True)
         elif status == 'not_active':
-            subscribers = subscribers.filter(is_active=True)
+            subscribers = subscribers.filter(is_active=False)
     return subscribers
 
 
 def get_num_of_subs(bot: Bot) -> int:
     try:
-        result = get_all_active_subs(bot).aggregate(
-            Count('id')
-        )["id__count"]
-        return result
+        return get_subscriber_counters(bot)['active']
     except ProgrammingError:
         return 0
 
@@ -72,10 +399,13 @@ def get_num_of_subs_to_bot(bot: Bot, messenger: str) -> int:
         return 0
 
 
-def get_messages_subscribers_of_bot(slug: str) -> QuerySet:
+def get_messages_subscribers_of_bot(slug: str,
+                                    sender_id: int = None) -> QuerySet:
     messages = Message.objects.filter(
-        sender__in=get_subscribers_of_bot(slug)
-    )
+        sender__bot__slug=slug
+    ).select_related('sender__bot')
+    if sender_id is not None:
+        messages = messages.filter(sender_id=sender_id)
     return messages.order_by('-id')
 
 
@@ -84,8 +414,8 @@ def get_all_help_messages(slug: str) -> QuerySet:
     Returns all messages, asking for help
     """
     return Message.objects.filter(
-        is_help_message=True,
         sender__bot__slug=slug,
+        help_reply__isnull=False
     )
 
 
@@ -94,7 +424,6 @@ def get_all_active_help_messages(slug: str) -> QuerySet:
     Returns all active messages, asking for help
     """
     return Message.objects.filter(
-        is_help_message=True,
         sender__bot__slug=slug,
         help_reply__is_started=False,
         help_reply__is_closed=False
@@ -106,7 +435,6 @@ def get_all_started_help_messages(slug: str) -> QuerySet:
     Returns all started messages, asking for help
     """
     return Message.objects.filter(
-        is_help_message=True,
         sender__bot__slug=slug,
         help_reply__is_started=True,
         help_reply__is_closed=False
@@ -118,8 +446,7 @@ def get_all_closed_help_messages(slug: str) -> QuerySet:
     Returns all closed messages, asking for help
     """
     return Message.objects.filter(
-        is_help_message=True,
-        sender__messengers_bot__channel__slug=slug,
+        sender__bot__slug=slug,
         help_reply__is_closed=True
     )
 
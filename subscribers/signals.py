@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache import get_subscriber_cache
+from .models import Subscriber
+
+
+@receiver(post_save, sender=Subscriber)
+@receiver(post_delete, sender=Subscriber)
+def invalidate_subscriber_cache(sender, instance: Subscriber,
+                                **kwargs) -> None:
+    get_subscriber_cache().invalidate(instance.bot_id, instance.chat_id)
@@ -0,0 +1,131 @@
+import atexit
+import logging
+import threading
+from typing import Callable, List
+
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.db import close_old_connections
+
+from .services import IncomingMessage, bulk_save_messages
+
+logger = logging.getLogger(__name__)
+
+
+class MessageSink:
+    """
+    Buffer for incoming messages of all bots.
+    Messages are saved with bulk queries every `batch_size` items
+    or `interval` seconds by a background thread, whatever comes first.
+    Buffered messages are saved when the process exits.
+    If the batch can't be saved, messages are saved one by one,
+    so one broken message doesn't take others with it, and the failed
+    ones are tried again with the next batches.
+    """
+    # a message is dropped after so many failed flushes
+    max_attempts = 3
+
+    def __init__(self, batch_size: int, interval: float,
+                 save: Callable[[List[IncomingMessage]], None]
+                 = bulk_save_messages):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.save = save
+        self._messages = []
+        self._lock = threading.Lock()
+        # flushes are serialized to save messages in order
+        self._flush_lock = threading.Lock()
+        self._full = threading.Event()
+        self._closed = False
+        self._thread = None
+
+    def add(self, message: IncomingMessage) -> None:
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Message sink is closed")
+            self._messages.append((message, 0))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            if len(self._messages) >= self.batch_size:
+                self._full.set()
+
+    def flush(self) -> None:
+        with self._flush_lock:
+            with self._lock:
+                messages, self._messages = self._messages, []
+            if not messages:
+                return
+            try:
+                self.save([message for message, _ in messages])
+                return
+            except Exception as e:
+                logger.warning(
+                    f"""{len(messages)} incoming messages were not saved,
+                    they are saved one by one.
+                    Error: {e}"""
+                )
+
+            failed = []
+            for message, attempts in messages:
+                try:
+                    self.save([message])
+                except Exception as e:
+                    attempts += 1
+                    if attempts < self.max_attempts:
+                        failed.append((message, attempts))
+                        continue
+                    logger.exception(
+                        f"""Message {message.message_token} of bot
+                        {message.bot_id} was not saved.
+                        Error: {e}"""
+                    )
+            if failed:
+                with self._lock:
+                    # before the new ones to keep the order
+                    self._messages[:0] = failed
+
+    def close(self) -> None:
+        """
+        Stop the background thread and save buffered messages
+        """
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        self._full.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        # failed messages are kept for the next flushes
+        for _ in range(self.max_attempts):
+            self.flush()
+
+    def _run(self) -> None:
+        while not self._closed:
+            self._full.wait(self.interval)
+            self._full.clear()
+            close_old_connections()
+            self.flush()
+
+
+_sink = None
+_lock = threading.Lock()
+
+
+def get_message_sink() -> MessageSink:
+    global _sink
+    if _sink is None:
+        with _lock:
+            if _sink is None:
+                _sink = MessageSink(
+                    batch_size=settings.MESSAGE_SINK_BATCH_SIZE,
+                    interval=settings.MESSAGE_SINK_INTERVAL,
+                )
+                atexit.register(_sink.close)
+    return _sink
+
+
+@worker_process_shutdown.connect
+def close_message_sink(**kwargs) -> None:
+    # celery pool processes may exit without running atexit handlers
+    if _sink is not None:
+        _sink.close()
@@ -0,0 +1,74 @@
+import logging
+
+import requests
+from celery import shared_task
+
+from telebot.apihelper import ApiException
+
+from bots_management.models import Bot
+from telegram_api.media import MediaTooLarge, download_to_field
+from .models import Message, Segment
+from .services import reconcile_subscriber_counter, refresh_segment_size
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=3)
+def download_message_media(self, message_id: int) -> None:
+    """
+    Celery task for saving media of the incoming message to the storage.
+    Network errors are retried, the message is marked as failed
+    when there are no retries left.
+    """
+    message = Message.objects.select_related('sender__bot').filter(
+        id=message_id, media_status=Message.MEDIA_PENDING
+    ).first()
+    if message is None:
+        # message was deleted or its media is already saved
+        return
+    field = message.image if message.media_type == 'photo' else message.file
+    try:
+        download_to_field(
+            message.sender.bot.token, message.media_file_id, field
+        )
+        message.media_status = Message.MEDIA_SAVED
+    except MediaTooLarge as e:
+        logger.info(f"Media of message {message_id} is skipped: {e}")
+        message.media_status = Message.MEDIA_TOO_LARGE
+    except requests.RequestException as e:
+        if self.request.retries < self.max_retries:
+            raise self.retry(exc=e, countdown=2 ** self.request.retries)
+        logger.warning(
+            f"""Media of message {message_id} was not downloaded.
+            Error: {e}"""
+        )
+        message.media_status = Message.MEDIA_FAILED
+    except ApiException as e:
+        # e.g. getFile refuses files larger than 20 MB
+        logger.warning(
+            f"""Media of message {message_id} was not downloaded.
+            Error: {e}"""
+        )
+        message.media_status = Message.MEDIA_FAILED
+    message.save(update_fields=[field.field.name, 'media_status'])
+
+
+@shared_task(ignore_result=True)
+def reconcile_subscriber_counters() -> None:
+    """
+    Celery task for counting subscribers of all bots again.
+    Fixes counters after changes, that bypass the services
+    (admin, raw queries), and resets new_today every day.
+    """
+    for bot_id in Bot.objects.values_list('id', flat=True).iterator():
+        reconcile_subscriber_counter(bot_id)
+
+
+@shared_task(ignore_result=True)
+def refresh_segment_sizes() -> None:
+    """
+    Celery task for counting subscribers of all segments again,
+    the numbers are shown when a mailing is created
+    """
+    for segment in Segment.objects.iterator():
+        refresh_segment_size(segment)
@@ -0,0 +1,83 @@
+from unittest import mock
+
+from bots_management.tests.utils import BotTestCase
+from subscribers import services
+from subscribers.cache import get_subscriber_cache
+from subscribers.models import Message, Subscriber, SubscriberCounter
+from subscribers.services import (
+    IncomingMessage,
+    bulk_save_messages,
+    deactivate_subscribers,
+    get_num_of_subs,
+    get_subscriber_counters,
+    get_subscriber_telegram
+)
+from subscribers.tasks import reconcile_subscriber_counters
+
+
+class SubscriberCounterTestCase(BotTestCase):
+    def setUp(self):
+        self.addCleanup(get_subscriber_cache().clear)
+
+    def assertCounters(self, active, inactive, new_today):
+        self.assertEqual(get_subscriber_counters(self.bot), {
+            "active": active, "inactive": inactive,
+            "total": active + inactive, "new_today": new_today,
+        })
+
+    def test_counters_follow_subscribers(self):
+        subscriber, _ = get_subscriber_telegram({"id": 1}, self.bot)
+        get_subscriber_telegram({"id": 2}, self.bot)
+        self.assertCounters(active=2, inactive=0, new_today=2)
+
+        subscriber.ban_user()
+        self.assertCounters(active=1, inactive=1, new_today=2)
+
+        get_subscriber_telegram({"id": 1}, self.bot)
+        self.assertCounters(active=2, inactive=0, new_today=2)
+
+        deactivate_subscribers(self.bot.id, ["1", "2", "3"])
+        self.assertCounters(active=0, inactive=2, new_today=2)
+
+    def test_batches_change_counters(self):
+        get_subscriber_telegram({"id": 1}, self.bot)
+        deactivate_subscribers(self.bot.id, ["1"])
+        bulk_save_messages([
+            IncomingMessage(self.bot.id, {"id": chat_id}, "1", "hi")
+            for chat_id in (1, 2, 3)
+        ])
+        self.assertCounters(active=3, inactive=0, new_today=3)
+
+    def test_subscribers_saved_meanwhile_are_not_counted(self):
+        get_subscriber_telegram({"id": 1}, self.bot)
+        get_subscribers = services.get_subscribers_by_chat
+        calls = []
+
+        def saved_meanwhile(keys):
+            # the first lookup runs before the other process saves chat 1
+            calls.append(keys)
+            return {} if len(calls) == 1 else get_subscribers(keys)
+
+        with mock.patch("subscribers.services.get_subscribers_by_chat",
+                        side_effect=saved_meanwhile):
+            bulk_save_messages([
+                IncomingMessage(self.bot.id, {"id": chat_id}, "1", "hi")
+                for chat_id in (1, 2)
+            ])
+        self.assertCounters(active=2, inactive=0, new_today=2)
+        self.assertEqual(Message.objects.count(), 2)
+
+    def test_counters_are_read_without_counting(self):
+        get_subscriber_telegram({"id": 1}, self.bot)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_num_of_subs(self.bot), 1)
+
+    def test_counters_are_reconciled(self):
+        get_subscriber_telegram({"id": 1}, self.bot)
+        # changes, that bypass the services
+        Subscriber.objects.create(chat_id="2", bot=self.bot)
+        Subscriber.objects.create(chat_id="3", bot=self.bot, is_active=False)
+        SubscriberCounter.objects.filter(bot=self.bot).update(new_today=10)
+
+        reconcile_subscriber_counters()
+        self.assertCounters(active=2, inactive=1, new_today=3)
@@ -0,0 +1,122 @@
+from datetime import timedelta
+
+from django.db import connection
+from django.utils import timezone
+
+from bots_mailings.models import Post, SentMessage
+from bots_mailings.services import get_pending_deliveries
+from bots_management.tests.utils import BotTestCase
+from orders.models import Basket
+from subscribers.models import Message, Reply, Subscriber
+from subscribers.services import (
+    get_all_active_help_messages,
+    get_all_active_subs,
+    get_status_subscribers_of_bot
+)
+
+
+class IndexUsageTestCase(BotTestCase):
+    """
+    EXPLAIN of the hot querysets must show their indexes.
+    Seeded data is small, so sequential scans are turned off
+    on PostgreSQL, SQLite picks indexes without statistics.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Subscriber.objects.bulk_create([
+            Subscriber(chat_id=str(chat_id), bot=cls.bot,
+                       is_active=chat_id % 3 != 0)
+            for chat_id in range(300)
+        ])
+        cls.subscriber = Subscriber.objects.first()
+        Message.objects.bulk_create([
+            Message(sender=subscriber, message_token="1", text="hi")
+            for subscriber in Subscriber.objects.all()[:100]
+        ])
+        Reply.objects.bulk_create([
+            Reply(message=message, text="reply", moderator=cls.owner,
+                  is_started=message.id % 2 == 0,
+                  is_closed=message.id % 5 == 0)
+            for message in Message.objects.all()
+        ])
+        cls.post = Post.objects.create(bot=cls.bot, url="https://example.com")
+        SentMessage.objects.bulk_create([
+            SentMessage(post=cls.post, chat_id=str(chat_id),
+                        status=SentMessage.SENT)
+            for chat_id in range(300)
+        ])
+        Basket.objects.bulk_create([
+            Basket(subscriber=subscriber, is_active=False)
+            for subscriber in Subscriber.objects.all()[:50]
+        ])
+
+    def setUp(self):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+        elif connection.vendor != "sqlite":
+            self.skipTest("EXPLAIN output is checked for sqlite and postgresql")
+
+    def assertUsesIndex(self, queryset, index_name: str):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, plan)
+
+    def test_active_subscribers(self):
+        self.assertUsesIndex(
+            get_all_active_subs(self.bot).order_by("id"),
+            "subscriber_active_idx"
+        )
+
+    def test_subscribers_page(self):
+        self.assertUsesIndex(
+            Subscriber.objects.filter(
+                bot=self.bot, is_active=False, id__lt=200
+            ).order_by("-id")[:100],
+            "subscriber_bot_active_id_idx"
+        )
+
+    def test_status_subscribers(self):
+        self.assertUsesIndex(
+            get_status_subscribers_of_bot("bot", status="not_active"),
+            "subscriber_bot_active_id_idx"
+        )
+
+    def test_messages_of_subscriber(self):
+        self.assertUsesIndex(
+            Message.objects.filter(
+                sender=self.subscriber,
+                created__gte=timezone.now() - timedelta(days=7)
+            ),
+            "message_sender_created_idx"
+        )
+
+    def test_active_help_messages(self):
+        # the queue is reached from the bot, every join goes by index
+        plan = get_all_active_help_messages("bot").explain()
+        self.assertNotRegex(plan, r"(?m)SCAN \w+$|Seq Scan")
+
+    def test_open_replies(self):
+        self.assertUsesIndex(
+            Reply.objects.filter(is_started=False, is_closed=False),
+            "reply_open_idx"
+        )
+
+    def test_pending_deliveries(self):
+        self.assertUsesIndex(
+            get_pending_deliveries(self.post).order_by("id"),
+            "sentmessage_post_status_idx"
+        )
+
+    def test_scheduled_posts(self):
+        self.assertUsesIndex(
+            Post.objects.filter(is_done=False, send_time__lte=timezone.now()),
+            "post_pending_send_time_idx"
+        )
+
+    def test_active_basket(self):
+        self.assertUsesIndex(
+            Basket.objects.filter(subscriber=self.subscriber, is_active=True),
+            "basket_active_idx"
+        )
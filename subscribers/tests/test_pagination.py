@@ -0,0 +1,106 @@
+import json
+from unittest import mock
+
+from django.http import Http404
+from django.test import RequestFactory
+
+from bots_management.tests.utils import BotTestCase
+from subscribers.models import Message, Subscriber
+from subscribers.pagination import KeysetPaginator
+from subscribers.views import SubscriberMessagesJsonView, SubscribersJsonView
+
+
+class KeysetPaginationTestCase(BotTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Subscriber.objects.bulk_create([
+            Subscriber(chat_id=str(chat_id), bot=cls.bot,
+                       is_active=chat_id % 2 == 0)
+            for chat_id in range(10)
+        ])
+        cls.subscribers = list(Subscriber.objects.order_by("-id"))
+        Message.objects.bulk_create([
+            Message(sender=subscriber, message_token="1", text="hi")
+            for subscriber in reversed(cls.subscribers)
+        ])
+
+    def get_ids(self, page):
+        return [subscriber.id for subscriber in page]
+
+    def test_pages_are_taken_by_cursor(self):
+        paginator = KeysetPaginator(Subscriber.objects.all(), per_page=4)
+        ids = [subscriber.id for subscriber in self.subscribers]
+
+        first = paginator.get_page()
+        self.assertEqual(self.get_ids(first), ids[:4])
+        self.assertFalse(first.has_previous())
+        second = paginator.get_page(after=first.next_cursor)
+        self.assertEqual(self.get_ids(second), ids[4:8])
+        last = paginator.get_page(after=second.next_cursor)
+        self.assertEqual(self.get_ids(last), ids[8:])
+        self.assertFalse(last.has_next())
+
+        previous = paginator.get_page(before=last.previous_cursor)
+        self.assertEqual(self.get_ids(previous), ids[4:8])
+        self.assertTrue(previous.has_previous())
+        self.assertTrue(previous.has_next())
+        self.assertFalse(
+            paginator.get_page(before=previous.previous_cursor).has_previous()
+        )
+
+    def test_empty_pages_have_no_cursors(self):
+        paginator = KeysetPaginator(Subscriber.objects.all(), per_page=4)
+        for page in (paginator.get_page(before=self.subscribers[0].id),
+                     paginator.get_page(after=self.subscribers[-1].id)):
+            self.assertEqual(len(page), 0)
+            self.assertIsNone(page.next_cursor)
+            self.assertIsNone(page.previous_cursor)
+
+        data = self.get_json(
+            SubscribersJsonView, {"before": self.subscribers[0].id},
+            status="all"
+        )
+        self.assertEqual(
+            (data["results"], data["next"], data["previous"]),
+            ([], None, None)
+        )
+
+    def test_page_is_one_query(self):
+        paginator = KeysetPaginator(Subscriber.objects.all(), per_page=4)
+        with self.assertNumQueries(1):
+            paginator.get_page(after=self.subscribers[5].id)
+
+    def get_json(self, view_class, query: dict = None, **kwargs) -> dict:
+        request = RequestFactory().get("/", query or {})
+        view = view_class()
+        view.setup(request, slug="bot", messenger="all", **kwargs)
+        return json.loads(view.get(request).content)
+
+    def test_subscribers_json(self):
+        data = self.get_json(SubscribersJsonView, status="active")
+        self.assertEqual(
+            [subscriber["chat_id"] for subscriber in data["results"]],
+            ["8", "6", "4", "2", "0"]
+        )
+        self.assertIsNone(data["next"])
+
+    def test_messages_json(self):
+        with mock.patch.object(SubscriberMessagesJsonView, "paginate_by", 3):
+            data = self.get_json(SubscriberMessagesJsonView)
+            self.assertEqual(len(data["results"]), 3)
+            self.assertEqual(data["results"][0]["sender"]["id"],
+                             self.subscribers[0].id)
+
+            data = self.get_json(SubscriberMessagesJsonView,
+                                 {"after": data["next"]})
+            self.assertEqual(data["results"][0]["sender"]["id"],
+                             self.subscribers[3].id)
+
+        data = self.get_json(SubscriberMessagesJsonView,
+                             {"sender": self.subscribers[1].id})
+        self.assertEqual(len(data["results"]), 1)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(Http404):
+            self.get_json(SubscribersJsonView, {"after": "x"}, status="all")
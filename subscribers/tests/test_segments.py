@@ -0,0 +1,132 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from bots_management.tests.utils import BotTestCase, create_bot
+from orders.models import Basket, Order
+from products.models import Product
+from subscribers.models import Message, Segment, Subscriber
+from subscribers.services import (
+    get_segment_subscribers,
+    refresh_segment_size
+)
+from subscribers.tasks import refresh_segment_sizes
+
+
+class SegmentTestCase(BotTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        other_bot = create_bot(cls.owner, slug="other", token="2:token")
+        now = timezone.now()
+        cls.new, cls.old, cls.buyer, cls.admin = [
+            Subscriber.objects.create(chat_id=str(chat_id), bot=cls.bot)
+            for chat_id in range(4)
+        ]
+        Subscriber.objects.create(chat_id="5", bot=cls.bot, is_active=False)
+        Subscriber.objects.create(chat_id="6", bot=other_bot)
+        Subscriber.objects.exclude(pk=cls.new.pk).update(
+            created=now - timedelta(days=60)
+        )
+        Subscriber.objects.filter(pk=cls.admin.pk).update(is_admin=True)
+
+        Message.objects.create(sender=cls.new, message_token="1", text="hi")
+        Message.objects.create(sender=cls.old, message_token="2", text="hi")
+        Message.objects.filter(sender=cls.old).update(
+            created=now - timedelta(days=30)
+        )
+
+        product = Product.objects.create(
+            name="product", description="product", price=10
+        )
+        for days in (40, 2):
+            basket = Basket.objects.create(
+                subscriber=cls.buyer, is_active=False
+            )
+            order = Order.objects.create(basket=basket, city="Kyiv")
+            Order.objects.filter(pk=order.pk).update(
+                created_stamp=now - timedelta(days=days)
+            )
+        Basket.objects.create(subscriber=cls.buyer).products.add(product)
+        Basket.objects.create(subscriber=cls.old)
+
+    def assertMembers(self, segment, subscribers):
+        self.assertEqual(
+            set(get_segment_subscribers(segment)), set(subscribers)
+        )
+
+    def test_empty_segment_has_all_active_subscribers(self):
+        segment = Segment(bot=self.bot, name="all")
+        self.assertMembers(
+            segment, [self.new, self.old, self.buyer, self.admin]
+        )
+
+    def test_subscriber_fields(self):
+        self.assertMembers(
+            Segment(bot=self.bot, name="new", joined_within_days=7),
+            [self.new]
+        )
+        self.assertMembers(
+            Segment(bot=self.bot, name="admins", is_admin=True),
+            [self.admin]
+        )
+
+    def test_activity(self):
+        self.assertMembers(
+            Segment(bot=self.bot, name="active", active_within_days=7),
+            [self.new]
+        )
+        self.assertMembers(
+            Segment(bot=self.bot, name="asleep", inactive_for_days=7),
+            [self.old, self.buyer, self.admin]
+        )
+
+    def test_orders(self):
+        self.assertMembers(
+            Segment(bot=self.bot, name="buyers", min_orders=2),
+            [self.buyer]
+        )
+        self.assertMembers(
+            Segment(bot=self.bot, name="no orders", max_orders=0),
+            [self.new, self.old, self.admin]
+        )
+        self.assertMembers(
+            Segment(bot=self.bot, name="recent", ordered_within_days=7),
+            [self.buyer]
+        )
+
+    def test_active_basket(self):
+        # the empty basket of self.old is not counted
+        self.assertMembers(
+            Segment(bot=self.bot, name="basket", has_active_basket=True),
+            [self.buyer]
+        )
+        self.assertMembers(
+            Segment(bot=self.bot, name="no basket", has_active_basket=False),
+            [self.new, self.old, self.admin]
+        )
+
+    def test_rules_are_combined_in_one_query(self):
+        segment = Segment(
+            bot=self.bot, name="mixed", inactive_for_days=7,
+            min_orders=1, ordered_within_days=7, has_active_basket=True
+        )
+        with self.assertNumQueries(1):
+            chat_ids = list(
+                get_segment_subscribers(segment).values_list(
+                    "chat_id", flat=True
+                ).iterator()
+            )
+        self.assertEqual(chat_ids, [self.buyer.chat_id])
+
+    def test_size_is_cached(self):
+        segment = Segment.objects.create(
+            bot=self.bot, name="asleep", inactive_for_days=7
+        )
+        self.assertEqual(refresh_segment_size(segment), 3)
+        Subscriber.objects.filter(pk=self.old.pk).update(is_active=False)
+
+        refresh_segment_sizes()
+        segment.refresh_from_db()
+        self.assertEqual(segment.size, 2)
+        self.assertIsNotNone(segment.size_updated_at)
@@ -0,0 +1,90 @@
+from bots_management.tests.utils import BotTestCase
+from subscribers.cache import get_subscriber_cache
+from subscribers.models import Subscriber
+from subscribers.services import (
+    deactivate_subscribers,
+    deactivate_unreachable_chats,
+    get_subscriber,
+    get_subscriber_telegram
+)
+
+
+class GetSubscriberTelegramTestCase(BotTestCase):
+    def setUp(self):
+        self.addCleanup(get_subscriber_cache().clear)
+
+    def test_new_subscriber_is_created(self):
+        subscriber, created = get_subscriber_telegram(
+            {"id": 1, "first_name": "John"}, self.bot
+        )
+        self.assertTrue(created)
+        self.assertEqual(get_subscriber("1", self.bot), subscriber)
+        self.assertEqual(subscriber.name, "John")
+
+    def test_known_subscriber_is_not_written(self):
+        get_subscriber_telegram({"id": 1, "username": "john"}, self.bot)
+        with self.assertNumQueries(0):
+            subscriber, created = get_subscriber_telegram(
+                {"id": 1, "username": "john"}, self.bot
+            )
+        self.assertFalse(created)
+        self.assertEqual(subscriber.chat_id, "1")
+
+    def test_unchanged_subscriber_is_only_read(self):
+        Subscriber.objects.create(chat_id="1", bot=self.bot, name="john")
+        with self.assertNumQueries(1):
+            get_subscriber_telegram({"id": 1, "username": "john"}, self.bot)
+
+    def test_changed_profile_is_saved(self):
+        get_subscriber_telegram({"id": 1, "username": "john"}, self.bot)
+        subscriber, _ = get_subscriber_telegram(
+            {"id": 1, "username": "johnny"}, self.bot
+        )
+        self.assertEqual(subscriber.name, "johnny")
+        self.assertEqual(
+            Subscriber.objects.get(chat_id="1", bot=self.bot).name, "johnny"
+        )
+
+    def test_banned_subscriber_is_activated(self):
+        subscriber, _ = get_subscriber_telegram(
+            {"id": 1, "username": "john"}, self.bot
+        )
+        subscriber.ban_user()
+
+        subscriber, _ = get_subscriber_telegram(
+            {"id": 1, "username": "john"}, self.bot
+        )
+        self.assertTrue(subscriber.is_active)
+        self.assertTrue(
+            Subscriber.objects.get(chat_id="1", bot=self.bot).is_active
+        )
+
+
+class DeactivateSubscribersTestCase(BotTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for chat_id in range(3):
+            Subscriber.objects.create(chat_id=str(chat_id), bot=cls.bot)
+
+    def setUp(self):
+        self.addCleanup(get_subscriber_cache().clear)
+
+    def test_chats_are_deactivated_by_token(self):
+        deactivate_unreachable_chats({
+            "1:token": {"0", "2"}, "unknown:token": {"1"}
+        })
+        self.assertEqual(
+            list(Subscriber.objects.filter(is_active=True)
+                 .values_list("chat_id", flat=True)),
+            ["1"]
+        )
+
+    def test_cached_subscriber_is_activated_again(self):
+        get_subscriber_telegram({"id": 0, "username": "john"}, self.bot)
+        self.assertEqual(deactivate_subscribers(self.bot.id, [0]), 1)
+
+        get_subscriber_telegram({"id": 0, "username": "john"}, self.bot)
+        self.assertTrue(
+            Subscriber.objects.get(bot=self.bot, chat_id="0").is_active
+        )
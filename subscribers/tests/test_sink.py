@@ -0,0 +1,132 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from bots_management.tests.utils import BotTestCase
+from subscribers.models import Message, Subscriber
+from subscribers.services import IncomingMessage, bulk_save_messages
+from subscribers.sink import MessageSink
+from telegram_api.utils import save_message
+
+
+def make_message(chat_id: int, text: str = "hi", bot_id: int = 1,
+                 name: str = "user"):
+    return IncomingMessage(
+        bot_id=bot_id, user={"id": chat_id, "username": name},
+        message_token=str(chat_id), text=text
+    )
+
+
+class MessageSinkTestCase(SimpleTestCase):
+    def setUp(self):
+        self.saved = []
+        self.batch_saved = threading.Event()
+
+        def save(messages):
+            self.saved.append(messages)
+            self.batch_saved.set()
+
+        self.save = save
+
+    def test_full_batch_is_saved(self):
+        sink = MessageSink(batch_size=2, interval=60, save=self.save)
+        self.addCleanup(sink.close)
+        sink.add(make_message(1))
+        sink.add(make_message(2))
+        self.assertTrue(self.batch_saved.wait(5))
+        self.assertEqual(self.saved, [[make_message(1), make_message(2)]])
+
+    def test_messages_are_saved_after_interval(self):
+        sink = MessageSink(batch_size=100, interval=0.01, save=self.save)
+        self.addCleanup(sink.close)
+        sink.add(make_message(1))
+        self.assertTrue(self.batch_saved.wait(5))
+        self.assertEqual(self.saved, [[make_message(1)]])
+
+    def test_messages_are_saved_on_close(self):
+        sink = MessageSink(batch_size=100, interval=60, save=self.save)
+        sink.add(make_message(1))
+        sink.close()
+        self.assertEqual(self.saved, [[make_message(1)]])
+        with self.assertRaises(RuntimeError):
+            sink.add(make_message(2))
+
+    def test_broken_message_does_not_drop_batch(self):
+        def save(messages):
+            if make_message(2) in messages:
+                raise ValueError("bot was deleted")
+            self.saved.append(messages)
+
+        sink = MessageSink(batch_size=100, interval=60, save=save)
+        for chat_id in range(1, 4):
+            sink.add(make_message(chat_id))
+        with mock.patch("subscribers.sink.logger") as logger:
+            sink.close()
+        self.assertEqual(
+            self.saved, [[make_message(1)], [make_message(3)]]
+        )
+        # it's tried on every flush and then given up
+        logger.exception.assert_called_once()
+
+    def test_failed_messages_are_saved_with_next_batch(self):
+        save = mock.Mock(side_effect=[
+            Exception("db is down"), Exception("db is down"), None
+        ])
+        sink = MessageSink(batch_size=100, interval=60, save=save)
+        sink.add(make_message(1))
+        with mock.patch("subscribers.sink.logger"):
+            sink.flush()
+        sink.add(make_message(2))
+        sink.close()
+        self.assertEqual(
+            save.call_args[0][0], [make_message(1), make_message(2)]
+        )
+
+
+class BulkSaveMessagesTestCase(BotTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        Subscriber.objects.create(chat_id="1", bot=cls.bot, name="user")
+        Subscriber.objects.create(chat_id="2", bot=cls.bot, name="user",
+                                  is_active=False)
+
+    def test_subscribers_are_upserted(self):
+        bulk_save_messages([
+            make_message(1, "first", bot_id=self.bot.id),
+            make_message(2, "second", bot_id=self.bot.id),
+            make_message(3, "third", bot_id=self.bot.id, name="new"),
+            make_message(3, "fourth", bot_id=self.bot.id, name="new"),
+        ])
+        self.assertEqual(
+            sorted(Subscriber.objects.values_list(
+                "chat_id", "name", "is_active"
+            )),
+            [("1", "user", True), ("2", "user", True), ("3", "new", True)]
+        )
+        self.assertEqual(
+            list(Message.objects.order_by("id").values_list(
+                "sender__chat_id", "text"
+            )),
+            [("1", "first"), ("2", "second"),
+             ("3", "third"), ("3", "fourth")]
+        )
+
+    def test_unchanged_subscribers_are_not_updated(self):
+        # select of subscribers and insert of messages in a savepoint
+        with self.assertNumQueries(4):
+            bulk_save_messages([
+                make_message(1, bot_id=self.bot.id) for _ in range(10)
+            ])
+
+    @mock.patch("telegram_api.utils.get_message_sink")
+    def test_texts_go_to_sink(self, get_sink):
+        save_message(channel=self.bot, in_data={"message": {
+            "message_id": 5, "chat": {"id": 1}, "text": "hi"
+        }})
+        get_sink.return_value.add.assert_called_once_with(IncomingMessage(
+            bot_id=self.bot.id, user={"id": 1},
+            message_token=5, text="hi"
+        ))
+        self.assertFalse(Message.objects.exists())
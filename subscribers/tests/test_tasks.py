@@ -0,0 +1,119 @@
+import shutil
+import tempfile
+from unittest import mock
+
+import requests
+from django.core.files.base import ContentFile
+from django.test import override_settings
+
+from bots_management.tests.utils import BotTestCase
+from bots_settings.celery import app
+from subscribers.models import Message, Subscriber
+from subscribers.tasks import download_message_media
+from telegram_api.media import MediaTooLarge
+from telegram_api.utils import save_message
+
+
+class MediaTestCase(BotTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.subscriber = Subscriber.objects.create(chat_id="1", bot=cls.bot)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, "task_always_eager", False)
+
+    def create_message(self, media_type="document"):
+        return Message.objects.create(
+            sender=self.subscriber, message_token="1",
+            media_type=media_type, media_file_id="file-id",
+            media_status=Message.MEDIA_PENDING
+        )
+
+    def test_media_is_saved(self):
+        message = self.create_message(media_type="photo")
+
+        def download(token, file_id, field):
+            field.save("file_1.jpg", ContentFile(b"binary"), save=False)
+
+        with mock.patch("subscribers.tasks.download_to_field",
+                        side_effect=download) as download_mock:
+            download_message_media(message.id)
+
+        download_mock.assert_called_once()
+        self.assertEqual(download_mock.call_args[0][:2],
+                         ("1:token", "file-id"))
+        message.refresh_from_db()
+        self.assertEqual(message.media_status, Message.MEDIA_SAVED)
+        self.assertEqual(message.image.read(), b"binary")
+        self.assertFalse(message.file)
+
+    def test_large_media_is_skipped(self):
+        message = self.create_message()
+        with mock.patch("subscribers.tasks.download_to_field",
+                        side_effect=MediaTooLarge("large")):
+            download_message_media(message.id)
+        message.refresh_from_db()
+        self.assertEqual(message.media_status, Message.MEDIA_TOO_LARGE)
+
+    def test_network_errors_are_retried(self):
+        message = self.create_message()
+        with mock.patch("subscribers.tasks.download_to_field",
+                        side_effect=requests.ConnectionError) as download:
+            download_message_media.apply(args=(message.id,))
+        self.assertEqual(download.call_count,
+                         download_message_media.max_retries + 1)
+        message.refresh_from_db()
+        self.assertEqual(message.media_status, Message.MEDIA_FAILED)
+
+    def test_saved_media_is_not_downloaded_again(self):
+        message = self.create_message()
+        Message.objects.filter(id=message.id).update(
+            media_status=Message.MEDIA_SAVED
+        )
+        with mock.patch("subscribers.tasks.download_to_field") as download:
+            download_message_media(message.id)
+        download.assert_not_called()
+
+    @mock.patch("telegram_api.utils.transaction.on_commit",
+                side_effect=lambda callback: callback())
+    @mock.patch("telegram_api.utils.download_message_media")
+    def test_message_is_saved_before_download(self, task, on_commit):
+        update = {"message": {
+            "message_id": 5, "chat": {"id": 1},
+            "document": {"file_id": "file-id", "file_size": 10},
+            "caption": "caption",
+        }}
+        with mock.patch("telegram_api.utils.get_subscriber_telegram",
+                        return_value=(self.subscriber, False)):
+            save_message(channel=self.bot, in_data=update)
+
+        message = Message.objects.get(message_token="5")
+        self.assertEqual(message.text, "caption")
+        self.assertEqual(message.media_status, Message.MEDIA_PENDING)
+        self.assertEqual(message.media_type, "document")
+        task.apply_async.assert_called_once_with(
+            (message.pk,), queue="telegram-media"
+        )
+
+    @override_settings(TELEGRAM_MEDIA_MAX_SIZE=5)
+    @mock.patch("telegram_api.utils.download_message_media")
+    def test_large_media_is_not_queued(self, task):
+        update = {"message": {
+            "message_id": 5, "chat": {"id": 1},
+            "video": {"file_id": "file-id", "file_size": 10},
+        }}
+        with mock.patch("telegram_api.utils.get_subscriber_telegram",
+                        return_value=(self.subscriber, False)):
+            save_message(channel=self.bot, in_data=update)
+
+        message = Message.objects.get(message_token="5")
+        self.assertEqual(message.media_status, Message.MEDIA_TOO_LARGE)
+        task.apply_async.assert_not_called()
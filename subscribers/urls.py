@@ -2,6 +2,7 @@ from django.urls import path
 
 from subscribers.views import (
     SubscribersListView, SubscriberMessagesListView,
+    SubscribersJsonView, SubscriberMessagesJsonView,
     HelpMessagesListView, HelpMessageReplyView,
     HelpMessageReplyDetailView, SubscriberUpdateView
 )
@@ -15,10 +16,16 @@ urlpatterns = [
     path("<str:slug>/<str:messenger>_<str:status>/",
          SubscribersListView.as_view(),
          name="subscriber-list"),
+    path("<str:slug>/<str:messenger>_<str:status>/json/",
+         SubscribersJsonView.as_view(),
+         name="subscriber-list-json"),
 
     path("<str:slug>/messages/<str:messenger>",
          SubscriberMessagesListView.as_view(),
          name="subscriber-messages"),
+    path("<str:slug>/messages/<str:messenger>/json",
+         SubscriberMessagesJsonView.as_view(),
+         name="subscriber-messages-json"),
 
     path("<str:slug>/help-messages",
          HelpMessagesListView.as_view(),
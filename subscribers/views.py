@@ -1,3 +1,5 @@
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import redirect
 from django.urls import reverse_lazy
 from django.utils import timezone
@@ -9,15 +11,18 @@ from subscribers.forms import (
     ReplyHelpMessageForm, SubscribersChoiceForm
 )
 from subscribers.models import Subscriber, Reply
+from subscribers.pagination import KeysetPaginationMixin, parse_cursor
 from subscribers.services import (
     get_messages_subscribers_of_bot, get_all_help_messages,
     get_all_active_help_messages, get_all_started_help_messages,
     get_all_closed_help_messages, get_help_message_reply,
-    get_status_subscribers_of_bot,
+    get_status_subscribers_of_bot, get_subscriber_counters,
+    update_subscriber_counter,
 )
 
 
-class SubscribersListView(ModeratorRequiredMixin, generic.ListView):
+class SubscribersListView(ModeratorRequiredMixin, KeysetPaginationMixin,
+                          generic.ListView):
     """
     List of all subscribers of a particular channel.
     """
@@ -35,6 +40,7 @@ class SubscribersListView(ModeratorRequiredMixin, generic.ListView):
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(**kwargs)
         context["channel"] = get_bot_by_slug(self.kwargs["slug"])
+        context["counters"] = get_subscriber_counters(context["channel"])
         context['form'] = SubscribersChoiceForm(initial={'messenger': 'all',
                                                          'status': 'all'})
         return context
@@ -59,6 +65,17 @@ class SubscriberUpdateView(ModeratorRequiredMixin, generic.UpdateView):
     template_name = 'subscribers/subscriber_update.html'
     context_object_name = "subscriber"
 
+    def form_valid(self, form):
+        if 'is_active' not in form.changed_data:
+            return super().form_valid(form)
+        change = 1 if form.instance.is_active else -1
+        with transaction.atomic():
+            response = super().form_valid(form)
+            update_subscriber_counter(
+                form.instance.bot_id, active=change, inactive=-change
+            )
+        return response
+
     def get_success_url(self):
         return reverse_lazy(
             "bots-management:subscribers:subscriber-list",
@@ -75,17 +92,21 @@ class SubscriberUpdateView(ModeratorRequiredMixin, generic.UpdateView):
         return context
 
 
-class SubscriberMessagesListView(ModeratorRequiredMixin, generic.ListView):
+class SubscriberMessagesListView(ModeratorRequiredMixin,
+                                 KeysetPaginationMixin, generic.ListView):
     """
-    List of all message subscribers of a particular channel.
+    List of all message subscribers of a particular channel,
+    ?sender=<id> shows messages of one subscriber.
     """
 
     template_name = "subscribers/subscriber_messages_list.html"
     context_object_name = "messages"
-    paginate_by = 100
 
     def get_queryset(self):
-        return get_messages_subscribers_of_bot(self.kwargs["slug"])
+        return get_messages_subscribers_of_bot(
+            self.kwargs["slug"],
+            sender_id=parse_cursor(self.request.GET.get("sender")),
+        )
 
     def get_context_data(self, **kwargs) -> dict:
         context = super().get_context_data(**kwargs)
@@ -95,6 +116,67 @@ class SubscriberMessagesListView(ModeratorRequiredMixin, generic.ListView):
         return context
 
 
+class SubscribersJsonView(SubscribersListView):
+    """
+    Page of subscribers as JSON, the next page is taken
+    with ?after=<next>, the previous one with ?before=<previous>
+    """
+
+    def get_context_data(self, **kwargs):
+        return generic.ListView.get_context_data(self, **kwargs)
+
+    def render_to_response(self, context, **response_kwargs):
+        page = context["page_obj"]
+        return JsonResponse({
+            "results": [
+                {
+                    "id": subscriber.id,
+                    "name": subscriber.name,
+                    "chat_id": subscriber.chat_id,
+                    "info": subscriber.info,
+                    "avatar": subscriber.avatar,
+                    "is_active": subscriber.is_active,
+                    "created": subscriber.created,
+                    "updated": subscriber.updated,
+                } for subscriber in page
+            ],
+            "next": page.next_cursor,
+            "previous": page.previous_cursor,
+        })
+
+
+class SubscriberMessagesJsonView(SubscriberMessagesListView):
+    """
+    Page of messages as JSON, the next page is taken
+    with ?after=<next>, the previous one with ?before=<previous>
+    """
+
+    def get_context_data(self, **kwargs):
+        return generic.ListView.get_context_data(self, **kwargs)
+
+    def render_to_response(self, context, **response_kwargs):
+        page = context["page_obj"]
+        return JsonResponse({
+            "results": [
+                {
+                    "id": message.id,
+                    "message_token": message.message_token,
+                    "sender": {
+                        "id": message.sender_id,
+                        "name": message.sender.name,
+                    },
+                    "text": message.text,
+                    "created": message.created,
+                    "image": message.image.url if message.image else None,
+                    "file": message.file.url if message.file else None,
+                    "media_status": message.media_status,
+                } for message in page
+            ],
+            "next": page.next_cursor,
+            "previous": page.previous_cursor,
+        })
+
+
 class HelpMessagesListView(ModeratorRequiredMixin, generic.ListView):
     template_name = "subscribers/help_messages_list.html"
     context_object_name = "messages"
@@ -1,16 +1,20 @@
 import logging
-from typing import Union
+from functools import partial
+from typing import Callable, Union
 
 import requests
 
 from django.conf import settings
 
-from telebot import TeleBot
 from telebot.types import ReplyKeyboardMarkup, Message
-from telebot.apihelper import ApiException
+from telebot.apihelper import ApiException, CONNECT_TIMEOUT
 
 from moviepy.editor import VideoFileClip
 
+from .client import get_client, get_session, api_request
+from .retry import call_with_retry
+from .unreachable import report_failed_chat
+
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +23,7 @@ def get_webhook_info(token: str) -> dict:
     """
     Get information about tg webhook
     """
-    res = requests.get(settings.TELEGRAM_BASE_URL % (token, "getWebhookInfo"))
+    res = api_request(token, "getWebhookInfo")
     return res.json().get('result')
 
 
@@ -27,30 +31,55 @@ def get_bot_info(token: str) -> dict:
     """
         Get information about tg bot
     """
-    res = requests.get(settings.TELEGRAM_BASE_URL % (token, "getMe"))
+    res = api_request(token, "getMe")
     return res.json().get('result')
 
 
+def get_updates(token: str, offset: int = None, timeout: int = 0,
+                session: requests.Session = None) -> list:
+    """
+    Long-poll `getUpdates`, Telegram answers after `timeout` seconds
+    if there are no new updates.
+    Long-polling keeps the connection busy, so pollers may pass
+    their own session not to take connections of the senders.
+    """
+    response = (session or get_session()).get(
+        settings.TELEGRAM_BASE_URL % (token, "getUpdates"),
+        params={"offset": offset, "timeout": timeout},
+        timeout=(CONNECT_TIMEOUT, timeout + settings.TELEGRAM_READ_TIMEOUT),
+    )
+    data = response.json()
+    if not data.get("ok"):
+        raise ApiException(
+            f"getUpdates failed: {data.get('description')}",
+            "getUpdates", response
+        )
+    return data["result"]
+
+
 def send_message(chat_id: int, text: str, token: str,
-                 reply_markup: ReplyKeyboardMarkup = None,
+                 reply_markup: Union[ReplyKeyboardMarkup, str] = None,
                  **kwargs) -> Message:
     """Sends `sendMessage` API request to the telegramAPI.
 
     chat_id: Id of the chat.
     text: Text of the message.
-    reply_markup: Instance of the `InlineKeyboardMarkup`.
+    reply_markup: Instance of the `InlineKeyboardMarkup`
+        or its prebuilt JSON (see telegram_api.markup).
     token: bot's token
 
     Returns: None.
     """
     try:
-        response: Message = TeleBot(token).send_message(
+        response: Message = call_with_retry(partial(
+            get_client(token).send_message,
             chat_id=chat_id,
             text=text,
             reply_markup=reply_markup
-        )
+        ), token, chat_id)
         return response
     except ApiException as e:
+        report_failed_chat(token, chat_id, e)
         logger.warning(
             f"""Send message to {chat_id} failed.
             token: {token}.
@@ -83,19 +112,21 @@ def send_photo(chat_id: int, token: str,
 
     try:
         if file_id:
-            response: Message = TeleBot(token).send_photo(
-               chat_id=chat_id, photo=file_id
-            )
+            response: Message = call_with_retry(partial(
+                get_client(token).send_photo,
+                chat_id=chat_id, photo=file_id
+            ), token, chat_id)
         else:
-            with open(file_path, 'rb') as file:
-                response: Message = TeleBot(token).send_photo(
-                    chat_id=chat_id, photo=file
-                )
-                file_id = response.json.get('photo')[-1].get('file_id')
-                update_or_create_file_id(action, file_path, file_id, token)
+            response: Message = call_with_retry(partial(
+                upload_file, get_client(token).send_photo,
+                file_path, chat_id=chat_id, file_arg='photo'
+            ), token, chat_id)
+            file_id = response.json.get('photo')[-1].get('file_id')
+            update_or_create_file_id(action, file_path, file_id, token)
         return response
 
     except ApiException as e:
+        report_failed_chat(token, chat_id, e)
         logger.warning(
             f"""Send photo to {chat_id} failed.
             token: {token}.
@@ -109,6 +140,16 @@ def send_photo(chat_id: int, token: str,
         )
 
 
+def upload_file(send: Callable, file_path: str,
+                file_arg: str = 'data', **kwargs) -> Message:
+    """
+    Open the file and send it with `send`.
+    File is opened on every call, so the upload can be retried.
+    """
+    with open(file_path, 'rb') as file:
+        return send(**{file_arg: file}, **kwargs)
+
+
 def check_file_id(action: object,
                   file_path: str,
                   token: str) -> Union[str, None]:
@@ -155,20 +196,22 @@ def send_video(chat_id: int, token: str,
         raise ValueError('file_id or file_path  must be provided')
     try:
         if file_id:
-            response: Message = TeleBot(token).send_video(
+            response: Message = call_with_retry(partial(
+                get_client(token).send_video,
                 chat_id=chat_id, data=file_id
-            )
+            ), token, chat_id)
         else:
-            with open(file_path, 'rb') as file:
-                clip = VideoFileClip(file_path)
-                response: Message = TeleBot(token).send_video(
-                    chat_id=chat_id, data=file, duration=clip.duration
-                )
-                file_id = response.json.get('video').get('file_id')
-                update_or_create_file_id(action, file_path, file_id)
+            clip = VideoFileClip(file_path)
+            response: Message = call_with_retry(partial(
+                upload_file, get_client(token).send_video,
+                file_path, chat_id=chat_id, duration=clip.duration
+            ), token, chat_id)
+            file_id = response.json.get('video').get('file_id')
+            update_or_create_file_id(action, file_path, file_id)
         return response
 
     except ApiException as e:
+        report_failed_chat(token, chat_id, e)
         logger.warning(
             f"""Send video to {chat_id} failed.
             token: {token}.
@@ -200,19 +243,21 @@ def send_document(chat_id: int, token: str,
         raise ValueError('file_id or file_path  must be provided')
     try:
         if file_id:
-            response: Message = TeleBot(token).send_document(
+            response: Message = call_with_retry(partial(
+                get_client(token).send_document,
                 chat_id=chat_id, data=file_id
-            )
+            ), token, chat_id)
         else:
-            with open(file_path, 'rb') as file:
-                response: Message = TeleBot(token).send_document(
-                    chat_id=chat_id, data=file
-                )
-                file_id = response.json.get('document').get('file_id')
-                update_or_create_file_id(action, file_path, file_id)
+            response: Message = call_with_retry(partial(
+                upload_file, get_client(token).send_document,
+                file_path, chat_id=chat_id
+            ), token, chat_id)
+            file_id = response.json.get('document').get('file_id')
+            update_or_create_file_id(action, file_path, file_id)
         return response
 
     except ApiException as e:
+        report_failed_chat(token, chat_id, e)
         print(f"LOGGING: {e}")
     except Exception as e:
         print(f"LOGGING: {e}")
@@ -230,13 +275,15 @@ def send_location(chat_id: int, token: str,
     Returns: None.
     """
     try:
-        response: Message = TeleBot(token).send_location(
+        response: Message = call_with_retry(partial(
+            get_client(token).send_location,
             chat_id=chat_id,
             longitude=lon,
             latitude=lat
-        )
+        ), token, chat_id)
         return response
     except ApiException as e:
+        report_failed_chat(token, chat_id, e)
         print(f"LOGGING: {e}")
     except Exception as e:
         print(f"LOGGING: {e}")
@@ -260,16 +307,18 @@ def send_sticker(chat_id: int, token: str,
 
     try:
         if sticker_path:
-            with open(sticker_path, 'rb') as file:
-                TeleBot(token).send_sticker(
-                    chat_id=chat_id, data=file
-                )
+            call_with_retry(partial(
+                upload_file, get_client(token).send_sticker,
+                sticker_path, chat_id=chat_id
+            ), token, chat_id)
         else:
-            TeleBot(token).send_sticker(
+            call_with_retry(partial(
+                get_client(token).send_sticker,
                 chat_id=chat_id, data=sticker_id
-            )
+            ), token, chat_id)
 
     except ApiException as e:
+        report_failed_chat(token, chat_id, e)
         print(f"LOGGING: {e}")
     except Exception as e:
         print(f"LOGGING: {e}")
@@ -284,7 +333,10 @@ def delete_message(chat_id: Union[str, int], message_id: int,
     :param token: Bot`s token
     """
     try:
-        TeleBot(token).delete_message(chat_id=chat_id, message_id=message_id)
+        call_with_retry(partial(
+            get_client(token).delete_message,
+            chat_id=chat_id, message_id=message_id
+        ), token)
     except ApiException as e:
         logger.warning(
             f"""Delete message {message_id} in {chat_id} failed.
@@ -304,10 +356,9 @@ def set_webhook(slug: str, host: str, token: str) -> dict:
     Sets telegram webhook for certain channel.
     """
     webhook = f"https://{host}/telegram_prod/{slug}/"
-    url = f"https://api.telegram.org/bot{token}/setWebhook?url={webhook}"
-    response = requests.get(url)
+    response = api_request(token, "setWebhook", url=webhook)
     logger.warning(
-        f"""Set telegram-webhook with ajax {url}.
+        f"""Set telegram-webhook with ajax {webhook}.
             token {token}. Answer: {response.text}"""
     )
     return response.json()
@@ -317,11 +368,9 @@ def unset_webhook_ajax(token: str) -> dict:
     """
     Sets telegram webhook for certain channel.
     """
-    webhook = ""
-    url = f"https://api.telegram.org/bot{token}/setWebhook?url={webhook}"
-    response = requests.get(url)
+    response = api_request(token, "setWebhook", url="")
     logger.warning(
-        f"""Set telegram-webhook with ajax {url}.
+        f"""Unset telegram-webhook with ajax.
             token {token}. Answer: {response.text}"""
     )
     return response.json()
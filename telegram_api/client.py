@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+from time import monotonic
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from django.conf import settings
+
+from telebot import TeleBot, apihelper
+
+
+_session_lock = threading.Lock()
+_session = None
+
+
+def get_session() -> requests.Session:
+    """
+    Return process-wide keep-alive session for all Telegram API calls.
+    TeleBot's apihelper is pointed to the same session, so raw requests
+    and TeleBot calls share one bounded connection pool.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=settings.TELEGRAM_POOL_CONNECTIONS,
+                    pool_maxsize=settings.TELEGRAM_POOL_MAXSIZE,
+                    pool_block=True,
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                apihelper.session = session
+                _session = session
+    return _session
+
+
+class ClientRegistry:
+    """
+    Per-token cache of TeleBot clients.
+    Keeps at most `max_size` clients and drops the ones that were not
+    used for `idle_timeout` seconds.
+    """
+
+    def __init__(self, max_size: int, idle_timeout: float):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._clients = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> TeleBot:
+        now = monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.pop(token, None)
+            client = entry[0] if entry else self._create(token)
+            self._clients[token] = (client, now)
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+            return client
+
+    def remove(self, token: str) -> None:
+        with self._lock:
+            self._clients.pop(token, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def _evict_idle(self, now: float) -> None:
+        # entries are kept in LRU order, so the oldest are always first
+        while self._clients:
+            token, (_, last_used) = next(iter(self._clients.items()))
+            if now - last_used < self.idle_timeout:
+                break
+            del self._clients[token]
+
+    @staticmethod
+    def _create(token: str) -> TeleBot:
+        get_session()
+        # threaded=False: we never poll with these clients, so there is
+        # no need to spawn a worker pool for every token
+        return TeleBot(token, threaded=False)
+
+
+_registry = None
+
+
+def get_registry() -> ClientRegistry:
+    global _registry
+    if _registry is None:
+        with _session_lock:
+            if _registry is None:
+                _registry = ClientRegistry(
+                    max_size=settings.TELEGRAM_CLIENT_CACHE_SIZE,
+                    idle_timeout=settings.TELEGRAM_CLIENT_IDLE_TIMEOUT,
+                )
+    return _registry
+
+
+def get_client(token: str) -> TeleBot:
+    """
+    Return shared TeleBot client for the token
+    """
+    return get_registry().get(token)
+
+
+def api_request(token: str, method_name: str,
+                http_method: str = "get", **params) -> requests.Response:
+    """
+    Send raw request to the Telegram Bot API using pooled session
+    """
+    return get_session().request(
+        http_method,
+        settings.TELEGRAM_BASE_URL % (token, method_name),
+        params=params or None,
+        timeout=(apihelper.CONNECT_TIMEOUT, settings.TELEGRAM_READ_TIMEOUT),
+    )
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Union
+
+import requests
+
+from django.conf import settings
+
+from telebot.apihelper import ApiException
+
+from .ratelimit import get_rate_limiter
+from .retry import handle_failure, parse_retry_after
+
+
+logger = logging.getLogger(__name__)
+
+
+def iter_chunks(iterable: Iterable, size: int) -> Iterator[list]:
+    """
+    Split iterable into lists of `size` items
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class DeliveryResult(NamedTuple):
+    """
+    Result of sending one message to one chat
+    """
+    chat_id: Union[int, str]
+    message_id: Union[int, None] = None
+    error: Union[Exception, None] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class SendingEngine:
+    """
+    Sends one request to many chats of a bot keeping up to `concurrency`
+    requests in flight.
+    Requests are plain functions of the pooled TeleBot client, they run
+    in a thread pool while the asyncio loop waits for rate limits and
+    retry delays without blocking any thread.
+    """
+
+    batch_size = 1000
+
+    def __init__(self, token: str, concurrency: int = None):
+        self.token = token
+        self.concurrency = concurrency or settings.TELEGRAM_MAILING_CONCURRENCY
+        self.limiter = get_rate_limiter()
+
+    def send(self, chat_ids: Iterable, request: Callable,
+             get_chat_id: Callable = None) -> List[DeliveryResult]:
+        """
+        Call `request(chat_id)` for every chat and return results
+        in the order requests were finished.
+        `request` must return telebot Message or raise an error.
+        Items can be any objects, e.g. (chat_id, message_id) pairs,
+        then `get_chat_id(item)` must return chat id of the item.
+        """
+        return list(self.iter_send(chat_ids, request, get_chat_id))
+
+    def iter_send(self, chat_ids: Iterable, request: Callable,
+                  get_chat_id: Callable = None) -> Iterator[DeliveryResult]:
+        """
+        Same as send(), but results are yielded as soon as requests
+        are finished, so the caller can save them on the go.
+        The loop is not running while the caller handles a result,
+        so it may use the db.
+        """
+        loop = asyncio.new_event_loop()
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                # chat ids are read outside of the loop, because querysets
+                # can not be evaluated from async context
+                for batch in iter_chunks(chat_ids, self.batch_size):
+                    yield from self._iter_batch(
+                        loop, batch, request, executor, get_chat_id
+                    )
+        finally:
+            loop.close()
+
+    def _iter_batch(self, loop, batch, request, executor,
+                    get_chat_id) -> Iterator[DeliveryResult]:
+        finished = deque()
+        # future, that is resolved by the next finished request
+        waiter = [None]
+
+        def on_result(result: DeliveryResult) -> None:
+            finished.append(result)
+            if waiter[0] is not None and not waiter[0].done():
+                waiter[0].set_result(None)
+
+        task = loop.create_task(
+            self.send_async(batch, request, executor, get_chat_id, on_result)
+        )
+        try:
+            while True:
+                while finished:
+                    yield finished.popleft()
+                if task.done():
+                    break
+                waiter[0] = loop.create_future()
+                loop.run_until_complete(asyncio.wait(
+                    [task, waiter[0]], return_when=asyncio.FIRST_COMPLETED
+                ))
+            task.result()
+        finally:
+            if not task.done():
+                # the caller stopped reading results
+                task.cancel()
+                loop.run_until_complete(
+                    asyncio.gather(task, return_exceptions=True)
+                )
+
+    async def send_async(self, chat_ids: Iterable, request: Callable,
+                         executor: ThreadPoolExecutor,
+                         get_chat_id: Callable = None,
+                         on_result: Callable = None) -> List[DeliveryResult]:
+        results = []
+        items = iter(chat_ids)
+        get_chat_id = get_chat_id or (lambda item: item)
+        on_result = on_result or results.append
+        # fixed number of workers pulling from the same iterator
+        # keeps memory flat for any number of recipients
+        workers = [
+            self._worker(items, request, executor, get_chat_id, on_result)
+            for _ in range(self.concurrency)
+        ]
+        await asyncio.gather(*workers)
+        return results
+
+    async def _worker(self, items, request, executor,
+                      get_chat_id, on_result) -> None:
+        for item in items:
+            on_result(await self._send_one(
+                item, get_chat_id(item), request, executor
+            ))
+
+    async def _send_one(self, item, chat_id, request,
+                        executor) -> DeliveryResult:
+        loop = asyncio.get_event_loop()
+        attempt = 0
+        while True:
+            wait = self.limiter.reserve(self.token, chat_id)
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self.limiter.reserve(self.token, chat_id)
+
+            try:
+                message = await loop.run_in_executor(
+                    executor, partial(request, item)
+                )
+            except (ApiException, requests.RequestException) as e:
+                attempt += 1
+                delay = handle_failure(self.token, e, attempt)
+                if delay is None:
+                    logger.warning(
+                        f"""Send to {chat_id} failed.
+                        Error: {e}"""
+                    )
+                    return DeliveryResult(chat_id=chat_id, error=e)
+                if parse_retry_after(e) is None:
+                    await asyncio.sleep(delay)
+            except Exception as e:
+                logger.critical(
+                    f"""Send to {chat_id} failed.
+                    Error: {e}"""
+                )
+                return DeliveryResult(chat_id=chat_id, error=e)
+            else:
+                return DeliveryResult(
+                    chat_id=chat_id,
+                    message_id=getattr(message, "message_id", None),
+                )
@@ -5,16 +5,13 @@
 # from django.db.models import QuerySet
 #
 # from keyboards.models import Action, Keyboard
-# from keyboards.services import (
-#     get_button_and_joined_action, get_home_action,
-#     get_emergency_action, get_action_by_name
-# )
 # from bots_management.services import get_channel_by_slug
 # from .api import (
 #     send_message, send_photo,
 #     send_video, send_document,
 #     send_location, send_sticker
 # )
+# from .routing import get_routing_table
 # from .utils import create_markup, save_message
 # from subscribers.services import get_subscriber_telegram
 #
@@ -51,17 +48,10 @@ def action_handler(in_data: dict, channel_slug: str) -> None:
     pass
 
 #     user_text: str = in_data["message"]["text"]
-#     tag: QuerySet = get_button_and_joined_action(user_text,
-#                                                  channel_slug=channel_slug)
-#     actions = get_action_by_name(user_text, channel_slug=channel_slug)
-#     if tag.exists():
-#         action: Action = tag.first().action
-#     elif actions.exists():
-#         action = actions.first()
-#     else:
-#         # TODO maybe we can think of something
-#         #  more interesting on on not expected actions
-#         action: Action = get_home_action(slug=channel_slug)
+#     # button text, then action name, then the home action
+#     # TODO maybe we can think of something
+#     #  more interesting on on not expected actions
+#     action: Action = get_routing_table(channel_slug).resolve(user_text)
 #
 #     keyboard: Keyboard = action.keyboard_to_represent
 #     action_type: str = action.action_type
@@ -127,12 +117,11 @@ def help_message_handler(in_data: dict, channel_slug: str) -> None:
 #     """
 #     # TODO create help message and send notification to moderator
 #
-#     action: Union[Action, None] = get_emergency_action(
-#         channel_slug=channel_slug
-#     )
+#     routing_table = get_routing_table(channel_slug)
+#     action: Union[Action, None] = routing_table.emergency_action
 #
 #     if not action:
-#         action: Action = get_home_action(slug=channel_slug)
+#         action: Action = routing_table.home_action
 #
 #     keyboard: Keyboard = action.keyboard_to_represent
 #
@@ -154,7 +143,7 @@ def sys_action_handler(in_data: dict, channel_slug: str) -> None:
 #                      is_help_message=True)
 #     # TODO if other system commands add elif
 #     else:
-#         action: Action = get_home_action(slug=channel_slug)
+#         action: Action = get_routing_table(channel_slug).home_action
 #         keyboard: Keyboard = action.keyboard_to_represent
 #         send_message(
 #             chat_id=in_data["message"]["chat"]["id"],
@@ -0,0 +1,125 @@
+import json
+import threading
+from itertools import groupby
+from time import monotonic
+from typing import Union
+
+from django.apps import apps
+from django.conf import settings
+
+
+def build_reply_markup(keyboard_id: int) -> str:
+    """
+    Return reply_markup JSON of the keyboard, buttons are
+    loaded with one query
+    """
+    Button = apps.get_model("keyboards", "Button")
+    buttons = Button.objects.filter(keyboard_id=keyboard_id).order_by(
+        "tg_row", "position"
+    ).values_list("tg_row", "text")
+    rows = [
+        [{"text": text} for _, text in row]
+        for _, row in groupby(buttons, key=lambda button: button[0])
+    ]
+    return json.dumps({"keyboard": rows})
+
+
+class MarkupCache:
+    """
+    Prebuilt reply markups of keyboards.
+    Markups are kept in the process for `timeout` seconds and,
+    if `connection` is given, in Redis until the keyboard is changed
+    (or `shared_timeout` passed), so other processes don't have
+    to build them again.
+    """
+
+    def __init__(self, timeout: float, connection=None,
+                 shared_timeout: int = 24 * 60 * 60,
+                 prefix: str = "tg-markup",
+                 build=build_reply_markup):
+        self.timeout = timeout
+        self.connection = connection
+        self.shared_timeout = shared_timeout
+        self.prefix = prefix
+        self.build = build
+        self._markups = {}
+        self._lock = threading.Lock()
+
+    def _key(self, keyboard_id: int) -> str:
+        return f"{self.prefix}:{keyboard_id}"
+
+    def get(self, keyboard_id: int) -> str:
+        now = monotonic()
+        with self._lock:
+            markup, expires_at = self._markups.get(keyboard_id, (None, 0))
+        if expires_at > now:
+            return markup
+
+        markup = self._get_shared(keyboard_id)
+        if markup is None:
+            markup = self.build(keyboard_id)
+            if self.connection is not None:
+                self.connection.set(
+                    self._key(keyboard_id), markup, ex=self.shared_timeout
+                )
+        with self._lock:
+            self._markups[keyboard_id] = (markup, now + self.timeout)
+        return markup
+
+    def _get_shared(self, keyboard_id: int) -> Union[str, None]:
+        if self.connection is None:
+            return None
+        markup = self.connection.get(self._key(keyboard_id))
+        return markup.decode() if markup is not None else None
+
+    def invalidate(self, keyboard_id: int) -> None:
+        with self._lock:
+            self._markups.pop(keyboard_id, None)
+        if self.connection is not None:
+            self.connection.delete(self._key(keyboard_id))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._markups.clear()
+
+
+_cache = None
+_lock = threading.Lock()
+
+
+def get_markup_cache() -> MarkupCache:
+    """
+    Return markups cache, it uses Redis with the "redis"
+    rate limit backend
+    """
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                connection = None
+                if settings.TELEGRAM_RATE_LIMIT_BACKEND == "redis":
+                    from bots_settings.redis_connection import (
+                        get_redis_connection
+                    )
+                    connection = get_redis_connection()
+                _cache = MarkupCache(
+                    timeout=settings.REPLY_MARKUP_TIMEOUT,
+                    connection=connection,
+                )
+    return _cache
+
+
+def get_reply_markup(keyboard_id: int) -> str:
+    """
+    Return reply_markup JSON of the keyboard, senders pass it
+    to Telegram as is
+    """
+    return get_markup_cache().get(keyboard_id)
+
+
+def invalidate_reply_markup(sender, instance, **kwargs) -> None:
+    """
+    Signal receiver for changes of keyboards and their buttons
+    """
+    keyboard_id = getattr(instance, "keyboard_id", instance.pk)
+    get_markup_cache().invalidate(keyboard_id)
@@ -0,0 +1,119 @@
+import shutil
+import tempfile
+import threading
+from os.path import basename
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models.fields.files import FieldFile
+
+from telebot.apihelper import CONNECT_TIMEOUT
+
+from .client import get_client, get_session
+
+
+# downloads up to this size are buffered in memory, larger ones on disk
+SPOOL_MAX_SIZE = 1024 * 1024
+
+# message fields with media, photo is saved to Message.image,
+# all others to Message.file
+MEDIA_TYPES = ('photo', 'document', 'audio', 'video', 'voice', 'sticker')
+
+
+class MediaTooLarge(Exception):
+    pass
+
+
+def get_message_media(message: dict) -> tuple:
+    """
+    Return (type, file_id, file_size) of the media of the message
+    or (None, None, None) if there is no media
+    """
+    for media_type in MEDIA_TYPES:
+        media = message.get(media_type)
+        if not media:
+            continue
+        if media_type == 'photo':
+            # get only original size, it always last
+            media = media[-1]
+        return media_type, media.get('file_id'), media.get('file_size')
+    return None, None, None
+
+
+class LimitedStream:
+    """
+    File-like wrapper of the response body.
+    Raises MediaTooLarge as soon as more than `max_size` bytes are read,
+    file_size of the update is not always given.
+    """
+
+    def __init__(self, raw, max_size: int):
+        self.raw = raw
+        self.max_size = max_size
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise MediaTooLarge(
+                f"File is larger than {self.max_size} bytes"
+            )
+        return data
+
+
+_semaphore = None
+_lock = threading.Lock()
+
+
+def get_download_semaphore() -> threading.BoundedSemaphore:
+    """
+    Return semaphore, that limits downloads running in this process
+    """
+    global _semaphore
+    if _semaphore is None:
+        with _lock:
+            if _semaphore is None:
+                _semaphore = threading.BoundedSemaphore(
+                    settings.TELEGRAM_MEDIA_CONCURRENCY
+                )
+    return _semaphore
+
+
+def download_to_field(token: str, file_id: str, field: FieldFile,
+                      max_size: int = None) -> None:
+    """
+    Stream the Telegram file to the storage of the field by chunks.
+    The download is completed in a spooled temp file first, so a too
+    large or broken one never leaves a partial file in the storage.
+    The model instance is not saved.
+    """
+    max_size = max_size or settings.TELEGRAM_MEDIA_MAX_SIZE
+    with get_download_semaphore():
+        file_info = get_client(token).get_file(file_id)
+        if file_info.file_size and file_info.file_size > max_size:
+            raise MediaTooLarge(
+                f"File is larger than {max_size} bytes"
+            )
+        url = "https://api.telegram.org/file/bot%s/%s" % (
+            token, file_info.file_path
+        )
+        with get_session().get(
+                url, stream=True,
+                timeout=(CONNECT_TIMEOUT, settings.TELEGRAM_READ_TIMEOUT)
+        ) as response:
+            response.raise_for_status()
+            length = response.headers.get('Content-Length')
+            if length and int(length) > max_size:
+                raise MediaTooLarge(
+                    f"File is larger than {max_size} bytes"
+                )
+            response.raw.decode_content = True
+            with tempfile.SpooledTemporaryFile(SPOOL_MAX_SIZE) as buffer:
+                shutil.copyfileobj(
+                    LimitedStream(response.raw, max_size), buffer
+                )
+                buffer.seek(0)
+                field.save(
+                    basename(file_info.file_path), File(buffer), save=False
+                )
@@ -0,0 +1,234 @@
+import threading
+from time import sleep, time
+from typing import Iterable, Tuple, Union
+
+from django.conf import settings
+
+
+# (key, rate in tokens per second, capacity)
+Bucket = Tuple[str, float, float]
+
+
+class MemoryBucketStorage:
+    """
+    In-process token buckets.
+    Good enough for a single worker, several workers will each get
+    their own budget.
+    """
+    # drop buckets, that are full again, when there are too many of them
+    PRUNE_THRESHOLD = 10000
+
+    def __init__(self):
+        self._buckets = {}
+        self._paused = {}
+        self._lock = threading.Lock()
+
+    def consume(self, buckets: Iterable[Bucket], now: float) -> float:
+        """
+        Take one token from every bucket if all of them have it.
+        Returns 0 on success or seconds to wait before the next try.
+        """
+        buckets = list(buckets)
+        with self._lock:
+            states = []
+            wait = 0.0
+            for key, rate, capacity in buckets:
+                tokens, updated = self._buckets.get(key, (capacity, now))
+                tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+                states.append(tokens)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+                wait = max(wait, self._paused.get(key, now) - now)
+            if wait > 0:
+                return wait
+
+            for (key, _, _), tokens in zip(buckets, states):
+                self._buckets[key] = (tokens - 1, now)
+            if len(self._buckets) > self.PRUNE_THRESHOLD:
+                self._prune(now)
+            return 0.0
+
+    def pause(self, key: str, until: float) -> None:
+        with self._lock:
+            self._paused[key] = max(until, self._paused.get(key, until))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buckets.clear()
+            self._paused.clear()
+
+    def _prune(self, now: float) -> None:
+        # buckets are created on demand with full capacity, so the ones
+        # that are refilled already carry no information
+        self._buckets = {
+            key: (tokens, updated)
+            for key, (tokens, updated) in self._buckets.items()
+            if now - updated < 60
+        }
+        self._paused = {
+            key: until for key, until in self._paused.items() if until > now
+        }
+
+
+class RedisBucketStorage:
+    """
+    Token buckets kept in Redis, so all Celery workers share one budget.
+    Buckets are checked and consumed atomically by a Lua script.
+    """
+    SCRIPT = """
+    local now = tonumber(ARGV[1])
+    local wait = 0
+    local states = {}
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[i * 2])
+        local capacity = tonumber(ARGV[i * 2 + 1])
+        local state = redis.call('HMGET', key, 'tokens', 'ts', 'paused')
+        local tokens = tonumber(state[1]) or capacity
+        local ts = tonumber(state[2]) or now
+        local paused = tonumber(state[3]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+        states[i] = tokens
+        if tokens < 1 then
+            wait = math.max(wait, (1 - tokens) / rate)
+        end
+        wait = math.max(wait, paused - now)
+    end
+    if wait > 0 then
+        return tostring(wait)
+    end
+    for i, key in ipairs(KEYS) do
+        local rate = tonumber(ARGV[i * 2])
+        local capacity = tonumber(ARGV[i * 2 + 1])
+        redis.call('HSET', key, 'tokens', states[i] - 1, 'ts', now)
+        if redis.call('TTL', key) < capacity / rate then
+            redis.call('EXPIRE', key, math.ceil(capacity / rate) + 1)
+        end
+    end
+    return '0'
+    """
+    PAUSE_SCRIPT = """
+    local paused = tonumber(redis.call('HGET', KEYS[1], 'paused')) or 0
+    local pause_until = tonumber(ARGV[1])
+    if pause_until > paused then
+        redis.call('HSET', KEYS[1], 'paused', pause_until)
+        redis.call(
+            'EXPIRE', KEYS[1], math.ceil(pause_until - tonumber(ARGV[2])) + 1
+        )
+    end
+    """
+
+    def __init__(self, connection, prefix: str = "tg-rate"):
+        self.connection = connection
+        self.prefix = prefix
+        self._script = connection.register_script(self.SCRIPT)
+        self._pause_script = connection.register_script(self.PAUSE_SCRIPT)
+
+    def consume(self, buckets: Iterable[Bucket], now: float) -> float:
+        keys, args = [], [now]
+        for key, rate, capacity in buckets:
+            keys.append(f"{self.prefix}:{key}")
+            args.extend((rate, capacity))
+        return float(self._script(keys=keys, args=args))
+
+    def pause(self, key: str, until: float) -> None:
+        self._pause_script(
+            keys=[f"{self.prefix}:{key}"], args=[until, time()]
+        )
+
+
+class RateLimiter:
+    """
+    Keeps outgoing requests of every bot within Telegram limits:
+    a global bucket per bot token and a bucket per chat
+    (private chats and groups have different limits).
+    """
+
+    def __init__(self, storage, per_bot: float,
+                 per_chat: float, per_group: float):
+        self.storage = storage
+        self.per_bot = per_bot
+        self.per_chat = per_chat
+        self.per_group = per_group
+
+    @staticmethod
+    def bot_key(token: str) -> str:
+        # only the public part of the token, so secrets never get to redis
+        return f"bot:{token.split(':', 1)[0]}"
+
+    def buckets(self, token: str,
+                chat_id: Union[int, str] = None) -> list:
+        bot_id = token.split(":", 1)[0]
+        buckets = [(self.bot_key(token), self.per_bot, self.per_bot)]
+        if chat_id is not None:
+            if is_group_chat(chat_id):
+                rate = self.per_group
+            else:
+                rate = self.per_chat
+            buckets.append((f"chat:{bot_id}:{chat_id}", rate, 1))
+        return buckets
+
+    def reserve(self, token: str, chat_id: Union[int, str] = None) -> float:
+        """
+        Try to take a slot without blocking.
+        Returns 0 if the request may be sent now, otherwise
+        seconds to wait before the next try.
+        """
+        return self.storage.consume(self.buckets(token, chat_id), time())
+
+    def pause(self, token: str, seconds: float) -> None:
+        """
+        Stop all requests of the bot for some seconds,
+        e.g. after Telegram answered with 429
+        """
+        self.storage.pause(self.bot_key(token), time() + seconds)
+
+    def acquire(self, token: str, chat_id: Union[int, str] = None) -> None:
+        """
+        Block until the request may be sent
+        """
+        wait = self.reserve(token, chat_id)
+        while wait > 0:
+            sleep(wait)
+            wait = self.reserve(token, chat_id)
+
+
+def is_group_chat(chat_id: Union[int, str]) -> bool:
+    """
+    Groups and channels have negative ids or are addressed by @username
+    """
+    try:
+        return int(chat_id) < 0
+    except (TypeError, ValueError):
+        return True
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def create_storage(backend: str):
+    if backend == "redis":
+        from bots_settings.redis_connection import get_redis_connection
+        return RedisBucketStorage(get_redis_connection())
+    if backend == "memory":
+        return MemoryBucketStorage()
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Return process-wide rate limiter configured from settings
+    """
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = RateLimiter(
+                    storage=create_storage(
+                        settings.TELEGRAM_RATE_LIMIT_BACKEND
+                    ),
+                    per_bot=settings.TELEGRAM_RATE_LIMIT_PER_BOT,
+                    per_chat=settings.TELEGRAM_RATE_LIMIT_PER_CHAT,
+                    per_group=settings.TELEGRAM_RATE_LIMIT_PER_GROUP / 60,
+                )
+    return _limiter
@@ -0,0 +1,243 @@
+import logging
+import random
+import re
+import threading
+from collections import defaultdict
+from time import sleep
+from typing import Callable, Union
+
+import requests
+
+from django.conf import settings
+
+from telebot.apihelper import ApiException
+
+from .ratelimit import RateLimiter, get_rate_limiter
+
+
+logger = logging.getLogger(__name__)
+
+RETRY_AFTER_RE = re.compile(r"retry after (\d+)", re.IGNORECASE)
+
+
+def get_error_code(error: Exception) -> Union[int, None]:
+    """
+    Return HTTP/Telegram error code of the failed request
+    """
+    result = getattr(error, "result", None)
+    if result is None:
+        return None
+    try:
+        return int(result.json().get("error_code"))
+    except (ValueError, TypeError, AttributeError):
+        return getattr(result, "status_code", None)
+
+
+# descriptions of 400 errors of chats, that will never get messages
+UNREACHABLE_CHAT_ERRORS = ("chat not found", "user not found")
+
+
+def is_chat_unreachable(error: Exception) -> bool:
+    """
+    Return True if the bot was blocked by the user, the user was
+    deactivated or the chat doesn't exist, repeating such requests
+    is pointless
+    """
+    code = get_error_code(error)
+    if code == 403:
+        return True
+    if code == 400:
+        description = str(error).lower()
+        return any(text in description for text in UNREACHABLE_CHAT_ERRORS)
+    return False
+
+
+def parse_retry_after(error: Exception) -> Union[int, None]:
+    """
+    Return seconds from `retry_after` of the 429 answer
+    """
+    if get_error_code(error) != 429:
+        return None
+    result = getattr(error, "result", None)
+    try:
+        return int(result.json()["parameters"]["retry_after"])
+    except (ValueError, TypeError, KeyError, AttributeError):
+        match = RETRY_AFTER_RE.search(str(error))
+        return int(match.group(1)) if match else 1
+
+
+class RetryPolicy:
+    """
+    Decides if and when a failed Telegram request has to be repeated.
+    429 is repeated after `retry_after`, 5xx and network errors
+    with jittered exponential backoff, everything else is dropped.
+    """
+
+    def __init__(self, max_attempts: int,
+                 backoff_base: float, backoff_max: float):
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def backoff(self, attempt: int) -> float:
+        # "full jitter", so workers that failed together
+        # do not come back at the same moment
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        )
+
+    def get_delay(self, error: Exception,
+                  attempt: int) -> Union[float, None]:
+        """
+        Returns seconds to wait before the next attempt
+        or None if the request must not be repeated.
+        attempt: number of the failed attempt, starting from 1.
+        """
+        if attempt >= self.max_attempts:
+            return None
+        if isinstance(error, ApiException):
+            retry_after = parse_retry_after(error)
+            if retry_after is not None:
+                return retry_after
+            code = get_error_code(error)
+            if code is not None and code >= 500:
+                return self.backoff(attempt)
+            return None
+        if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+            return self.backoff(attempt)
+        return None
+
+
+class DeliveryStats:
+    """
+    Counters of retried and dropped requests per bot
+    """
+
+    def __init__(self):
+        self._counters = defaultdict(lambda: defaultdict(int))
+        self._lock = threading.Lock()
+
+    def incr(self, token: str, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[RateLimiter.bot_key(token)][counter] += amount
+
+    def get(self, token: str) -> dict:
+        with self._lock:
+            return dict(self._counters.get(RateLimiter.bot_key(token), {}))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counters.clear()
+
+
+class RedisDeliveryStats(DeliveryStats):
+    """
+    Counters of retried and dropped requests per bot shared by all workers
+    """
+
+    def __init__(self, connection, prefix: str = "tg-stats"):
+        self.connection = connection
+        self.prefix = prefix
+
+    def _key(self, token: str) -> str:
+        return f"{self.prefix}:{RateLimiter.bot_key(token)}"
+
+    def incr(self, token: str, counter: str, amount: int = 1) -> None:
+        self.connection.hincrby(self._key(token), counter, amount)
+
+    def get(self, token: str) -> dict:
+        return {
+            key.decode(): int(value) for key, value in
+            self.connection.hgetall(self._key(token)).items()
+        }
+
+    def clear(self) -> None:
+        for key in self.connection.scan_iter(f"{self.prefix}:*"):
+            self.connection.delete(key)
+
+
+_policy = None
+_stats = None
+_lock = threading.Lock()
+
+
+def get_retry_policy() -> RetryPolicy:
+    global _policy
+    if _policy is None:
+        _policy = RetryPolicy(
+            max_attempts=settings.TELEGRAM_RETRY_MAX_ATTEMPTS,
+            backoff_base=settings.TELEGRAM_RETRY_BACKOFF_BASE,
+            backoff_max=settings.TELEGRAM_RETRY_BACKOFF_MAX,
+        )
+    return _policy
+
+
+def get_delivery_stats() -> DeliveryStats:
+    """
+    Return counters storage, it uses the rate limit backend
+    """
+    global _stats
+    if _stats is None:
+        with _lock:
+            if _stats is None:
+                if settings.TELEGRAM_RATE_LIMIT_BACKEND == "redis":
+                    from bots_settings.redis_connection import (
+                        get_redis_connection
+                    )
+                    _stats = RedisDeliveryStats(get_redis_connection())
+                else:
+                    _stats = DeliveryStats()
+    return _stats
+
+
+def handle_failure(token: str, error: Exception,
+                   attempt: int) -> Union[float, None]:
+    """
+    Register failed attempt of the bot request.
+    Pauses the bot on 429 and returns seconds to wait before
+    the next attempt, or None if the request is dropped.
+    """
+    delay = get_retry_policy().get_delay(error, attempt)
+    if delay is None:
+        get_delivery_stats().incr(token, "dropped")
+        return None
+
+    if parse_retry_after(error) is not None:
+        get_rate_limiter().pause(token, delay)
+        get_delivery_stats().incr(token, "throttled")
+    get_delivery_stats().incr(token, "retries")
+    logger.info(
+        f"""Telegram request failed, retry {attempt} in {delay:.2f}s.
+        Error: {error}"""
+    )
+    return delay
+
+
+def call_with_retry(request: Callable, token: str,
+                    chat_id: Union[int, str] = None):
+    """
+    Call `request` (without arguments) within the bot rate limits
+    and repeat it while the retry policy allows.
+    Raises the last error if the request was dropped.
+    """
+    limiter = get_rate_limiter()
+    attempt = 0
+    while True:
+        limiter.acquire(token, chat_id)
+        try:
+            return request()
+        except (ApiException, requests.RequestException) as e:
+            attempt += 1
+            delay = handle_failure(token, e, attempt)
+            if delay is None:
+                raise
+            if parse_retry_after(e) is None:
+                # on 429 limiter.acquire waits for the pause itself
+                sleep(delay)
+
+
+def get_bot_delivery_stats(token: str) -> dict:
+    """
+    Return retries/drops counters of the bot
+    """
+    return get_delivery_stats().get(token)
@@ -0,0 +1,119 @@
+import threading
+from time import monotonic
+from typing import Callable, Dict, NamedTuple, Union
+
+from django.apps import apps
+from django.conf import settings
+
+
+# name of the action, that answers help requests
+EMERGENCY_ACTION_NAME = "emergency_action"
+
+
+class RoutingTable(NamedTuple):
+    """
+    Actions of one bot, that user text can lead to
+    """
+    buttons: Dict[str, object]
+    actions: Dict[str, object]
+    home_action: Union[object, None] = None
+    emergency_action: Union[object, None] = None
+
+    def resolve(self, text: str):
+        """
+        Return action of the button with the text, action with
+        the name or the home action
+        """
+        action = self.buttons.get(text) or self.actions.get(text)
+        return action or self.home_action
+
+
+def build_routing_table(slug: str) -> RoutingTable:
+    """
+    Load all actions and buttons of the bot with two queries
+    """
+    Action = apps.get_model("keyboards", "Action")
+    Button = apps.get_model("keyboards", "Button")
+
+    actions = {
+        action.pk: action for action in
+        Action.objects.select_related("keyboard_to_represent").filter(
+            keyboard_to_represent__bot__slug=slug
+        ).order_by("keyboard_to_represent__id", "name")
+    }
+    buttons = {}
+    for text, action_id in Button.objects.filter(
+            keyboard__bot__slug=slug
+    ).order_by("-keyboard__id", "position").values_list("text", "action_id"):
+        # the first button wins, like .first() of the queryset did
+        if text not in buttons and action_id in actions:
+            buttons[text] = actions[action_id]
+
+    by_name = {}
+    for action in actions.values():
+        by_name.setdefault(action.name, action)
+    return RoutingTable(
+        buttons=buttons,
+        actions=by_name,
+        home_action=next(iter(actions.values()), None),
+        emergency_action=by_name.get(EMERGENCY_ACTION_NAME),
+    )
+
+
+class RoutingCache:
+    """
+    Routing tables of bots, built on first use.
+    Tables are dropped by signals of keyboards models in this process
+    and live `timeout` seconds, so other processes see changes too.
+    """
+
+    def __init__(self, timeout: float,
+                 build: Callable[[str], RoutingTable] = build_routing_table):
+        self.timeout = timeout
+        self.build = build
+        self._tables = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, slug: str) -> RoutingTable:
+        now = monotonic()
+        with self._lock:
+            table, expires_at = self._tables.get(slug, (None, 0))
+            generation = self._generation
+        if expires_at <= now:
+            table = self.build(slug)
+            with self._lock:
+                # the table built during clear() may be stale already
+                if generation == self._generation:
+                    self._tables[slug] = (table, now + self.timeout)
+        return table
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tables.clear()
+            self._generation += 1
+
+
+_cache = None
+_lock = threading.Lock()
+
+
+def get_routing_cache() -> RoutingCache:
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                _cache = RoutingCache(timeout=settings.ROUTING_TABLE_TIMEOUT)
+    return _cache
+
+
+def get_routing_table(slug: str) -> RoutingTable:
+    return get_routing_cache().get(slug)
+
+
+def invalidate_routing_tables(sender, **kwargs) -> None:
+    """
+    Signal receiver for changes of keyboards, actions and buttons.
+    Such changes are rare, so all tables are built again.
+    """
+    get_routing_cache().clear()
@@ -0,0 +1,38 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from telebot import apihelper
+
+from telegram_api.client import ClientRegistry, get_session
+
+
+class ClientRegistryTestCase(SimpleTestCase):
+    def test_same_client_for_token(self):
+        registry = ClientRegistry(max_size=2, idle_timeout=60)
+        self.assertIs(registry.get("token-1"), registry.get("token-1"))
+        self.assertEqual(len(registry), 1)
+
+    def test_least_recently_used_evicted(self):
+        registry = ClientRegistry(max_size=2, idle_timeout=60)
+        first = registry.get("token-1")
+        registry.get("token-2")
+        registry.get("token-1")
+        registry.get("token-3")
+        self.assertEqual(len(registry), 2)
+        self.assertIs(registry.get("token-1"), first)
+
+    @mock.patch("telegram_api.client.monotonic")
+    def test_idle_clients_evicted(self, monotonic):
+        registry = ClientRegistry(max_size=10, idle_timeout=60)
+        monotonic.return_value = 0
+        first = registry.get("token-1")
+        registry.get("token-2")
+        monotonic.return_value = 100
+        self.assertIsNot(registry.get("token-1"), first)
+        self.assertEqual(len(registry), 1)
+
+    def test_clients_share_session(self):
+        session = get_session()
+        self.assertIs(get_session(), session)
+        self.assertIs(apihelper.session, session)
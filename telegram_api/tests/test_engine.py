@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from telegram_api.engine import SendingEngine
+from telegram_api.ratelimit import MemoryBucketStorage, RateLimiter
+from telegram_api.retry import RetryPolicy, DeliveryStats
+from telegram_api.tests.test_retry import api_error
+
+
+class SendingEngineTestCase(SimpleTestCase):
+    def setUp(self):
+        limiter = RateLimiter(
+            MemoryBucketStorage(), per_bot=1000, per_chat=1000, per_group=1000
+        )
+        patchers = [
+            mock.patch("telegram_api.engine.get_rate_limiter",
+                       return_value=limiter),
+            mock.patch("telegram_api.retry.get_rate_limiter",
+                       return_value=limiter),
+            mock.patch("telegram_api.retry.get_delivery_stats",
+                       return_value=DeliveryStats()),
+            mock.patch("telegram_api.retry.get_retry_policy",
+                       return_value=RetryPolicy(3, 0, 0)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_sends_to_every_chat(self):
+        def request(chat_id):
+            return mock.Mock(message_id=chat_id * 10)
+
+        results = SendingEngine("1:token", concurrency=4).send(
+            range(50), request
+        )
+        self.assertEqual(len(results), 50)
+        self.assertEqual(
+            sorted(result.message_id for result in results),
+            [chat_id * 10 for chat_id in range(50)]
+        )
+        self.assertTrue(all(result.ok for result in results))
+
+    def test_failed_chats_are_reported(self):
+        errors = {3: api_error(403), 5: api_error(400)}
+
+        def request(chat_id):
+            if chat_id in errors:
+                raise errors[chat_id]
+            return mock.Mock(message_id=1)
+
+        results = SendingEngine("1:token", concurrency=3).send(
+            range(10), request
+        )
+        failed = {result.chat_id: result.error
+                  for result in results if not result.ok}
+        self.assertEqual(failed, errors)
+
+    def test_server_errors_are_retried(self):
+        request = mock.Mock(
+            side_effect=[api_error(502), mock.Mock(message_id=7)]
+        )
+        results = SendingEngine("1:token", concurrency=1).send([1], request)
+        self.assertEqual(results[0].message_id, 7)
+        self.assertEqual(request.call_count, 2)
@@ -0,0 +1,74 @@
+import json
+from unittest import TestCase, mock
+
+from telebot.types import KeyboardButton, ReplyKeyboardMarkup
+
+from telegram_api.markup import (
+    MarkupCache,
+    build_reply_markup,
+    invalidate_reply_markup
+)
+
+
+class MarkupCacheTestCase(TestCase):
+    def setUp(self):
+        self.build = mock.Mock(
+            side_effect=lambda keyboard_id: f"markup-{keyboard_id}"
+        )
+
+    def test_markup_is_built_once(self):
+        cache = MarkupCache(timeout=60, build=self.build)
+        self.assertEqual(cache.get(1), "markup-1")
+        self.assertEqual(cache.get(1), "markup-1")
+        self.build.assert_called_once_with(1)
+
+    def test_markup_is_shared(self):
+        connection = mock.Mock()
+        connection.get.return_value = b"shared-markup"
+        cache = MarkupCache(timeout=60, connection=connection,
+                            build=self.build)
+        self.assertEqual(cache.get(1), "shared-markup")
+        self.build.assert_not_called()
+        connection.get.assert_called_once_with("tg-markup:1")
+
+    def test_built_markup_is_saved_to_redis(self):
+        connection = mock.Mock()
+        connection.get.return_value = None
+        cache = MarkupCache(timeout=60, connection=connection,
+                            build=self.build)
+        cache.get(1)
+        connection.set.assert_called_once_with(
+            "tg-markup:1", "markup-1", ex=24 * 60 * 60
+        )
+
+    def test_changed_keyboard_is_invalidated(self):
+        connection = mock.Mock()
+        connection.get.return_value = None
+        cache = MarkupCache(timeout=60, connection=connection,
+                            build=self.build)
+        cache.get(1)
+        with mock.patch("telegram_api.markup.get_markup_cache",
+                        return_value=cache):
+            # a button of the keyboard was saved
+            invalidate_reply_markup(
+                sender=None, instance=mock.Mock(keyboard_id=1)
+            )
+        cache.get(1)
+        self.assertEqual(self.build.call_count, 2)
+        connection.delete.assert_called_once_with("tg-markup:1")
+
+
+class BuildReplyMarkupTestCase(TestCase):
+    def test_markup_matches_telebot(self):
+        buttons = [(1, "One"), (1, "Two"), (2, "Three")]
+        button_model = mock.Mock()
+        (button_model.objects.filter.return_value
+         .order_by.return_value.values_list.return_value) = buttons
+        with mock.patch("telegram_api.markup.apps.get_model",
+                        return_value=button_model):
+            markup = build_reply_markup(1)
+
+        expected = ReplyKeyboardMarkup()
+        expected.row(KeyboardButton("One"), KeyboardButton("Two"))
+        expected.row(KeyboardButton("Three"))
+        self.assertEqual(json.loads(markup), json.loads(expected.to_json()))
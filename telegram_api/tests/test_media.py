@@ -0,0 +1,95 @@
+import io
+from unittest import TestCase, mock
+
+from telegram_api.media import (
+    LimitedStream,
+    MediaTooLarge,
+    download_to_field,
+    get_message_media
+)
+
+
+class GetMessageMediaTestCase(TestCase):
+    def test_original_photo_is_taken(self):
+        message = {"photo": [
+            {"file_id": "small", "file_size": 10},
+            {"file_id": "original", "file_size": 100},
+        ]}
+        self.assertEqual(get_message_media(message),
+                         ("photo", "original", 100))
+
+    def test_document(self):
+        message = {"document": {"file_id": "doc"}, "caption": "text"}
+        self.assertEqual(get_message_media(message), ("document", "doc", None))
+
+    def test_no_media(self):
+        self.assertEqual(get_message_media({"text": "hi"}),
+                         (None, None, None))
+
+
+class LimitedStreamTestCase(TestCase):
+    def test_small_file_is_read(self):
+        stream = LimitedStream(io.BytesIO(b"12345"), max_size=5)
+        self.assertEqual(stream.read(3) + stream.read(3), b"12345")
+
+    def test_large_file_is_stopped(self):
+        stream = LimitedStream(io.BytesIO(b"123456"), max_size=5)
+        stream.read(3)
+        with self.assertRaises(MediaTooLarge):
+            stream.read(3)
+
+
+class DownloadToFieldTestCase(TestCase):
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.get_file.return_value = mock.Mock(
+            file_path="photos/file_1.jpg", file_size=6
+        )
+        self.response = mock.MagicMock(headers={}, raw=io.BytesIO(b"binary"))
+        self.response.__enter__.return_value = self.response
+        self.session = mock.Mock()
+        self.session.get.return_value = self.response
+        for target, value in (("get_client", self.client),
+                              ("get_session", self.session)):
+            patcher = mock.patch(f"telegram_api.media.{target}",
+                                 return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_file_is_streamed_to_field(self):
+        chunks = []
+        field = mock.Mock()
+        field.save.side_effect = (
+            lambda name, content, save: chunks.extend(content.chunks(4))
+        )
+        download_to_field("1:token", "file-id", field, max_size=10)
+
+        self.assertEqual(b"".join(chunks), b"binary")
+        self.assertEqual(field.save.call_args[0][0], "file_1.jpg")
+        self.assertEqual(
+            self.session.get.call_args[0][0],
+            "https://api.telegram.org/file/bot1:token/photos/file_1.jpg"
+        )
+        self.assertTrue(self.session.get.call_args[1]["stream"])
+
+    def test_large_file_is_not_downloaded(self):
+        field = mock.Mock()
+        with self.assertRaises(MediaTooLarge):
+            download_to_field("1:token", "file-id", field, max_size=5)
+        self.session.get.assert_not_called()
+        field.save.assert_not_called()
+
+    def test_large_response_is_not_saved(self):
+        self.client.get_file.return_value.file_size = None
+        self.response.headers = {"Content-Length": "6"}
+        field = mock.Mock()
+        with self.assertRaises(MediaTooLarge):
+            download_to_field("1:token", "file-id", field, max_size=5)
+        field.save.assert_not_called()
+
+    def test_partial_file_is_not_stored(self):
+        self.client.get_file.return_value.file_size = None
+        field = mock.Mock()
+        with self.assertRaises(MediaTooLarge):
+            download_to_field("1:token", "file-id", field, max_size=5)
+        field.save.assert_not_called()
@@ -0,0 +1,61 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from telegram_api.ratelimit import (
+    MemoryBucketStorage, RateLimiter, is_group_chat
+)
+
+
+class MemoryBucketStorageTestCase(SimpleTestCase):
+    def test_bucket_refills_with_time(self):
+        storage = MemoryBucketStorage()
+        bucket = [("key", 2, 2)]
+        self.assertEqual(storage.consume(bucket, now=0), 0)
+        self.assertEqual(storage.consume(bucket, now=0), 0)
+        self.assertAlmostEqual(storage.consume(bucket, now=0), 0.5)
+        self.assertEqual(storage.consume(bucket, now=0.5), 0)
+
+    def test_nothing_consumed_if_one_bucket_is_empty(self):
+        storage = MemoryBucketStorage()
+        storage.consume([("chat", 1, 1)], now=0)
+        self.assertGreater(
+            storage.consume([("bot", 1, 1), ("chat", 1, 1)], now=0), 0
+        )
+        self.assertEqual(storage.consume([("bot", 1, 1)], now=0), 0)
+
+
+class RateLimiterTestCase(SimpleTestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(
+            MemoryBucketStorage(), per_bot=30, per_chat=1, per_group=20 / 60
+        )
+
+    def test_per_chat_limit(self):
+        with mock.patch("telegram_api.ratelimit.time", return_value=0):
+            self.assertEqual(self.limiter.reserve("1:token", 10), 0)
+            self.assertAlmostEqual(self.limiter.reserve("1:token", 10), 1)
+            self.assertEqual(self.limiter.reserve("1:token", 11), 0)
+
+    def test_group_limit(self):
+        with mock.patch("telegram_api.ratelimit.time", return_value=0):
+            self.assertEqual(self.limiter.reserve("1:token", -100), 0)
+            self.assertAlmostEqual(self.limiter.reserve("1:token", -100), 3)
+
+    def test_per_bot_limit(self):
+        with mock.patch("telegram_api.ratelimit.time", return_value=0):
+            for chat_id in range(30):
+                self.assertEqual(self.limiter.reserve("1:token", chat_id), 0)
+            self.assertGreater(self.limiter.reserve("1:token", 100), 0)
+            self.assertEqual(self.limiter.reserve("2:token", 100), 0)
+
+    @mock.patch("telegram_api.ratelimit.sleep")
+    def test_acquire_sleeps_until_slot_is_free(self, sleep):
+        self.limiter.reserve = mock.Mock(side_effect=[0.5, 0])
+        self.limiter.acquire("1:token", 10)
+        sleep.assert_called_once_with(0.5)
+
+    def test_is_group_chat(self):
+        self.assertTrue(is_group_chat(-100500))
+        self.assertTrue(is_group_chat("@channel"))
+        self.assertFalse(is_group_chat("100500"))
@@ -0,0 +1,79 @@
+from time import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from telegram_api.ratelimit import RateLimiter, RedisBucketStorage
+from telegram_api.retry import RedisDeliveryStats, handle_failure
+from telegram_api.tests.test_retry import api_error
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+@mock.patch("telegram_api.retry.logger")
+class RedisTestCase(SimpleTestCase):
+    """
+    Redis storages against fakeredis, Lua scripts run on lupa
+    """
+
+    def setUp(self):
+        if fakeredis is None:
+            self.skipTest("fakeredis is not installed")
+        self.connection = fakeredis.FakeStrictRedis()
+        self.storage = RedisBucketStorage(self.connection)
+
+    def test_bucket_refills_with_time(self, logger):
+        bucket = [("key", 2, 2)]
+        self.assertEqual(self.storage.consume(bucket, now=0), 0)
+        self.assertEqual(self.storage.consume(bucket, now=0), 0)
+        self.assertAlmostEqual(self.storage.consume(bucket, now=0), 0.5)
+        self.assertEqual(self.storage.consume(bucket, now=0.5), 0)
+        self.assertGreater(self.connection.ttl("tg-rate:key"), 0)
+
+    def test_nothing_consumed_if_one_bucket_is_empty(self, logger):
+        self.storage.consume([("chat", 1, 1)], now=0)
+        self.assertGreater(
+            self.storage.consume([("bot", 1, 1), ("chat", 1, 1)], now=0), 0
+        )
+        self.assertEqual(self.storage.consume([("bot", 1, 1)], now=0), 0)
+
+    def test_pause(self, logger):
+        now = time()
+        self.storage.pause("bot", now + 10)
+        # the shorter pause doesn't cut the longer one
+        self.storage.pause("bot", now + 5)
+        self.assertAlmostEqual(
+            self.storage.consume([("bot", 1, 1)], now=now), 10
+        )
+        self.assertEqual(
+            self.storage.consume([("bot", 1, 1)], now=now + 10), 0
+        )
+        self.assertGreater(self.connection.ttl("tg-rate:bot"), 0)
+
+    def test_too_many_requests_pause_the_bot(self, logger):
+        limiter = RateLimiter(
+            self.storage, per_bot=30, per_chat=1, per_group=20 / 60
+        )
+        stats = RedisDeliveryStats(self.connection)
+        with mock.patch("telegram_api.retry.get_rate_limiter",
+                        return_value=limiter), \
+                mock.patch("telegram_api.retry.get_delivery_stats",
+                           return_value=stats):
+            delay = handle_failure("1:token", api_error(429, retry_after=3), 1)
+        self.assertEqual(delay, 3)
+        self.assertGreater(limiter.reserve("1:token", 10), 2)
+        self.assertEqual(
+            stats.get("1:token"), {"throttled": 1, "retries": 1}
+        )
+
+    def test_delivery_stats(self, logger):
+        stats = RedisDeliveryStats(self.connection)
+        stats.incr("1:token", "retries")
+        stats.incr("1:token", "retries", 2)
+        stats.incr("2:token", "dropped")
+        self.assertEqual(stats.get("1:token"), {"retries": 3})
+        stats.clear()
+        self.assertEqual(stats.get("2:token"), {})
@@ -0,0 +1,110 @@
+from unittest import mock
+
+import requests
+from django.test import SimpleTestCase
+
+from telebot.apihelper import ApiException
+
+from telegram_api.ratelimit import MemoryBucketStorage, RateLimiter
+from telegram_api.retry import (
+    RetryPolicy, DeliveryStats, call_with_retry, is_chat_unreachable,
+    parse_retry_after
+)
+
+
+def api_error(code: int, description: str = "error",
+              **parameters) -> ApiException:
+    result = mock.Mock(status_code=code)
+    result.json.return_value = {
+        "ok": False,
+        "error_code": code,
+        "description": description,
+        "parameters": parameters,
+    }
+    return ApiException(description, "sendMessage", result)
+
+
+class RetryPolicyTestCase(SimpleTestCase):
+    def setUp(self):
+        self.policy = RetryPolicy(
+            max_attempts=3, backoff_base=1, backoff_max=10
+        )
+
+    def test_parse_retry_after(self):
+        self.assertEqual(parse_retry_after(api_error(429, retry_after=7)), 7)
+        self.assertIsNone(parse_retry_after(api_error(400)))
+
+    def test_is_chat_unreachable(self):
+        self.assertTrue(is_chat_unreachable(
+            api_error(403, "Forbidden: bot was blocked by the user")
+        ))
+        self.assertTrue(is_chat_unreachable(
+            api_error(400, "Bad Request: chat not found")
+        ))
+        self.assertFalse(is_chat_unreachable(
+            api_error(400, "Bad Request: message text is empty")
+        ))
+        self.assertFalse(is_chat_unreachable(api_error(500)))
+        self.assertFalse(is_chat_unreachable(requests.ConnectionError()))
+
+    def test_too_many_requests_waits_retry_after(self):
+        self.assertEqual(
+            self.policy.get_delay(api_error(429, retry_after=5), 1), 5
+        )
+
+    def test_server_and_network_errors_backoff(self):
+        delay = self.policy.get_delay(api_error(502), 2)
+        self.assertTrue(0 <= delay <= 4)
+        delay = self.policy.get_delay(requests.ConnectionError(), 1)
+        self.assertTrue(0 <= delay <= 2)
+
+    def test_client_errors_are_not_repeated(self):
+        self.assertIsNone(self.policy.get_delay(api_error(400), 1))
+        self.assertIsNone(self.policy.get_delay(api_error(403), 1))
+
+    def test_attempts_are_limited(self):
+        self.assertIsNone(self.policy.get_delay(api_error(502), 3))
+
+
+@mock.patch("telegram_api.retry.sleep")
+class CallWithRetryTestCase(SimpleTestCase):
+    def setUp(self):
+        self.limiter = RateLimiter(
+            MemoryBucketStorage(), per_bot=1000, per_chat=1000, per_group=1000
+        )
+        self.stats = DeliveryStats()
+        self.policy = RetryPolicy(
+            max_attempts=3, backoff_base=0, backoff_max=0
+        )
+        patchers = [
+            mock.patch("telegram_api.retry.get_rate_limiter",
+                       return_value=self.limiter),
+            mock.patch("telegram_api.retry.get_delivery_stats",
+                       return_value=self.stats),
+            mock.patch("telegram_api.retry.get_retry_policy",
+                       return_value=self.policy),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_retries_server_error(self, sleep):
+        request = mock.Mock(side_effect=[api_error(500), "ok"])
+        self.assertEqual(call_with_retry(request, "1:token", 10), "ok")
+        self.assertEqual(self.stats.get("1:token"), {"retries": 1})
+
+    def test_too_many_requests_pauses_bot(self, sleep):
+        request = mock.Mock(side_effect=[api_error(429, retry_after=3), "ok"])
+        self.limiter.pause = mock.Mock()
+        self.assertEqual(call_with_retry(request, "1:token", 10), "ok")
+        self.limiter.pause.assert_called_once_with("1:token", 3)
+        self.assertEqual(self.stats.get("1:token")["throttled"], 1)
+
+    def test_drops_after_last_attempt(self, sleep):
+        request = mock.Mock(side_effect=api_error(500))
+        with self.assertRaises(ApiException):
+            call_with_retry(request, "1:token", 10)
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual(
+            self.stats.get("1:token"), {"retries": 2, "dropped": 1}
+        )
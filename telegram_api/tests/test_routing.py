@@ -0,0 +1,65 @@
+from unittest import TestCase, mock
+
+from telegram_api.routing import (
+    RoutingCache,
+    RoutingTable,
+    invalidate_routing_tables
+)
+
+
+class RoutingTableTestCase(TestCase):
+    def setUp(self):
+        self.table = RoutingTable(
+            buttons={"Menu": "menu-action"},
+            actions={"Menu": "other-action", "help": "help-action"},
+            home_action="home-action",
+        )
+
+    def test_button_text_goes_first(self):
+        self.assertEqual(self.table.resolve("Menu"), "menu-action")
+
+    def test_action_name(self):
+        self.assertEqual(self.table.resolve("help"), "help-action")
+
+    def test_unknown_text_leads_home(self):
+        self.assertEqual(self.table.resolve("hello"), "home-action")
+
+
+class RoutingCacheTestCase(TestCase):
+    def setUp(self):
+        self.build = mock.Mock(side_effect=lambda slug: RoutingTable(
+            buttons={}, actions={}, home_action=slug
+        ))
+
+    def test_table_is_built_once(self):
+        cache = RoutingCache(timeout=60, build=self.build)
+        self.assertEqual(cache.get("bot").home_action, "bot")
+        self.assertEqual(cache.get("bot").home_action, "bot")
+        self.build.assert_called_once_with("bot")
+
+    def test_table_expires(self):
+        cache = RoutingCache(timeout=0, build=self.build)
+        cache.get("bot")
+        cache.get("bot")
+        self.assertEqual(self.build.call_count, 2)
+
+    def test_signals_clear_tables(self):
+        cache = RoutingCache(timeout=60, build=self.build)
+        cache.get("bot")
+        with mock.patch("telegram_api.routing.get_routing_cache",
+                        return_value=cache):
+            invalidate_routing_tables(sender=None)
+        cache.get("bot")
+        self.assertEqual(self.build.call_count, 2)
+
+    def test_table_built_during_clear_is_not_kept(self):
+        cache = RoutingCache(timeout=60, build=self.build)
+
+        def build(slug):
+            cache.clear()
+            return RoutingTable(buttons={}, actions={})
+
+        self.build.side_effect = build
+        cache.get("bot")
+        cache.get("bot")
+        self.assertEqual(self.build.call_count, 2)
@@ -0,0 +1,60 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from telegram_api.api import send_message
+from telegram_api.tests.test_retry import api_error
+from telegram_api.tests.utils import use_memory_backend
+from telegram_api.unreachable import UnreachableChats
+
+
+class UnreachableChatsTestCase(SimpleTestCase):
+    def setUp(self):
+        use_memory_backend(self)
+
+    def test_full_batch_is_passed_to_handler(self):
+        handler = mock.Mock()
+        chats = UnreachableChats(batch_size=3, interval=60, handler=handler)
+        chats.add("1:token", 1)
+        chats.add("1:token", 2)
+        handler.assert_not_called()
+        chats.add("2:token", 1)
+        handler.assert_called_once_with(
+            {"1:token": {"1", "2"}, "2:token": {"1"}}
+        )
+
+        chats.flush()
+        handler.assert_called_once()
+
+    def test_single_chat_is_flushed_after_interval(self):
+        flushed = threading.Event()
+        handler = mock.Mock(side_effect=lambda chats: flushed.set())
+        chats = UnreachableChats(batch_size=100, interval=0.05,
+                                 handler=handler)
+        chats.add("1:token", 1)
+        handler.assert_not_called()
+        self.assertTrue(flushed.wait(5))
+        handler.assert_called_once_with({"1:token": {"1"}})
+
+    def test_blocked_chat_is_reported_by_sender(self):
+        client = mock.Mock()
+        client.send_message.side_effect = api_error(
+            403, "Forbidden: bot was blocked by the user"
+        )
+        with mock.patch("telegram_api.api.get_client",
+                        return_value=client), \
+                mock.patch("telegram_api.unreachable.get_unreachable_chats"
+                           ) as get_chats:
+            send_message(chat_id=1, text="hi", token="1:token")
+        get_chats.return_value.add.assert_called_once_with("1:token", 1)
+
+    def test_other_errors_are_not_reported(self):
+        client = mock.Mock()
+        client.send_message.side_effect = api_error(400)
+        with mock.patch("telegram_api.api.get_client",
+                        return_value=client), \
+                mock.patch("telegram_api.unreachable.get_unreachable_chats"
+                           ) as get_chats:
+            send_message(chat_id=1, text="hi", token="1:token")
+        get_chats.assert_not_called()
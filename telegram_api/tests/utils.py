@@ -0,0 +1,28 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+
+# module globals of the lazily created rate limiter, delivery stats
+# and buffer of unreachable chats
+SINGLETONS = (
+    "telegram_api.ratelimit._limiter",
+    "telegram_api.retry._stats",
+    "telegram_api.unreachable._chats",
+)
+
+
+def use_memory_backend(test_case: SimpleTestCase, *singletons: str) -> None:
+    """
+    Run the test with the in-memory backend, whatever
+    TELEGRAM_RATE_LIMIT_BACKEND the environment sets.
+    The singletons (and the extra `singletons`, like
+    "bots_mailings.progress._storage") are created again
+    for the test and restored after it.
+    """
+    settings_patcher = override_settings(TELEGRAM_RATE_LIMIT_BACKEND="memory")
+    settings_patcher.enable()
+    test_case.addCleanup(settings_patcher.disable)
+    for name in SINGLETONS + singletons:
+        patcher = mock.patch(name, None)
+        patcher.start()
+        test_case.addCleanup(patcher.stop)
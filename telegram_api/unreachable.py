@@ -0,0 +1,119 @@
+import atexit
+import logging
+import threading
+from time import monotonic
+from typing import Callable, Dict, Set, Union
+
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.db import close_old_connections
+
+from .retry import is_chat_unreachable
+
+
+logger = logging.getLogger(__name__)
+
+
+def deactivate_chats(chats: Dict[str, Set[str]]) -> None:
+    from subscribers.services import deactivate_unreachable_chats
+    deactivate_unreachable_chats(chats)
+
+
+class UnreachableChats:
+    """
+    Buffer of chats, that blocked the bot or were deleted.
+    Chats of all bots are passed to `handler` as {token: chat ids}
+    every `batch_size` chats, `interval` seconds after the first
+    buffered one (by a background thread) and at exit, so subscribers
+    are deactivated with bulk UPDATEs.
+    """
+
+    def __init__(self, batch_size: int, interval: float,
+                 handler: Callable[[Dict[str, Set[str]]], None]
+                 = deactivate_chats):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.handler = handler
+        self._chats = {}
+        self._size = 0
+        self._first_added_at = None
+        self._lock = threading.Lock()
+        self._added = threading.Event()
+        self._thread = None
+
+    def add(self, token: str, chat_id: Union[int, str]) -> None:
+        with self._lock:
+            self._chats.setdefault(token, set()).add(str(chat_id))
+            self._size += 1
+            if self._first_added_at is None:
+                self._first_added_at = monotonic()
+                self._added.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            full = self._size >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            chats, self._chats = self._chats, {}
+            self._size = 0
+            self._first_added_at = None
+        if not chats:
+            return
+        try:
+            self.handler(chats)
+        except Exception as e:
+            logger.exception(
+                f"""Unreachable chats were not deactivated.
+                Error: {e}"""
+            )
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                first_added_at = self._first_added_at
+                self._added.clear()
+            if first_added_at is None:
+                self._added.wait()
+                continue
+            wait = first_added_at + self.interval - monotonic()
+            if wait > 0:
+                self._added.wait(wait)
+                continue
+            close_old_connections()
+            self.flush()
+
+
+_chats = None
+_lock = threading.Lock()
+
+
+def get_unreachable_chats() -> UnreachableChats:
+    global _chats
+    if _chats is None:
+        with _lock:
+            if _chats is None:
+                _chats = UnreachableChats(
+                    batch_size=settings.TELEGRAM_UNREACHABLE_BATCH_SIZE,
+                    interval=settings.TELEGRAM_UNREACHABLE_INTERVAL,
+                )
+                atexit.register(_chats.flush)
+    return _chats
+
+
+@worker_process_shutdown.connect
+def flush_unreachable_chats(**kwargs) -> None:
+    if _chats is not None:
+        _chats.flush()
+
+
+def report_failed_chat(token: str, chat_id: Union[int, str],
+                       error: Exception) -> None:
+    """
+    Remember the chat of the failed request, if it will never
+    get messages of the bot
+    """
+    if is_chat_unreachable(error):
+        get_unreachable_chats().add(token, chat_id)
@@ -1,39 +1,35 @@
-from os.path import basename
-from urllib.parse import urlsplit
-from urllib.request import urlretrieve, urlcleanup
-from telebot import TeleBot
-from django.core.files import File
+from typing import TYPE_CHECKING
 
-from old_code_for_use.keyboards import Action
-from telebot.types import KeyboardButton
-from telebot.types import ReplyKeyboardMarkup
-from bots_management.models import Channel
+from django.conf import settings
+from django.db import transaction
+
+from bots_management.models import Bot
 from subscribers.models import Message
 from subscribers.services import (
+    IncomingMessage,
     get_subscriber_telegram
 )
+from subscribers.sink import get_message_sink
+from subscribers.tasks import download_message_media
+from .markup import get_reply_markup
+from .media import get_message_media
+
+if TYPE_CHECKING:
+    from old_code_for_use.keyboards.models import Action
 
 
-def create_markup(action: Action) -> ReplyKeyboardMarkup:
+def create_markup(action: 'Action') -> str:
     """
     Creates markup for the telegram keyboard.
 
     Returns:
-        ReplyKeyboardMarkup that represents markup.
+        reply_markup JSON of the action keyboard, it's prebuilt
+        and cached, senders pass it to Telegram as is.
     """
-    markup = ReplyKeyboardMarkup()
-    btn_array = action.keyboard_to_represent.get_telegram_buttons()
-    for row in btn_array:
-        inline_btns = [
-            KeyboardButton(
-                text=btn.text,
-            ) for btn in row
-        ]
-        markup.row(*inline_btns)
-    return markup
+    return get_reply_markup(action.keyboard_to_represent_id)
 
 
-def save_message(channel: Channel, in_data: dict,
+def save_message(channel: Bot, in_data: dict,
                  is_help_message: bool = False) -> None:
     """
     Save massage info from telegram subscribers in db
@@ -46,36 +42,34 @@ def save_message(channel: Channel, in_data: dict,
     message = in_data["message"]
     message_token = message.get('message_id')
 
+    if 'text' in message and not is_help_message:
+        # plain texts are saved in batches, see subscribers.sink
+        get_message_sink().add(IncomingMessage(
+            bot_id=channel.id,
+            user=message.get('chat'),
+            message_token=message_token,
+            text=message.get('text'),
+        ))
+        return
+
     subscriber, _ = get_subscriber_telegram(
         user=message.get('chat'),
-        channel=channel
+        bot=channel
     )
     message_instance = Message(sender=subscriber, message_token=message_token)
     if 'text' in message.keys():
         message_instance.text = message.get('text')
-    elif channel.is_media_allowed:
-
-        if 'photo' in message.keys():
-            # get only original size, it always last
-            file_id = message['photo'][-1].get('file_id')
-            message_instance.url = tg_get_path_file(
-                channel.telegram_token, file_id
-            )
-            download_to_file_field(url=message_instance.url,
-                                   field=message_instance.image)
-            # save caption of the image
-            message_instance.text = {message.get('caption')}
-
-        for type_file in ['document', 'audio', 'video', 'voice', 'sticker']:
-            if type_file in message.keys():
-                file_id = message[type_file].get('file_id')
-                message_instance.url = tg_get_path_file(
-                    channel.telegram_token, file_id
-                )
-                download_to_file_field(url=message_instance.url,
-                                       field=message_instance.file)
-                # save caption of the file
-                message_instance.text = {message.get('caption')}
+    else:
+        media_type, file_id, file_size = get_message_media(message)
+        if media_type:
+            # save caption of the media
+            message_instance.text = message.get('caption')
+            message_instance.media_type = media_type
+            message_instance.media_file_id = file_id
+            if file_size and file_size > settings.TELEGRAM_MEDIA_MAX_SIZE:
+                message_instance.media_status = Message.MEDIA_TOO_LARGE
+            else:
+                message_instance.media_status = Message.MEDIA_PENDING
 
     location = message.get('location')
     if location and channel.is_geo_allowed:
@@ -85,23 +79,8 @@ def save_message(channel: Channel, in_data: dict,
         message_instance.is_help_message = True
 
     message_instance.save()
-
-
-def tg_get_path_file(token: str, file_id: str) -> str:
-    """
-    return url-path for download file from telegram
-    """
-    tg_bot = TeleBot(token)
-    file_info = tg_bot.get_file(file_id)
-    return f"https://api.telegram.org/file/bot{token}/{file_info.file_path}"
-
-
-def download_to_file_field(url, field) -> None:
-    """
-    download file on server
-    """
-    try:
-        name, _ = urlretrieve(url)
-        field.save(basename(urlsplit(url).path), File(open(name, 'rb')))
-    finally:
-        urlcleanup()
+    if message_instance.media_status == Message.MEDIA_PENDING:
+        # media is downloaded out of the update handling
+        transaction.on_commit(lambda: download_message_media.apply_async(
+            (message_instance.pk,), queue=settings.TELEGRAM_MEDIA_QUEUE_NAME
+        ))